@@ -0,0 +1,119 @@
+"""
+Agent/Crew 对象池
+构造 Agent（LLM客户端、工具校验、执行器）与 Crew 的开销与请求无关，按角色预建后复用：
+每次请求从池中借出一组 Agent + Crew，只按模板构造本次的 Task 并绑定到 Crew。
+
+同一角色的各 Agent 共用一组工具实例（工具无状态，花名册等数据在进程级索引中）。
+借出的 Crew 在 kickoff 真正结束后才归还（超时后工作线程仍可能在使用），
+池中没有空闲时临时创建，归还时超出 AGENT_POOL_SIZE 的丢弃，借用永不阻塞。
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from crewai import Agent, Crew, Task
+from crewai_tools import BaseTool
+from config.settings import settings
+from agents.crew_runner import kickoff_crew
+from utils.metrics import AGENT_SETUP_DURATION, AGENT_POOL_IDLE, record_cache_access
+
+class PooledCrew:
+    """池中的一组 Agent + Crew"""
+
+    def __init__(self, agent: Agent):
+        self.agent = agent
+        self.crew = Crew(agents=[agent], tasks=[], verbose=True)
+
+    def bind(self, task: Task) -> Crew:
+        """绑定本次任务（清空上次执行留下的用量统计）"""
+        self.crew.tasks = [task]
+        self.crew.usage_metrics = None
+        return self.crew
+
+class AgentPool:
+    """单个角色的 Agent/Crew 池"""
+
+    def __init__(self, role: str, create_agent: Callable[[Optional[List[BaseTool]]], Agent], size: int = None):
+        """
+        Args:
+            role: 角色名（指标标签）
+            create_agent: tools -> Agent，tools 为空时创建新的工具实例
+            size: 保留的空闲数量上限
+        """
+        self.role = role
+        self.size = size or settings.AGENT_POOL_SIZE
+        self._create_agent = create_agent
+        self._lock = threading.Lock()
+        self._idle: List[PooledCrew] = []
+        self.created = 0
+        # 第一组的工具由同角色的所有 Agent 共用，确定性计算也直接使用
+        first = self._build(None)
+        self.tools: Dict[str, BaseTool] = {tool.name: tool for tool in first.agent.tools}
+        self.release(first)
+
+    def _build(self, tools: Optional[List[BaseTool]]) -> PooledCrew:
+        pooled = PooledCrew(self._create_agent(tools))
+        with self._lock:
+            self.created += 1
+        return pooled
+
+    def prefill(self) -> int:
+        """预建到 size 组，返回当前空闲数"""
+        while True:
+            with self._lock:
+                if len(self._idle) >= self.size:
+                    return len(self._idle)
+            self.release(self._build(list(self.tools.values())))
+
+    def acquire(self) -> PooledCrew:
+        """借出一组（没有空闲时临时创建）"""
+        with self._lock:
+            pooled = self._idle.pop() if self._idle else None
+            AGENT_POOL_IDLE.set(len(self._idle), role=self.role)
+        record_cache_access(f"agent_pool.{self.role}", pooled is not None)
+        return pooled or self._build(list(self.tools.values()))
+
+    def release(self, pooled: PooledCrew):
+        """归还（空闲数已达 size 时丢弃）"""
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(pooled)
+            AGENT_POOL_IDLE.set(len(self._idle), role=self.role)
+
+    def kickoff(self, build_task: Callable[[Agent], Task], stage: str, inputs: Dict[str, Any] = None,
+                fallback: Callable[[], Any] = None) -> Any:
+        """
+        借出一组 Agent + Crew，按模板构造任务后执行（参数与 kickoff_crew 相同）
+
+        Args:
+            build_task: agent -> Task
+        """
+        start = time.perf_counter()
+        pooled = self.acquire()
+        try:
+            crew = pooled.bind(build_task(pooled.agent))
+        except Exception:
+            self.release(pooled)
+            raise
+        AGENT_SETUP_DURATION.observe(time.perf_counter() - start, role=self.role)
+        return kickoff_crew(crew, stage, inputs, fallback=fallback, on_done=lambda: self.release(pooled))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": self.size, "idle": len(self._idle), "created": self.created}
+
+_pools: Dict[str, AgentPool] = {}
+_pools_lock = threading.Lock()
+
+def get_agent_pool(role: str, create_agent: Callable[[Optional[List[BaseTool]]], Agent]) -> AgentPool:
+    """进程内共享的角色池（首次调用时用 create_agent 创建）"""
+    with _pools_lock:
+        if role not in _pools:
+            _pools[role] = AgentPool(role, create_agent)
+        return _pools[role]
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """各角色池的大小、空闲数与累计创建数"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {role: pool.stats() for role, pool in pools.items()}
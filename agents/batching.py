@@ -0,0 +1,59 @@
+"""
+多站点批量任务的打包与输出解析
+按token预算把站点条目打包成批，解析批量输出中逐站点的结果（不依赖 crewai）
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Sequence, TypeVar
+from config.settings import settings
+
+T = TypeVar("T")
+
+def token_batches(items: Sequence[T], cost: Callable[[T], int], budget: int = None, overhead: int = 0,
+                  max_items: int = None) -> List[List[T]]:
+    """
+    按token预算把多站点条目打包成批（贪心，保持顺序）
+
+    Args:
+        items: 待打包的条目
+        cost: 单个条目占用的token数（输入 + 预计输出）
+        budget: 每批token上限，默认 LLM_BATCH_TOKEN_BUDGET
+        overhead: 每批固定开销（系统提示词、任务说明、输出格式）
+        max_items: 每批条目上限，默认 LLM_BATCH_MAX_SITES
+
+    Returns:
+        List[List]: 批次列表；单个条目超出预算时独占一批
+    """
+    budget = budget or settings.LLM_BATCH_TOKEN_BUDGET
+    max_items = max_items or settings.LLM_BATCH_MAX_SITES
+    batches: List[List[T]] = []
+    current: List[T] = []
+    used = overhead
+    for item in items:
+        tokens = cost(item)
+        if current and (used + tokens > budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], overhead
+        current.append(item)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def batch_records(result: Any) -> Dict[int, Dict[str, Any]]:
+    """
+    解析批量任务的输出：index -> 该站点的结果
+
+    非JSON、非对象、缺少 results 列表或 index 不是整数的条目一律忽略，由调用方对缺失的站点按规则计算
+    """
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except json.JSONDecodeError:
+            return {}
+    if not isinstance(result, dict) or not isinstance(result.get("results"), list):
+        return {}
+    return {
+        record["index"]: record for record in result["results"]
+        if isinstance(record, dict) and isinstance(record.get("index"), int) and not isinstance(record["index"], bool)
+    }
@@ -0,0 +1,146 @@
+"""
+Crew执行封装
+统一各服务对 Crew.kickoff 的调用，记录耗时、token用量与负载大小
+
+kickoff 在独立的工作线程中执行，按阶段超时（AGENT_STAGE_TIMEOUTS）放弃等待；
+超时、失败或LLM熔断期间改走调用方提供的确定性计算（fallback），工作流耗时有上界。
+已开始执行的 kickoff 无法强行中断，超时后其结果被丢弃；尚在排队的直接取消。
+
+实际执行由可替换的后端完成（见 agents/llm_backend.py），默认按 LLM_BACKEND 创建。
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+from crewai import Crew
+from config.settings import settings
+from utils.circuit_breaker import get_llm_breaker
+from utils.logger import setup_logger
+from utils.metrics import KICKOFF_DURATION, KICKOFF_FAILURES, KICKOFF_FALLBACKS
+from utils.profiler import profiled
+from utils.tracing import tracer, payload_size, estimate_tokens
+
+logger = setup_logger(__name__)
+
+# 可替换的kickoff实现：(crew, stage, inputs) -> result，为None时首次调用按 LLM_BACKEND 创建
+_kickoff_backend: Optional[Callable[[Crew, str, Dict[str, Any]], Any]] = None
+_backend_lock = threading.Lock()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+class KickoffTimeout(TimeoutError):
+    """kickoff 超过阶段超时"""
+
+class CircuitOpenError(RuntimeError):
+    """LLM后端熔断中，未发起调用"""
+
+def set_kickoff_backend(backend: Optional[Callable[[Crew, str, Dict[str, Any]], Any]]):
+    """
+    替换kickoff实现（如基准测试使用本地LLM替身），传入None恢复为按 LLM_BACKEND 创建
+
+    Args:
+        backend: 接收 (crew, stage, inputs) 并返回与 kickoff 相同格式结果的可调用对象
+    """
+    global _kickoff_backend
+    with _backend_lock:
+        _kickoff_backend = backend
+
+def get_kickoff_backend() -> Callable[[Crew, str, Dict[str, Any]], Any]:
+    """当前的kickoff实现（未设置时按 LLM_BACKEND 创建）"""
+    global _kickoff_backend
+    with _backend_lock:
+        if _kickoff_backend is None:
+            # 本地替身依赖各Agent模块，延迟导入避免循环依赖
+            from agents.llm_backend import create_backend
+            _kickoff_backend = create_backend()
+            logger.info(f"LLM后端: {_kickoff_backend.name}")
+        return _kickoff_backend
+
+def stage_timeout(stage: str) -> float:
+    """阶段的kickoff超时（秒）"""
+    return settings.AGENT_STAGE_TIMEOUTS.get(stage, settings.AGENT_TIMEOUT)
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.MAX_CONCURRENT_AGENTS, thread_name_prefix="kickoff")
+        return _executor
+
+@profiled
+def _invoke(crew: Crew, stage: str, inputs: Dict[str, Any]) -> Any:
+    return get_kickoff_backend()(crew, stage, inputs)
+
+def kickoff_crew(crew: Crew, stage: str, inputs: Dict[str, Any] = None, fallback: Callable[[], Any] = None,
+                 timeout: float = None, on_done: Callable[[], None] = None) -> Any:
+    """
+    执行Crew并记录 crew.kickoff span
+
+    Args:
+        crew: 待执行的Crew
+        stage: 所属阶段（prediction/decision/profiling）
+        inputs: 本次任务的结构化输入（站点、日期等）
+        fallback: 超时、失败或熔断时的确定性计算，返回与 kickoff 相同格式的结果
+        timeout: 超时（秒），默认按阶段取 stage_timeout
+        on_done: kickoff 真正结束后调用（超时时等工作线程执行完才调用），用于归还池化的Crew
+
+    Returns:
+        Any: kickoff 原始返回值（或 fallback 的结果）
+
+    Raises:
+        KickoffTimeout / CircuitOpenError / Exception: 未提供 fallback 时抛出
+    """
+    prompt = "".join(task.description + (task.expected_output or "") for task in crew.tasks)
+    timeout = stage_timeout(stage) if timeout is None else timeout
+    breaker = get_llm_breaker()
+
+    with tracer.span("crew.kickoff", stage=stage, prompt_chars=len(prompt), prompt_tokens_est=estimate_tokens(prompt),
+                     timeout=timeout) as span:
+        if not breaker.allow():
+            if on_done is not None:
+                on_done()
+            # 熔断期间所有站点直接走确定性计算，不再等待超时
+            return _fall_back(span, stage, "circuit_open", fallback, CircuitOpenError(f"LLM后端熔断中: {stage}"))
+
+        start = time.perf_counter()
+        # 在工作线程中保留当前上下文（trace父span、随机数状态）
+        future = _get_executor().submit(contextvars.copy_context().run, _invoke, crew, stage, inputs or {})
+        if on_done is not None:
+            future.add_done_callback(lambda _: on_done())
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            KICKOFF_FAILURES.inc(stage=stage)
+            breaker.record_failure()
+            logger.warning(f"{stage} 阶段kickoff超过 {timeout}秒，改走确定性计算")
+            return _fall_back(span, stage, "timeout", fallback, KickoffTimeout(f"{stage} 阶段kickoff超时（{timeout}秒）"))
+        except Exception as e:
+            KICKOFF_FAILURES.inc(stage=stage)
+            breaker.record_failure()
+            logger.warning(f"{stage} 阶段kickoff失败: {e}")
+            return _fall_back(span, stage, "error", fallback, e)
+        finally:
+            KICKOFF_DURATION.observe(time.perf_counter() - start, stage=stage)
+        breaker.record_success()
+
+        usage = getattr(crew, "usage_metrics", None) or {}
+        span.set(
+            output_chars=payload_size(result),
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            total_tokens=usage.get("total_tokens", 0),
+            llm_requests=usage.get("successful_requests", 0)
+        )
+
+    return result
+
+def _fall_back(span, stage: str, reason: str, fallback: Optional[Callable[[], Any]], error: Exception) -> Any:
+    span.set(fallback=reason)
+    if fallback is None:
+        raise error
+    KICKOFF_FALLBACKS.inc(stage=stage, reason=reason)
+    return fallback()
@@ -3,19 +3,24 @@
 负责处理站长确认反馈，决定是否启动召回流程
 """
 
-from crewai import Agent, Task, Crew
+from crewai import Agent, Task
 from crewai_tools import BaseTool
 from typing import Dict, Any, List
 import json
 from datetime import datetime
 from models.schemas import DecisionRequest, DecisionResult, PredictionResult
 from config.settings import settings
+from agents.agent_pool import get_agent_pool
+from agents.batching import token_batches, batch_records
+from utils.tracing import traced, estimate_tokens
+from utils.random_state import get_random
 
 class NotificationTool(BaseTool):
     """通知工具"""
     name: str = "notification_tool"
     description: str = "向站长发送预测结果通知"
     
+    @traced("tool.notification_tool")
     def _run(self, site_id: str, prediction: Dict[str, Any], channels: List[str] = None) -> Dict[str, Any]:
         """
         发送通知给站长（模拟实现）
@@ -53,12 +58,13 @@ class FeedbackCollectionTool(BaseTool):
     name: str = "feedback_collection_tool"
     description: str = "收集站长的确认反馈"
     
+    @traced("tool.feedback_collection_tool")
     def _run(self, site_id: str, timeout_minutes: int = 30) -> Dict[str, Any]:
         """
         收集站长反馈（模拟实现）
         在实际项目中，这里会等待真实的用户反馈
         """
-        import random
+        random = get_random()
         
         # 模拟站长反馈
         # 在实际项目中，这里会从数据库或消息队列中获取真实反馈
@@ -91,6 +97,7 @@ class DecisionLogTool(BaseTool):
     name: str = "decision_log_tool"
     description: str = "记录决策过程和结果"
     
+    @traced("tool.decision_log_tool")
     def _run(self, decision_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         记录决策日志（模拟实现）
@@ -111,8 +118,19 @@ class DecisionLogTool(BaseTool):
         print(f"决策日志已记录: {log_entry['log_id']}")
         return log_entry
 
-def create_decision_agent() -> Agent:
-    """创建决策协调Agent"""
+def decide_by_rules(request: DecisionRequest) -> Dict[str, Any]:
+    """
+    按决策规则得出结果（确定性计算，LLM超时、失败或熔断时使用）：存在缺口且站长同意时启动召回
+    """
+    accepted = bool(request.prediction_result.has_gap and request.manager_feedback)
+    return {
+        "accepted": accepted,
+        "next_step": "启动骑手画像筛选" if accepted else "结束召回流程",
+        "reason": "站长同意且存在运力缺口" if accepted else "站长拒绝或运力充足"
+    }
+
+def create_decision_agent(tools: List[BaseTool] = None) -> Agent:
+    """创建决策协调Agent（tools 为空时创建新的工具实例）"""
     
     return Agent(
         role="决策协调员",
@@ -123,7 +141,7 @@ def create_decision_agent() -> Agent:
         以及业务规则，做出最优的决策。
         你的决策直接影响后续的召回流程是否启动。
         """,
-        tools=[
+        tools=tools or [
             NotificationTool(),
             FeedbackCollectionTool(),
             DecisionLogTool()
@@ -176,12 +194,60 @@ def create_decision_task(agent: Agent, request: DecisionRequest) -> Task:
         """
     )
 
+# 批量任务中每个站点预计输出的token数（一条决策结果JSON）
+BATCH_RESULT_TOKENS = 50
+
+def _batch_description(entries: List[Dict[str, Any]]) -> str:
+    sites = "\n".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) for entry in entries)
+    
+    return f"""
+        批量处理以下 {len(entries)} 个站点的召回决策（每行一个站点，预测结果通知已发送给各站长，无需调用工具）：
+        
+        {sites}
+        
+        对每个站点综合预测数据和站长反馈做出最终决策
+        
+        决策规则：
+        - 缺口比例 > {settings.PREDICTION_THRESHOLD:.1%} 且站长同意 → 启动召回
+        - 缺口比例 ≤ {settings.PREDICTION_THRESHOLD:.1%} → 不启动召回
+        - 站长明确拒绝 → 不启动召回
+        """
+
+def create_batch_decision_task(agent: Agent, entries: List[Dict[str, Any]]) -> Task:
+    """
+    创建多站点批量决策任务：一次处理多个站点的预测结果与站长反馈
+    
+    Args:
+        entries: [{"index", "site_id", "manager_feedback", "prediction"}]，prediction 为预测结果摘要
+    """
+    return Task(
+        description=_batch_description(entries),
+        agent=agent,
+        expected_output="""
+        返回JSON格式的批量决策结果，results 中每个站点一条，原样带回 index：
+        {
+            "results": [
+                {
+                    "index": "站点序号(整数)",
+                    "site_id": "站点ID",
+                    "accepted": "是否接受召回(布尔值)",
+                    "next_step": "下一步操作(字符串)",
+                    "reason": "决策原因(字符串)"
+                }
+            ]
+        }
+        """
+    )
+
 class DecisionService:
     """决策服务类"""
     
     def __init__(self):
-        self.agent = create_decision_agent()
+        # Agent/Crew 按角色池化复用，构造服务几乎没有开销
+        self.pool = get_agent_pool("decision", create_decision_agent)
+        self.tools = self.pool.tools
         
+    @traced("service.make_decision", record_payload=False)
     def make_decision(self, request: DecisionRequest) -> DecisionResult:
         """
         执行决策流程
@@ -193,18 +259,9 @@ class DecisionService:
             DecisionResult: 决策结果
         """
         try:
-            # 创建决策任务
-            task = create_decision_task(self.agent, request)
-            
-            # 创建Crew并执行
-            crew = Crew(
-                agents=[self.agent],
-                tasks=[task],
-                verbose=True
-            )
-            
-            # 执行决策
-            result = crew.kickoff()
+            # 借出池中的Agent/Crew，绑定本次决策任务后执行（超时、失败或熔断时按规则决策）
+            result = self.pool.kickoff(lambda agent: create_decision_task(agent, request), "decision", request.dict(),
+                                       fallback=lambda: self._decide(request))
             
             # 解析结果
             if isinstance(result, str):
@@ -217,13 +274,7 @@ class DecisionService:
                 result_data = result
                 
             # 创建决策结果对象
-            decision_result = DecisionResult(
-                accepted=result_data.get("accepted", False),
-                next_step=result_data.get("next_step", "结束流程"),
-                reason=result_data.get("reason", "未知原因")
-            )
-            
-            return decision_result
+            return self._to_result(result_data)
             
         except Exception as e:
             # 返回默认决策结果
@@ -233,6 +284,72 @@ class DecisionService:
                 reason=f"决策失败: {str(e)}"
             )
     
+    @traced("service.decide_batch", record_payload=False)
+    def decide_batch(self, requests: List[DecisionRequest]) -> List[DecisionResult]:
+        """
+        多站点批量决策：先逐站点发送预测结果通知，再按token预算打包，每批一次kickoff
+        
+        Returns:
+            List[DecisionResult]: 与 requests 顺序一致的决策结果；LLM漏掉的站点按规则决策
+        """
+        entries = [
+            {
+                "index": index,
+                "site_id": request.site_id,
+                "manager_feedback": request.manager_feedback,
+                "prediction": {
+                    key: getattr(request.prediction_result, key)
+                    for key in ("target_date", "has_gap", "gap_ratio", "required_riders", "confidence")
+                }
+            }
+            for index, request in enumerate(requests)
+        ]
+        
+        # 通知是确定的副作用，不需要LLM逐站点调用工具（批量任务中逐个调用会让上下文随站点数平方增长）
+        for request in requests:
+            self.tools["notification_tool"]._run(site_id=request.site_id, prediction=request.prediction_result.dict())
+        
+        overhead = estimate_tokens(_batch_description([]))
+        results: Dict[int, DecisionResult] = {}
+        for batch in token_batches(entries, lambda entry: estimate_tokens(json.dumps(entry, ensure_ascii=False)) + BATCH_RESULT_TOKENS,
+                                   overhead=overhead):
+            results.update(self._decide_batch(batch, requests))
+        return [results[index] for index in range(len(requests))]
+    
+    def _decide_batch(self, entries: List[Dict[str, Any]], requests: List[DecisionRequest]) -> Dict[int, DecisionResult]:
+        # 整批超时、失败或熔断时逐站点按规则决策
+        result = self.pool.kickoff(lambda agent: create_batch_decision_task(agent, entries), "decision_batch", {
+            "sites": entries, "requests": [requests[entry["index"]].dict() for entry in entries]
+        }, fallback=lambda: {"results": [
+            {"index": entry["index"], **decide_by_rules(requests[entry["index"]])} for entry in entries
+        ]})
+        records = batch_records(result)
+        
+        results: Dict[int, DecisionResult] = {}
+        for entry in entries:
+            record = records.get(entry["index"])
+            try:
+                results[entry["index"]] = self._to_result(record) if record else None
+            except (TypeError, ValueError):
+                # 字段类型不合法时只对该站点回退
+                results[entry["index"]] = None
+            if results[entry["index"]] is None:
+                results[entry["index"]] = self._to_result(decide_by_rules(requests[entry["index"]]))
+        return results
+    
+    @staticmethod
+    def _to_result(result_data: Dict[str, Any]) -> DecisionResult:
+        return DecisionResult(
+            accepted=result_data.get("accepted", False),
+            next_step=result_data.get("next_step", "结束流程"),
+            reason=result_data.get("reason", "未知原因")
+        )
+    
+    def _decide(self, request: DecisionRequest) -> Dict[str, Any]:
+        """确定性决策：照常通知站长，按规则决策"""
+        self.tools["notification_tool"]._run(site_id=request.site_id, prediction=request.prediction_result.dict())
+        return decide_by_rules(request)
+    
     def _parse_text_result(self, text_result: str, request: DecisionRequest) -> Dict[str, Any]:
         """
         从文本结果中解析决策信息
@@ -276,9 +393,10 @@ class DecisionService:
         # 模拟历史决策数据
         # 在实际项目中，这里会查询数据库
         
-        import random
         from datetime import timedelta
         
+        random = get_random()
+        
         history = []
         for i in range(random.randint(5, 15)):
             date = datetime.now() - timedelta(days=random.randint(1, days))
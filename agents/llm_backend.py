@@ -0,0 +1,264 @@
+"""
+LLM后端
+kickoff_crew 通过可替换的后端执行 Crew：
+
+- CrewAIBackend：调用 crew.kickoff()，使用真实模型
+- LocalLLM：本地确定性替身，按阶段直接调用Agent自带的工具并返回模板化（或预先编排的）JSON，
+  模拟可配置的延迟分布、失败率与非JSON输出，并估算token数；
+  基准测试、批量运行与压测可在无网络的环境下按生产并发运行
+
+LLM_BACKEND=local 时服务进程（main/api/app）也使用本地替身。
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Sequence
+import numpy as np
+from crewai import Crew
+from agents.prediction_agent import summarize_inputs, forecast_demand
+from agents.decision_agent import decide_by_rules
+from agents.rider_profiler_agent import select_with_tools
+from agents.tool_output import ToolOutput
+from config.settings import settings
+from models.schemas import DecisionRequest
+from utils.tracing import estimate_tokens
+
+# 延迟分布
+LATENCY_DISTRIBUTIONS = ("fixed", "normal", "lognormal", "exponential")
+
+# 非JSON输出时各阶段返回的文本（覆盖服务中的文本解析回退路径）
+MALFORMED_OUTPUTS = {
+    "prediction": "综合历史订单与天气分析，该站点目标日期存在运力缺口，建议提前补充骑手。",
+    "decision": "站长已确认，同意启动召回。",
+    "profiling": "已完成候选骑手筛选，推荐优先联系接单率高、距离近的骑手。",
+    "prediction_batch": "各站点预测已完成，详见上文分析。",
+    "decision_batch": "各站点决策已完成。"
+}
+
+def _json_default(value: Any) -> Any:
+    """花名册/候选结果等紧凑对象按字典列表输出，其余转字符串"""
+    if hasattr(value, "to_records"):
+        return value.to_records()
+    return str(value)
+
+class LLMBackend:
+    """kickoff后端：(crew, stage, inputs) -> 与 crew.kickoff() 相同格式的结果"""
+
+    name = "base"
+
+    def __call__(self, crew: Crew, stage: str, inputs: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+class CrewAIBackend(LLMBackend):
+    """真实模型（CrewAI自行记录 usage_metrics）"""
+
+    name = "crewai"
+
+    def __call__(self, crew: Crew, stage: str, inputs: Dict[str, Any]) -> Any:
+        return crew.kickoff()
+
+class _ObservedTool:
+    """记录工具结果进入上下文的token数"""
+
+    def __init__(self, tool: Any, observations: List[int]):
+        self.name = tool.name
+        self._tool = tool
+        self._observations = observations
+
+    def _run(self, *args, **kwargs) -> Any:
+        result = self._tool._run(*args, **kwargs)
+        self._observations.append(estimate_tokens(result))
+        return result
+
+class LocalLLM(LLMBackend):
+    """按阶段返回确定性结果的本地LLM替身"""
+
+    name = "local"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+                 rider_count: int = None, seed: int = 0, distribution: str = "normal", malformed_rate: float = 0.0,
+                 script: Dict[str, Sequence[Any]] = None):
+        """
+        Args:
+            latency: 每次kickoff的平均模拟延迟（秒）
+            jitter: 延迟的标准差（秒）
+            failure_rate: 模拟失败概率
+            rider_count: 画像阶段每个站点生成的骑手数（为空时沿用工具默认）
+            seed: 延迟、失败与非JSON输出抽样的随机种子
+            distribution: 延迟分布（fixed/normal/lognormal/exponential），lognormal 可模拟LLM的长尾延迟
+            malformed_rate: 返回非JSON文本的概率
+            script: 阶段 -> 预先编排的响应（按顺序消费，字符串原样返回、字典转JSON、异常实例直接抛出），
+                    用完后回到模板化结果
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {distribution}，可选 {LATENCY_DISTRIBUTIONS}")
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rider_count = rider_count
+        self.distribution = distribution
+        self.malformed_rate = malformed_rate
+        self._script: Dict[str, Deque[Any]] = {stage: deque(responses) for stage, responses in (script or {}).items()}
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.malformed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.by_stage: Dict[str, Dict[str, int]] = {}
+
+    def __call__(self, crew: Crew, stage: str, inputs: Dict[str, Any]) -> str:
+        with self._lock:
+            delay = self._delay()
+            failed = self._rng.random() < self.failure_rate
+            malformed = self._rng.random() < self.malformed_rate
+            scripted = self._script[stage].popleft() if self._script.get(stage) else None
+        if delay:
+            time.sleep(delay)
+        if isinstance(scripted, Exception):
+            failed = True
+        if failed:
+            with self._lock:
+                self.failures += 1
+            if isinstance(scripted, Exception):
+                raise scripted
+            raise RuntimeError(f"模拟LLM调用失败: {stage}")
+
+        observations: List[int] = []
+        if scripted is not None:
+            output = scripted if isinstance(scripted, str) else json.dumps(scripted, ensure_ascii=False, default=_json_default)
+        elif malformed:
+            output = MALFORMED_OUTPUTS.get(stage, "分析完成。")
+        else:
+            tools = {tool.name: _ObservedTool(tool, observations) for tool in crew.agents[0].tools}
+            result = getattr(self, f"_{stage}")(tools, inputs)
+            # 开启工具输出投影时，与真实Agent一样只能复述看到的投影（含引用）
+            output = json.dumps(result.for_llm() if isinstance(result, ToolOutput) else result,
+                                ensure_ascii=False, default=_json_default)
+
+        # ReAct循环：k次工具调用对应k+1次LLM请求，每次请求都带上任务提示词与此前的全部工具结果
+        base = estimate_tokens("".join(task.description + (task.expected_output or "") for task in crew.tasks))
+        prompt_tokens = base * (len(observations) + 1) + sum(
+            tokens * (len(observations) - position) for position, tokens in enumerate(observations)
+        )
+        completion_tokens = estimate_tokens(output)
+        with self._lock:
+            self.calls += 1
+            self.malformed += int(malformed and scripted is None)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            totals = self.by_stage.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+
+        # 与真实kickoff一样写入 usage_metrics，由 kickoff_crew 记录到span
+        crew.usage_metrics = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "successful_requests": len(observations) + 1
+        }
+        return output
+
+    def _delay(self) -> float:
+        if not self.latency:
+            return 0.0
+        if self.distribution == "fixed" or not self.jitter and self.distribution != "exponential":
+            return self.latency
+        if self.distribution == "normal":
+            return max(0.0, self._rng.normal(self.latency, self.jitter))
+        if self.distribution == "lognormal":
+            # 按均值与标准差换算对数正态参数
+            sigma2 = math.log(1 + (self.jitter / self.latency) ** 2)
+            return float(self._rng.lognormal(math.log(self.latency) - sigma2 / 2, math.sqrt(sigma2)))
+        return float(self._rng.exponential(self.latency))
+
+    def _prediction(self, tools: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        site_id = inputs["site_id"]
+        target_date = inputs["target_date"]
+        data = inputs.get("data")
+        if data is None:
+            # 没有预先获取的数据时，与真实Agent一样逐个调用工具
+            fetched = {
+                "history": tools["historical_data_tool"]._run(site_id=site_id),
+                "trend": tools["order_trend_tool"]._run(site_id=site_id)
+            }
+            if inputs.get("include_weather", True):
+                fetched["weather"] = tools["weather_data_tool"]._run(date=target_date, city=site_id)
+            data = summarize_inputs(fetched)
+
+        return forecast_demand(site_id, target_date, data)
+
+    def _decision(self, tools: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        prediction = inputs["prediction_result"]
+        tools["notification_tool"]._run(site_id=inputs["site_id"], prediction=prediction)
+
+        return decide_by_rules(DecisionRequest(**inputs))
+
+    def _prediction_batch(self, tools: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return {"results": [
+            {"index": site["index"], **forecast_demand(site["site_id"], site["target_date"], site["data"])}
+            for site in inputs["sites"]
+        ]}
+
+    def _decision_batch(self, tools: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        # 批量决策前服务已发送通知，这里只做决策
+        return {"results": [
+            {"index": site["index"], "site_id": request["site_id"], **decide_by_rules(DecisionRequest(**request))}
+            for site, request in zip(inputs["sites"], inputs["requests"])
+        ]}
+
+    def _profiling(self, tools: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        return select_with_tools(
+            tools, inputs["site_id"], inputs["target_date"], inputs["required_riders"], inputs["urgency"],
+            profile=inputs.get("profile"), rider_count=self.rider_count
+        )
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = 0
+            self.failures = 0
+            self.malformed = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.by_stage = {}
+
+    def stats(self) -> Dict[str, int]:
+        """调用次数、模拟失败/非JSON输出次数与估算token数"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "malformed": self.malformed,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens
+            }
+
+def create_backend(name: str = None) -> LLMBackend:
+    """
+    按名称创建后端（默认取 LLM_BACKEND），local 使用 LOCAL_LLM_* 配置
+
+    Raises:
+        ValueError: 未知的后端名称
+    """
+    name = name or settings.LLM_BACKEND
+    if name == CrewAIBackend.name:
+        return CrewAIBackend()
+    if name == LocalLLM.name:
+        return LocalLLM(
+            latency=settings.LOCAL_LLM_LATENCY,
+            jitter=settings.LOCAL_LLM_JITTER,
+            failure_rate=settings.LOCAL_LLM_FAILURE_RATE,
+            seed=settings.LOCAL_LLM_SEED,
+            distribution=settings.LOCAL_LLM_LATENCY_DIST,
+            malformed_rate=settings.LOCAL_LLM_MALFORMED_RATE
+        )
+    raise ValueError(f"未知的LLM后端: {name}")
@@ -3,35 +3,45 @@
 负责节假日前3天的订单增量与运力缺口预测
 """
 
-from crewai import Agent, Task, Crew
+from crewai import Agent, Task
 from crewai_tools import BaseTool
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
+import math
 from models.schemas import PredictionRequest, PredictionResult
 from config.settings import settings, BUSINESS_RULES
+from agents.agent_pool import get_agent_pool
+from agents.batching import token_batches, batch_records
+from agents.tool_output import ToolOutput, project_history, project_trend
+from utils.dag import DAG
+from utils.tracing import traced, estimate_tokens
+from utils.random_state import get_rng
 
 class WeatherDataTool(BaseTool):
     """天气数据获取工具"""
     name: str = "weather_data_tool"
     description: str = "获取指定日期和地点的天气预报数据"
     
+    @traced("tool.weather_data_tool")
     def _run(self, date: str, city: str) -> Dict[str, Any]:
         """
         获取天气数据（模拟实现）
         在实际项目中，这里会调用真实的天气API
         """
+        rng = get_rng()
+        
         # 模拟天气数据
         weather_data = {
             "date": date,
             "city": city,
-            "temperature": np.random.randint(15, 30),
-            "humidity": np.random.randint(40, 80),
-            "precipitation": np.random.choice([0, 0, 0, 0.1, 0.3, 0.5]),  # 大部分时间不下雨
-            "wind_speed": np.random.randint(5, 15),
-            "weather_type": np.random.choice(["晴天", "多云", "阴天", "小雨"])
+            "temperature": int(rng.integers(15, 30)),
+            "humidity": int(rng.integers(40, 80)),
+            "precipitation": float(rng.choice([0, 0, 0, 0.1, 0.3, 0.5])),  # 大部分时间不下雨
+            "wind_speed": int(rng.integers(5, 15)),
+            "weather_type": str(rng.choice(["晴天", "多云", "阴天", "小雨"]))
         }
         return weather_data
 
@@ -40,11 +50,14 @@ class HistoricalDataTool(BaseTool):
     name: str = "historical_data_tool"
     description: str = "获取站点的历史订单和履约数据"
     
+    @traced("tool.historical_data_tool")
     def _run(self, site_id: str, days: int = 30) -> Dict[str, Any]:
         """
         获取历史数据（模拟实现）
         在实际项目中，这里会查询真实的数据库
         """
+        rng = get_rng()
+        
         # 生成模拟的历史数据
         dates = pd.date_range(end=datetime.now(), periods=days, freq='D')
         
@@ -66,33 +79,36 @@ class HistoricalDataTool(BaseTool):
                 
             data_point = {
                 "date": date.strftime('%Y-%m-%d'),
-                "orders": int(base_orders + np.random.normal(0, 20)),
-                "active_riders": np.random.randint(15, 25),
-                "completion_rate": np.random.uniform(0.85, 0.98),
-                "avg_delivery_time": np.random.randint(25, 45),
+                "orders": int(base_orders + rng.normal(0, 20)),
+                "active_riders": int(rng.integers(15, 25)),
+                "completion_rate": float(rng.uniform(0.85, 0.98)),
+                "avg_delivery_time": int(rng.integers(25, 45)),
                 "is_weekend": is_weekend,
                 "is_holiday": is_holiday
             }
             historical_data["data_points"].append(data_point)
             
-        return historical_data
+        return ToolOutput(historical_data, "history", project_history)
 
 class OrderTrendTool(BaseTool):
     """订单趋势分析工具"""
     name: str = "order_trend_tool"
     description: str = "分析最近24小时的订单趋势"
     
+    @traced("tool.order_trend_tool")
     def _run(self, site_id: str) -> Dict[str, Any]:
         """
         分析订单趋势（模拟实现）
         """
+        rng = get_rng()
+        
         # 生成最近24小时的订单数据
         hours = pd.date_range(end=datetime.now(), periods=24, freq='H')
         
         trend_data = {
             "site_id": site_id,
             "hourly_orders": [],
-            "growth_rate": np.random.uniform(-0.1, 0.3),  # -10% 到 +30%
+            "growth_rate": float(rng.uniform(-0.1, 0.3)),  # -10% 到 +30%
             "peak_hours": ["11:00-13:00", "18:00-20:00"]
         }
         
@@ -106,17 +122,73 @@ class OrderTrendTool(BaseTool):
             else:
                 base_orders = 3   # 低峰期
                 
-            orders = max(0, int(base_orders + np.random.normal(0, 3)))
+            orders = max(0, int(base_orders + rng.normal(0, 3)))
             
             trend_data["hourly_orders"].append({
                 "hour": hour.strftime('%H:00'),
                 "orders": orders
             })
             
-        return trend_data
+        return ToolOutput(trend_data, "trend", project_trend)
 
-def create_prediction_agent() -> Agent:
-    """创建预测分析Agent"""
+def summarize_inputs(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把预先获取的历史、趋势、天气数据压缩为预测所需的摘要（写入提示词，Agent无需再调用工具）
+    
+    Args:
+        data: {"history": ..., "trend": ..., "weather": ...}，weather 可缺省
+    """
+    points = data["history"]["data_points"]
+    trend = data["trend"]
+    summary = {
+        "history_days": len(points),
+        "avg_orders": round(sum(point["orders"] for point in points) / len(points), 2),
+        "avg_active_riders": round(sum(point["active_riders"] for point in points) / len(points), 2),
+        "holiday_avg_orders": round(float(np.mean([point["orders"] for point in points if point["is_holiday"]] or [0])), 2),
+        "growth_rate": trend["growth_rate"],
+        "last_24h_orders": sum(hour["orders"] for hour in trend["hourly_orders"]),
+        "peak_hours": trend["peak_hours"]
+    }
+    if data.get("weather"):
+        summary["weather"] = {key: data["weather"][key] for key in ("weather_type", "temperature", "precipitation")}
+    return summary
+
+def forecast_demand(site_id: str, target_date: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    按规则由数据摘要计算预测结果（确定性计算，LLM超时、失败或熔断时使用）
+    
+    预测订单 = 日均订单 × (1 + 增长率) × 节假日系数，按历史人均单量折算所需运力
+    
+    Args:
+        site_id: 站点ID
+        target_date: 目标日期
+        summary: summarize_inputs 的结果
+    """
+    avg_orders = summary["avg_orders"]
+    avg_riders = summary["avg_active_riders"]
+    orders_per_rider = avg_orders / avg_riders
+    
+    holiday_factor = 1.8 if target_date[5:] in ["01-01", "02-14", "05-01", "10-01"] else 1.0
+    predicted_orders = int(avg_orders * (1 + summary["growth_rate"]) * holiday_factor)
+    current_capacity = int(avg_riders)
+    required_capacity = math.ceil(predicted_orders / orders_per_rider)
+    required_riders = max(0, required_capacity - current_capacity)
+    gap_ratio = required_riders / required_capacity if required_capacity else 0.0
+    
+    return {
+        "site_id": site_id,
+        "target_date": target_date,
+        "has_gap": gap_ratio > settings.PREDICTION_THRESHOLD,
+        "gap_ratio": round(gap_ratio, 4),
+        "predicted_orders": predicted_orders,
+        "current_capacity": current_capacity,
+        "required_riders": required_riders,
+        "confidence": 0.85,
+        "suggestion": f"建议补充{required_riders}名骑手" if required_riders else "运力充足"
+    }
+
+def create_prediction_agent(tools: List[BaseTool] = None) -> Agent:
+    """创建预测分析Agent（tools 为空时创建新的工具实例）"""
     
     return Agent(
         role="预测分析师",
@@ -127,7 +199,7 @@ def create_prediction_agent() -> Agent:
         能够准确预测未来的订单量和运力需求。
         你的预测结果直接影响站点的运营效率和用户体验。
         """,
-        tools=[
+        tools=tools or [
             WeatherDataTool(),
             HistoricalDataTool(), 
             OrderTrendTool()
@@ -137,8 +209,13 @@ def create_prediction_agent() -> Agent:
         max_iter=3
     )
 
-def create_prediction_task(agent: Agent, request: PredictionRequest) -> Task:
-    """创建预测任务"""
+def create_prediction_task(agent: Agent, request: PredictionRequest, data: Dict[str, Any] = None) -> Task:
+    """创建预测任务（data 为预先获取的数据摘要，提供时附在任务描述中）"""
+    
+    prefetched = f"""
+        已获取的数据摘要（无需再调用工具获取）：
+        {json.dumps(data, ensure_ascii=False)}
+        """ if data else ""
     
     return Task(
         description=f"""
@@ -161,7 +238,7 @@ def create_prediction_task(agent: Agent, request: PredictionRequest) -> Task:
         - 需要补充的骑手数
         - 预测置信度
         - 建议行动
-        """,
+        {prefetched}""",
         agent=agent,
         expected_output="""
         返回JSON格式的预测结果，包含以下字段：
@@ -179,35 +256,98 @@ def create_prediction_task(agent: Agent, request: PredictionRequest) -> Task:
         """
     )
 
+# 批量任务中每个站点预计输出的token数（一条预测结果JSON）
+BATCH_RESULT_TOKENS = 80
+
+def _batch_description(entries: List[Dict[str, Any]]) -> str:
+    sites = "\n".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) for entry in entries)
+    
+    return f"""
+        批量分析以下 {len(entries)} 个站点在目标日期的运力需求（每行一个站点，数据已预先获取，无需调用工具）：
+        
+        {sites}
+        
+        对每个站点：
+        1. 根据历史日均订单、活跃骑手数与增长率预测目标日期的订单量
+        2. 考虑节假日效应与天气影响
+        3. 按历史人均单量折算所需运力，计算缺口比例与需要补充的骑手数
+        
+        预测阈值：缺口比例超过 {settings.PREDICTION_THRESHOLD} 时触发召回
+        """
+
+def create_batch_prediction_task(agent: Agent, entries: List[Dict[str, Any]]) -> Task:
+    """
+    创建多站点批量预测任务：各站点的数据摘要已预先获取，一次输出所有站点的预测结果
+    
+    Args:
+        entries: [{"index", "site_id", "target_date", "data"}]，data 为 summarize_inputs 的结果
+    """
+    return Task(
+        description=_batch_description(entries),
+        agent=agent,
+        expected_output="""
+        返回JSON格式的批量预测结果，results 中每个站点一条，原样带回 index：
+        {
+            "results": [
+                {
+                    "index": "站点序号(整数)",
+                    "site_id": "站点ID",
+                    "target_date": "目标日期",
+                    "has_gap": "是否存在缺口(布尔值)",
+                    "gap_ratio": "缺口比例(浮点数)",
+                    "predicted_orders": "预测订单量(整数)",
+                    "current_capacity": "当前运力(整数)",
+                    "required_riders": "需要补充骑手数(整数)",
+                    "confidence": "预测置信度(0-1)",
+                    "suggestion": "建议行动(字符串)"
+                }
+            ]
+        }
+        """
+    )
+
 class PredictionService:
     """预测服务类"""
     
     def __init__(self):
-        self.agent = create_prediction_agent()
+        # Agent/Crew 按角色池化复用，构造服务几乎没有开销
+        self.pool = get_agent_pool("prediction", create_prediction_agent)
+        self.tools = self.pool.tools
+    
+    def input_dag(self, request: PredictionRequest) -> DAG:
+        """预测所需的三类数据互不依赖，作为并发执行的DAG节点"""
+        dag = DAG("prediction_inputs")
+        for name, fetch in self._fetchers(request).items():
+            dag.add(name, fetch)
+        return dag
+    
+    def _fetchers(self, request: PredictionRequest) -> Dict[str, Callable[[], Dict[str, Any]]]:
+        tools = self.tools
+        fetchers = {
+            "history": lambda: tools["historical_data_tool"]._run(site_id=request.site_id),
+            "trend": lambda: tools["order_trend_tool"]._run(site_id=request.site_id)
+        }
+        if request.include_weather:
+            fetchers["weather"] = lambda: tools["weather_data_tool"]._run(date=request.target_date, city=request.site_id)
+        return fetchers
         
-    def predict_demand(self, request: PredictionRequest) -> PredictionResult:
+    @traced("service.predict_demand", record_payload=False)
+    def predict_demand(self, request: PredictionRequest, data: Dict[str, Any] = None) -> PredictionResult:
         """
         执行需求预测
         
         Args:
             request: 预测请求
+            data: 预先获取的数据（input_dag 的结果），提供时摘要写入提示词
             
         Returns:
             PredictionResult: 预测结果
         """
         try:
-            # 创建预测任务
-            task = create_prediction_task(self.agent, request)
-            
-            # 创建Crew并执行
-            crew = Crew(
-                agents=[self.agent],
-                tasks=[task],
-                verbose=True
-            )
-            
-            # 执行预测
-            result = crew.kickoff()
+            # 借出池中的Agent/Crew，绑定本次预测任务后执行（超时、失败或熔断时按规则计算）
+            summary = summarize_inputs(data) if data else None
+            result = self.pool.kickoff(lambda agent: create_prediction_task(agent, request, summary), "prediction",
+                                       {**request.dict(), "data": summary}, fallback=lambda: self._forecast(request, data))
             
             # 解析结果
             if isinstance(result, str):
@@ -220,19 +360,7 @@ class PredictionService:
                 result_data = result
                 
             # 创建预测结果对象
-            prediction_result = PredictionResult(
-                site_id=result_data.get("site_id", request.site_id),
-                target_date=result_data.get("target_date", request.target_date),
-                has_gap=result_data.get("has_gap", False),
-                gap_ratio=result_data.get("gap_ratio", 0.0),
-                predicted_orders=result_data.get("predicted_orders", 0),
-                current_capacity=result_data.get("current_capacity", 0),
-                required_riders=result_data.get("required_riders", 0),
-                confidence=result_data.get("confidence", 0.0),
-                suggestion=result_data.get("suggestion", "无建议")
-            )
-            
-            return prediction_result
+            return self._to_result(result_data, request)
             
         except Exception as e:
             # 返回默认结果
@@ -248,6 +376,79 @@ class PredictionService:
                 suggestion=f"预测失败: {str(e)}"
             )
     
+    @traced("service.predict_batch", record_payload=False)
+    def predict_batch(self, requests: List[PredictionRequest], data: List[Dict[str, Any]] = None) -> List[PredictionResult]:
+        """
+        多站点批量预测：各站点的数据摘要按token预算打包，每批一次kickoff
+        
+        Args:
+            requests: 各站点的预测请求
+            data: 与 requests 一一对应的预先获取数据（input_dag 的结果），缺省时逐站点调用数据工具
+            
+        Returns:
+            List[PredictionResult]: 与 requests 顺序一致的预测结果；LLM漏掉的站点按规则计算
+        """
+        data = data or [None] * len(requests)
+        entries = [
+            {
+                "index": index,
+                "site_id": request.site_id,
+                "target_date": request.target_date,
+                "data": summarize_inputs(site_data or {name: fetch() for name, fetch in self._fetchers(request).items()})
+            }
+            for index, (request, site_data) in enumerate(zip(requests, data))
+        ]
+        
+        overhead = estimate_tokens(_batch_description([]))
+        results: Dict[int, PredictionResult] = {}
+        for batch in token_batches(entries, lambda entry: estimate_tokens(json.dumps(entry, ensure_ascii=False)) + BATCH_RESULT_TOKENS,
+                                   overhead=overhead):
+            results.update(self._predict_batch(batch, requests))
+        return [results[index] for index in range(len(requests))]
+    
+    def _predict_batch(self, entries: List[Dict[str, Any]], requests: List[PredictionRequest]) -> Dict[int, PredictionResult]:
+        def forecast(entry: Dict[str, Any]) -> Dict[str, Any]:
+            return {"index": entry["index"], **forecast_demand(entry["site_id"], entry["target_date"], entry["data"])}
+        
+        # 整批超时、失败或熔断时逐站点按规则计算
+        result = self.pool.kickoff(lambda agent: create_batch_prediction_task(agent, entries), "prediction_batch",
+                                   {"sites": entries}, fallback=lambda: {"results": [forecast(entry) for entry in entries]})
+        records = batch_records(result)
+        
+        results: Dict[int, PredictionResult] = {}
+        for entry in entries:
+            request = requests[entry["index"]]
+            record = records.get(entry["index"])
+            try:
+                results[entry["index"]] = self._to_result(record, request) if record else None
+            except (TypeError, ValueError):
+                # 字段类型不合法（如 required_riders 为文本）时只对该站点回退
+                results[entry["index"]] = None
+            if results[entry["index"]] is None:
+                results[entry["index"]] = self._to_result(forecast(entry), request)
+        return results
+    
+    @staticmethod
+    def _to_result(result_data: Dict[str, Any], request: PredictionRequest) -> PredictionResult:
+        # 站点与日期以请求为准，不信任LLM输出
+        return PredictionResult(
+            site_id=request.site_id,
+            target_date=request.target_date,
+            has_gap=result_data.get("has_gap", False),
+            gap_ratio=result_data.get("gap_ratio", 0.0),
+            predicted_orders=result_data.get("predicted_orders", 0),
+            current_capacity=result_data.get("current_capacity", 0),
+            required_riders=result_data.get("required_riders", 0),
+            confidence=result_data.get("confidence", 0.0),
+            suggestion=result_data.get("suggestion", "无建议")
+        )
+    
+    def _forecast(self, request: PredictionRequest, data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """确定性预测：使用已获取的数据，没有时直接调用数据工具"""
+        if not data:
+            data = {name: task() for name, task in self._fetchers(request).items()}
+        return forecast_demand(request.site_id, request.target_date, summarize_inputs(data))
+    
     def _parse_text_result(self, text_result: str, request: PredictionRequest) -> Dict[str, Any]:
         """
         从文本结果中解析预测信息
@@ -3,81 +3,97 @@
 负责生成符合召回需求的骑手画像，并筛选最优候选骑手名单
 """
 
-from crewai import Agent, Task, Crew
+from crewai import Agent, Task
 from crewai_tools import BaseTool
 from typing import Dict, Any, List
 import json
 import numpy as np
 from datetime import datetime, timedelta
-from models.schemas import RiderProfile, RiderCandidate, RiderStatus
+from models.schemas import RiderProfile, RiderCandidate, RiderStatus, SiteDemand
+from models.roster import RiderRoster, CandidateSelection, STATUS_CODES
+from models.ranking import CandidateRanking, candidate_index
+from models.allocation import allocate
+from models.acceptance import get_acceptance_model, smallest_call_list
 from config.settings import settings, BUSINESS_RULES
+from agents.agent_pool import get_agent_pool
+from agents.tool_output import ToolOutput, project_rider_data, project_candidates, resolve
+from utils.tracing import traced
+from utils.random_state import get_rng, get_random
+from utils.contact_guard import get_contact_guard
 
 class RiderDataTool(BaseTool):
     """骑手数据获取工具"""
     name: str = "rider_data_tool"
     description: str = "获取站点的骑手基础信息和历史表现数据"
     
-    def _run(self, site_id: str, active_only: bool = True) -> Dict[str, Any]:
+    @traced("tool.rider_data_tool")
+    def _run(self, site_id: str, active_only: bool = True, rider_count: int = None, refresh: bool = False) -> Dict[str, Any]:
         """
         获取骑手数据（模拟实现）
         在实际项目中，这里会查询真实的骑手数据库
-        """
-        import random
         
-        # 生成模拟骑手数据
-        riders = []
-        rider_count = random.randint(30, 50)  # 每个站点30-50个骑手
+        站点花名册载入排名索引后复用，骑手变化通过 candidate_index.update_rider 增量维护；
+        refresh=True 或骑手数不符时重新生成。rider_count 为空时每个站点随机生成30-50个骑手
+        """
+        roster = candidate_index.roster(site_id)
+        if refresh or roster is None or (rider_count is not None and len(roster) != rider_count):
+            roster = self._generate(site_id, rider_count)
+            candidate_index.load(site_id, roster)
         
-        for i in range(rider_count):
-            rider_id = f"rider_{site_id}_{i:03d}"
+        if active_only:
+            roster = roster.take(roster.status_mask(RiderStatus.ACTIVE))
             
-            # 模拟骑手状态分布
-            status_weights = [0.6, 0.2, 0.15, 0.05]  # active, inactive, busy, offline
-            status = np.random.choice(list(RiderStatus), p=status_weights)
+        return ToolOutput({
+            "site_id": site_id,
+            "total_riders": len(roster),
+            "riders": roster,
+            "last_updated": datetime.now().isoformat()
+        }, "rider_data", project_rider_data)
+    
+    def _generate(self, site_id: str, rider_count: int = None) -> RiderRoster:
+        """生成模拟花名册"""
+        rng = get_rng()
+        random = get_random()
+        
+        if rider_count is None:
+            rider_count = random.randint(30, 50)  # 每个站点30-50个骑手
+        n = rider_count
+        
+        # 按列一次性生成模拟骑手数据
+        now = int(datetime.now().timestamp())
+        columns = {
+            "local_index": np.arange(n),
+            "site": np.zeros(n),
+            # 模拟骑手状态分布：active, inactive, busy, offline
+            "status": rng.choice(len(STATUS_CODES), n, p=[0.6, 0.2, 0.15, 0.05]),
+            "phone": 13800000000 + rng.integers(10000000, 100000000, n),
             
-            if active_only and status != RiderStatus.ACTIVE:
-                continue
-                
-            rider = {
-                "rider_id": rider_id,
-                "name": f"骑手{i:03d}",
-                "phone": f"138{random.randint(10000000, 99999999)}",
-                "site_id": site_id,
-                "status": status.value,
-                
-                # 历史表现指标（模拟真实分布）
-                "acceptance_rate": max(0.3, min(1.0, np.random.normal(0.8, 0.15))),
-                "avg_response_time": max(30, int(np.random.normal(120, 40))),  # 秒
-                "completion_rate": max(0.7, min(1.0, np.random.normal(0.92, 0.08))),
-                "active_days": random.randint(10, 300),
-                
-                # 位置信息（模拟站点周边分布）
-                "current_latitude": 39.9042 + np.random.normal(0, 0.01),  # 北京附近
-                "current_longitude": 116.4074 + np.random.normal(0, 0.01),
-                "last_active_time": (datetime.now() - timedelta(hours=random.randint(0, 24))).isoformat(),
-                
-                # 额外特征
-                "avg_orders_per_day": random.randint(15, 40),
-                "peak_hour_availability": random.choice([True, False]),
-                "weekend_availability": random.choice([True, False]),
-                "holiday_experience": random.randint(0, 10),  # 节假日工作经验
-                "distance_to_site": random.uniform(0.5, 8.0),  # 距离站点距离
-            }
+            # 历史表现指标（模拟真实分布）
+            "acceptance_rate": np.clip(rng.normal(0.8, 0.15, n), 0.3, 1.0),
+            "avg_response_time": np.maximum(30, rng.normal(120, 40, n)),  # 秒
+            "completion_rate": np.clip(rng.normal(0.92, 0.08, n), 0.7, 1.0),
+            "active_days": rng.integers(10, 301, n),
             
-            riders.append(rider)
+            # 位置信息（模拟站点周边分布）
+            "current_latitude": 39.9042 + rng.normal(0, 0.01, n),  # 北京附近
+            "current_longitude": 116.4074 + rng.normal(0, 0.01, n),
+            "last_active_time": now - rng.integers(0, 25, n) * 3600,
             
-        return {
-            "site_id": site_id,
-            "total_riders": len(riders),
-            "riders": riders,
-            "last_updated": datetime.now().isoformat()
+            # 额外特征
+            "avg_orders_per_day": rng.integers(15, 41, n),
+            "peak_hour_availability": rng.random(n) < 0.5,
+            "weekend_availability": rng.random(n) < 0.5,
+            "holiday_experience": rng.integers(0, 11, n),  # 节假日工作经验
+            "distance_to_site": rng.uniform(0.5, 8.0, n),  # 距离站点距离
         }
+        return RiderRoster(columns, [site_id])
 
 class ProfileGeneratorTool(BaseTool):
     """画像生成工具"""
     name: str = "profile_generator_tool"
     description: str = "基于业务需求生成理想骑手画像"
     
+    @traced("tool.profile_generator_tool")
     def _run(self, target_date: str, required_count: int, urgency_level: str = "medium") -> Dict[str, Any]:
         """
         生成骑手画像（基于业务规则）
@@ -145,123 +161,76 @@ class CandidateSelectorTool(BaseTool):
     name: str = "candidate_selector_tool"
     description: str = "基于画像要求筛选和排序候选骑手"
     
+    @traced("tool.candidate_selector_tool")
     def _run(self, riders_data: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
         """
         筛选和排序候选骑手
-        """
-        riders = riders_data.get("riders", [])
-        candidates = []
         
-        for rider in riders:
-            # 基础条件筛选
-            if not self._meets_basic_requirements(rider, profile):
-                continue
-                
-            # 计算匹配得分
-            score = self._calculate_match_score(rider, profile)
-            
-            # 创建候选人对象
-            candidate = {
-                "rider_id": rider["rider_id"],
-                "name": rider["name"],
-                "phone": rider["phone"],
-                "score": score,
-                "distance": rider["distance_to_site"],
-                "availability": rider["status"] == "active",
-                "priority": self._determine_priority(score),
-                
-                # 详细信息
-                "acceptance_rate": rider["acceptance_rate"],
-                "response_time": rider["avg_response_time"],
-                "completion_rate": rider["completion_rate"],
-                "active_days": rider["active_days"],
-                "holiday_experience": rider.get("holiday_experience", 0)
-            }
-            
-            candidates.append(candidate)
-        
-        # 按得分排序
-        candidates.sort(key=lambda x: x["score"], reverse=True)
+        riders_data 可以是骑手数据工具的完整结果，也可以是其投影中的 riders_ref 引用
+        """
+        riders_data = resolve(riders_data, "riders_ref")
+        roster = riders_data.get("riders", [])
+        site_id = riders_data.get("site_id")
         
         # 限制候选人数量
         max_candidates = BUSINESS_RULES["rider_selection"]["max_candidates"]
         required_count = profile.get("required_count", 10)
         
-        # 取所需数量的1.5倍作为候选池，确保有备选
-        target_count = min(max_candidates, int(required_count * 1.5))
-        selected_candidates = candidates[:target_count]
+        # 按预测到岗概率排序，取以目标置信度凑够所需人数的最短拨打名单；
+        # 跳过当天已联系或近期联系过多的骑手，近期联系过的排到后面
+        if isinstance(roster, RiderRoster) and candidate_index.covers(site_id, roster):
+            # 已载入索引的站点：在索引锁内读取物化排名（骑手状态更新会同时修改堆）
+            selection, fill_probability, skipped, qualified = candidate_index.call_list(
+                site_id, profile, required_count, settings.RECALL_TARGET_CONFIDENCE, max_candidates,
+                guard=get_contact_guard()
+            )
+        else:
+            if not isinstance(roster, RiderRoster):
+                # LLM回传的骑手字典列表
+                roster = RiderRoster.from_records(roster)
+            ranking = CandidateRanking(roster, profile, get_acceptance_model())
+            selection, fill_probability, skipped = ranking.call_list(
+                required_count, settings.RECALL_TARGET_CONFIDENCE, max_candidates, guard=get_contact_guard()
+            )
+            qualified = len(ranking)
         
-        return {
-            "total_evaluated": len(riders),
-            "total_qualified": len(candidates),
-            "selected_count": len(selected_candidates),
-            "candidates": selected_candidates,
+        return ToolOutput({
+            "total_evaluated": len(roster),
+            "total_qualified": qualified,
+            "selected_count": len(selection),
+            "candidates": selection,
             "selection_criteria": profile,
-            "avg_score": np.mean([c["score"] for c in selected_candidates]) if selected_candidates else 0,
+            "avg_score": float(selection.scores.mean()) if len(selection) else 0,
+            "expected_attendance": round(float(selection.probabilities.sum()), 2),
+            "fill_probability": round(fill_probability, 4),
+            "target_confidence": settings.RECALL_TARGET_CONFIDENCE,
+            "skipped_recent_contacts": skipped,
             "selected_at": datetime.now().isoformat()
-        }
-    
-    def _meets_basic_requirements(self, rider: Dict[str, Any], profile: Dict[str, Any]) -> bool:
-        """检查是否满足基础要求"""
-        checks = [
-            rider["acceptance_rate"] >= profile["min_acceptance_rate"],
-            rider["avg_response_time"] <= profile["max_response_time"],
-            rider["completion_rate"] >= profile["min_completion_rate"],
-            rider["active_days"] >= profile["min_active_days"],
-            rider["distance_to_site"] <= profile["max_distance"],
-            rider["status"] == "active"  # 必须是活跃状态
-        ]
-        
-        return all(checks)
+        }, "selection", project_candidates)
+
+def select_with_tools(tools: Dict[str, BaseTool], site_id: str, target_date: str, required_riders: int, urgency: str = "medium",
+                      profile: Dict[str, Any] = None, rider_count: int = None) -> Dict[str, Any]:
+    """
+    依次调用骑手数据、画像生成、候选筛选工具完成筛选（确定性计算，LLM超时、失败或熔断时使用）
     
-    def _calculate_match_score(self, rider: Dict[str, Any], profile: Dict[str, Any]) -> float:
-        """计算匹配得分"""
-        score = 0.0
-        
-        # 接单率得分 (30%)
-        acceptance_score = min(1.0, rider["acceptance_rate"] / 0.9) * 30
-        score += acceptance_score
-        
-        # 响应时间得分 (20%)
-        response_score = max(0, (300 - rider["avg_response_time"]) / 300) * 20
-        score += response_score
+    Args:
+        tools: 工具名 -> 工具
+        profile: 已生成的骑手画像，为空时调用画像生成工具
+        rider_count: 每站骑手数（为空时沿用工具默认）
         
-        # 完成率得分 (25%)
-        completion_score = min(1.0, rider["completion_rate"] / 0.95) * 25
-        score += completion_score
-        
-        # 距离得分 (15%)
-        distance_score = max(0, (5.0 - rider["distance_to_site"]) / 5.0) * 15
-        score += distance_score
-        
-        # 经验得分 (10%)
-        experience_score = min(1.0, rider["active_days"] / 100) * 10
-        score += experience_score
-        
-        # 节假日经验加分
-        if profile.get("is_holiday") or profile.get("is_weekend"):
-            holiday_bonus = min(5, rider.get("holiday_experience", 0))
-            score += holiday_bonus
-            
-        # 可用性加分
-        if rider.get("peak_hour_availability"):
-            score += 3
-        if rider.get("weekend_availability") and profile.get("is_weekend"):
-            score += 3
-            
-        return round(score, 2)
-    
-    def _determine_priority(self, score: float) -> str:
-        """根据得分确定优先级"""
-        if score >= 80:
-            return "high"
-        elif score >= 60:
-            return "medium"
-        else:
-            return "low"
+    Returns:
+        Dict: 候选筛选工具的结果（candidates 为 CandidateSelection）
+    """
+    riders = tools["rider_data_tool"]._run(site_id=site_id, rider_count=rider_count)
+    profile = profile or tools["profile_generator_tool"]._run(
+        target_date=target_date,
+        required_count=required_riders,
+        urgency_level=urgency
+    )
+    return tools["candidate_selector_tool"]._run(riders_data=riders, profile=profile)
 
-def create_rider_profiler_agent() -> Agent:
-    """创建骑手画像Agent"""
+def create_rider_profiler_agent(tools: List[BaseTool] = None) -> Agent:
+    """创建骑手画像Agent（tools 为空时创建新的工具实例）"""
     
     return Agent(
         role="骑手画像专家",
@@ -272,7 +241,7 @@ def create_rider_profiler_agent() -> Agent:
         制定合适的筛选标准，确保召回的骑手既能满足业务需求，又有较高的响应意愿。
         你的筛选结果直接影响召回成功率和运营效率。
         """,
-        tools=[
+        tools=tools or [
             RiderDataTool(),
             ProfileGeneratorTool(),
             CandidateSelectorTool()
@@ -282,8 +251,14 @@ def create_rider_profiler_agent() -> Agent:
         max_iter=3
     )
 
-def create_profiler_task(agent: Agent, site_id: str, target_date: str, required_riders: int, urgency: str = "medium") -> Task:
-    """创建画像筛选任务"""
+def create_profiler_task(agent: Agent, site_id: str, target_date: str, required_riders: int, urgency: str = "medium",
+                         profile: Dict[str, Any] = None) -> Task:
+    """创建画像筛选任务（profile 为已生成的画像，提供时附在任务描述中）"""
+    
+    prepared = f"""
+        已生成的骑手画像（无需再调用画像生成工具）：
+        {json.dumps(profile, ensure_ascii=False)}
+        """ if profile else ""
     
     return Task(
         description=f"""
@@ -292,8 +267,8 @@ def create_profiler_task(agent: Agent, site_id: str, target_date: str, required_
         1. 获取站点所有活跃骑手的基础信息和历史表现数据
         2. 根据目标日期特点（是否节假日/周末）和紧急程度生成理想骑手画像
         3. 基于画像要求筛选符合条件的候选骑手
-        4. 计算每个候选人的匹配得分并排序
-        5. 返回排序后的候选骑手名单
+        4. 计算每个候选人的匹配得分与预测到岗概率，按到岗概率排序
+        5. 返回以目标置信度凑够所需人数的最短候选骑手名单
         
         筛选要求：
         - 需要骑手数量: {required_riders}人
@@ -307,10 +282,10 @@ def create_profiler_task(agent: Agent, site_id: str, target_date: str, required_
         - 最大距离: 5公里
         
         请确保返回结果包含：
-        - 候选骑手列表（按得分排序）
+        - 候选骑手列表（按预测到岗概率排序）
         - 每个候选人的详细信息和得分
         - 筛选统计信息
-        """,
+        {prepared}""",
         agent=agent,
         expected_output="""
         返回JSON格式的筛选结果，包含以下字段：
@@ -328,10 +303,13 @@ def create_profiler_task(agent: Agent, site_id: str, target_date: str, required_
                     "priority": "优先级",
                     "acceptance_rate": "接单率",
                     "response_time": "响应时间",
-                    "completion_rate": "完成率"
+                    "completion_rate": "完成率",
+                    "accept_probability": "预测到岗概率"
                 }
             ],
-            "avg_score": "平均得分"
+            "avg_score": "平均得分",
+            "expected_attendance": "期望到岗人数",
+            "selection_ref": "候选筛选工具返回的 selection_ref（原样返回，完整名单按此引用读取，candidates 可只列出骑手ID与得分）"
         }
         """
     )
@@ -340,9 +318,21 @@ class RiderProfilerService:
     """骑手画像服务类"""
     
     def __init__(self):
-        self.agent = create_rider_profiler_agent()
+        # Agent/Crew 按角色池化复用，构造服务几乎没有开销
+        self.pool = get_agent_pool("profiling", create_rider_profiler_agent)
+        self.tools = self.pool.tools
+    
+    def fetch_roster(self, site_id: str) -> int:
+        """预取站点花名册并载入排名索引（筛选时骑手数据工具直接命中），返回骑手数"""
+        return self.tools["rider_data_tool"]._run(site_id, active_only=False)["total_riders"]
+    
+    def build_profile(self, target_date: str, required_riders: int, urgency: str = "medium") -> Dict[str, Any]:
+        """生成骑手画像（不依赖站长决策，可提前生成）"""
+        return self.tools["profile_generator_tool"]._run(target_date, required_riders, urgency)
         
-    def select_candidates(self, site_id: str, target_date: str, required_riders: int, urgency: str = "medium") -> List[RiderCandidate]:
+    @traced("service.select_candidates", record_payload=False)
+    def select_candidates(self, site_id: str, target_date: str, required_riders: int, urgency: str = "medium",
+                          profile: Dict[str, Any] = None) -> List[RiderCandidate]:
         """
         筛选候选骑手
         
@@ -351,37 +341,46 @@ class RiderProfilerService:
             target_date: 目标日期
             required_riders: 需要的骑手数量
             urgency: 紧急程度 (high/medium/low)
+            profile: 已生成的骑手画像（build_profile 的结果）
             
         Returns:
             List[RiderCandidate]: 候选骑手列表
         """
         try:
-            # 创建筛选任务
-            task = create_profiler_task(self.agent, site_id, target_date, required_riders, urgency)
-            
-            # 创建Crew并执行
-            crew = Crew(
-                agents=[self.agent],
-                tasks=[task],
-                verbose=True
+            # 借出池中的Agent/Crew，绑定本次筛选任务后执行（超时、失败或熔断时直接用工具筛选）
+            selection_inputs = {
+                "site_id": site_id,
+                "target_date": target_date,
+                "required_riders": required_riders,
+                "urgency": urgency,
+                "profile": profile
+            }
+            result = self.pool.kickoff(
+                lambda agent: create_profiler_task(agent, site_id, target_date, required_riders, urgency, profile),
+                "profiling", selection_inputs, fallback=lambda: self._select(**selection_inputs)
             )
             
-            # 执行筛选
-            result = crew.kickoff()
-            
             # 解析结果
             if isinstance(result, str):
                 try:
                     result_data = json.loads(result)
                 except json.JSONDecodeError:
-                    # 如果不是JSON格式，返回模拟数据
-                    result_data = self._generate_mock_candidates(site_id, required_riders)
+                    # 如果不是JSON格式，直接用工具筛选
+                    result_data = self._select(**selection_inputs)
             else:
                 result_data = result
+            
+            # 按引用取回完整筛选结果（工具输出投影只给LLM看Top-K）
+            result_data = resolve(result_data, "selection_ref")
                 
+            # 确定性路径直接返回筛选结果，在此处才转换为RiderCandidate
+            selection = result_data.get("candidates", [])
+            if isinstance(selection, CandidateSelection):
+                return selection.to_candidates()
+            
             # 转换为RiderCandidate对象列表
             candidates = []
-            for candidate_data in result_data.get("candidates", []):
+            for candidate_data in selection:
                 candidate = RiderCandidate(
                     rider_id=candidate_data.get("rider_id", ""),
                     name=candidate_data.get("name", ""),
@@ -389,36 +388,95 @@ class RiderProfilerService:
                     score=candidate_data.get("score", 0.0),
                     distance=candidate_data.get("distance", 0.0),
                     availability=candidate_data.get("availability", True),
-                    priority=candidate_data.get("priority", "medium")
+                    priority=candidate_data.get("priority", "medium"),
+                    accept_probability=candidate_data.get("accept_probability")
                 )
                 candidates.append(candidate)
                 
             return candidates
             
         except Exception as e:
-            # 返回模拟候选人数据
-            return self._generate_mock_candidates(site_id, required_riders)
+            # 解析失败时直接用工具筛选
+            return self._select(site_id, target_date, required_riders, urgency, profile)["candidates"].to_candidates()
     
-    def _generate_mock_candidates(self, site_id: str, required_riders: int) -> List[RiderCandidate]:
-        """生成模拟候选人数据"""
-        import random
+    def site_demand(self, site_id: str, required_riders: int, urgency: str = "medium") -> SiteDemand:
+        """站点召回需求（模拟数据没有站点坐标，取花名册骑手位置的中心）"""
+        roster = self.tools["rider_data_tool"]._run(site_id, active_only=False)["riders"]
+        return SiteDemand(
+            site_id=site_id,
+            latitude=float(roster.columns["current_latitude"].mean()),
+            longitude=float(roster.columns["current_longitude"].mean()),
+            required_riders=required_riders,
+            urgency=urgency
+        )
+    
+    @traced("service.allocate_candidates", record_payload=False)
+    def allocate_candidates(self, demands: List[SiteDemand], target_date: str, roster: RiderRoster = None,
+                            radius_km: float = None, distance_weight: float = 2.0) -> Dict[str, List[RiderCandidate]]:
+        """
+        跨站点批量分配候选骑手
+        多个站点同时召回时一次求解，同一骑手最多出现在一个站点的名单中；
+        与单站筛选一样跳过达到联系上限的骑手，并按到岗概率截取以目标置信度凑够所需人数的最短名单
         
-        candidates = []
-        for i in range(min(required_riders * 2, 20)):  # 生成2倍数量的候选人
-            candidate = RiderCandidate(
-                rider_id=f"rider_{site_id}_{i:03d}",
-                name=f"骑手{i:03d}",
-                phone=f"138{random.randint(10000000, 99999999)}",
-                score=random.uniform(60, 95),
-                distance=random.uniform(0.5, 5.0),
-                availability=True,
-                priority=random.choice(["high", "medium", "low"])
-            )
-            candidates.append(candidate)
+        Args:
+            demands: 各站点的召回需求
+            target_date: 目标日期
+            roster: 参与分配的骑手，为空时合并各站点的花名册
+            radius_km: 候选边半径，默认取各站点画像最大距离的最大值
+            distance_weight: 每公里距离扣减的收益
             
-        # 按得分排序
-        candidates.sort(key=lambda x: x.score, reverse=True)
-        return candidates
+        Returns:
+            Dict[str, List[RiderCandidate]]: 站点ID -> 候选骑手列表
+        """
+        profile_tool = self.tools["profile_generator_tool"]
+        profiles = [profile_tool._run(target_date, demand.required_riders, demand.urgency) for demand in demands]
+        
+        if roster is None:
+            rider_tool = self.tools["rider_data_tool"]
+            roster = RiderRoster.concat([
+                rider_tool._run(demand.site_id, active_only=False)["riders"] for demand in demands
+            ])
+        
+        # 跳过达到联系上限的骑手（与单站筛选使用同一联系频次索引）
+        guard = get_contact_guard()
+        recent = np.zeros(len(roster), dtype=bool)
+        if guard is not None and len(roster):
+            blocked, recent = guard.classify([roster.rider_id(index) for index in range(len(roster))])
+            keep = ~np.asarray(blocked)
+            roster, recent = roster.take(keep), np.asarray(recent)[keep]
+        
+        # 分配名额取单站名单上限，各站点再按到岗概率截取最短拨打名单
+        max_candidates = BUSINESS_RULES["rider_selection"]["max_candidates"]
+        result = allocate(
+            roster,
+            [demand.site_id for demand in demands],
+            [demand.latitude for demand in demands],
+            [demand.longitude for demand in demands],
+            [max_candidates] * len(demands),
+            profiles,
+            radius_km=radius_km or max((profile["max_distance"] for profile in profiles), default=5.0),
+            distance_weight=distance_weight
+        )
+        
+        model = get_acceptance_model()
+        allocated = {}
+        for demand in demands:
+            selection = result["selections"][demand.site_id]
+            probabilities = model.score_roster(roster, selection.indices, distances=selection.distances)
+            # 按到岗概率降序，窗口内联系过的排到后面
+            order = np.lexsort((-probabilities, recent[selection.indices]))
+            count, _ = smallest_call_list(probabilities[order], demand.required_riders, settings.RECALL_TARGET_CONFIDENCE)
+            order = order[:count]
+            allocated[demand.site_id] = CandidateSelection(
+                roster, selection.indices[order], selection.scores[order], selection.distances[order],
+                probabilities=probabilities[order]
+            ).to_candidates()
+        return allocated
+    
+    def _select(self, site_id: str, target_date: str, required_riders: int, urgency: str = "medium",
+                profile: Dict[str, Any] = None) -> Dict[str, Any]:
+        """确定性筛选（与Agent使用同一组工具）"""
+        return select_with_tools(self.tools, site_id, target_date, required_riders, urgency, profile)
 
 # 使用示例
 if __name__ == "__main__":
@@ -0,0 +1,216 @@
+"""
+工具输出投影
+工具结果以 str(结果) 的形式进入Agent上下文。花名册、历史数据等完整结果按骑手/天数线性增长，
+这里把它们包装为 ToolOutput：按字典访问时仍是完整数据（确定性代码照常使用），
+转换为字符串时只给出聚合摘要、Top-K切片与紧凑表格（列名 + 行数组），
+完整数据放入进程内旁路存储，LLM回传引用（如 riders_ref）时由下游工具按引用读取。
+
+TOOL_OUTPUT_COMPACT 关闭时字符串形式与原字典一致，便于对比token用量。
+"""
+
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from config.settings import settings
+from models.roster import RiderRoster, CandidateSelection, STATUS_CODES
+
+class SideChannel:
+    """按引用保存完整工具结果（LRU，超出上限时淘汰最久未用的）"""
+
+    def __init__(self, max_items: int = None):
+        self.max_items = max_items or settings.TOOL_OUTPUT_REFS_MAX
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def put(self, kind: str, value: Any) -> str:
+        """保存结果，返回引用（如 ref:rider_data:12）"""
+        ref = f"ref:{kind}:{next(self._ids)}"
+        with self._lock:
+            self._items[ref] = value
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return ref
+
+    def get(self, ref: str) -> Any:
+        """
+        按引用读取
+
+        Raises:
+            KeyError: 引用不存在或已被淘汰
+        """
+        with self._lock:
+            value = self._items[ref]
+            self._items.move_to_end(ref)
+            return value
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+_side_channel: Optional[SideChannel] = None
+_side_channel_lock = threading.Lock()
+
+def get_side_channel() -> SideChannel:
+    """进程内共享的旁路存储"""
+    global _side_channel
+    with _side_channel_lock:
+        if _side_channel is None:
+            _side_channel = SideChannel()
+        return _side_channel
+
+def resolve(value: Any, ref_key: str = None) -> Any:
+    """
+    把LLM回传的引用还原为完整结果
+
+    Args:
+        value: 引用字符串、含 ref_key 的投影字典或完整结果
+        ref_key: 投影字典中引用所在的键
+    """
+    if isinstance(value, str) and value.startswith("ref:"):
+        return get_side_channel().get(value)
+    if ref_key and isinstance(value, dict) and ref_key in value:
+        return get_side_channel().get(value[ref_key])
+    return value
+
+class ToolOutput(dict):
+    """完整结果 + 面向LLM的投影（字符串形式为投影的紧凑JSON）"""
+
+    def __init__(self, data: Dict[str, Any], kind: str, project: Callable[["ToolOutput"], Dict[str, Any]]):
+        """
+        Args:
+            data: 完整结果
+            kind: 结果类型（引用前缀）
+            project: 完整结果 -> 投影
+        """
+        super().__init__(data)
+        self.kind = kind
+        self._project = project
+        self._ref: Optional[str] = None
+
+    @property
+    def ref(self) -> str:
+        """旁路存储中的引用（首次访问时保存）"""
+        if self._ref is None:
+            self._ref = get_side_channel().put(self.kind, self)
+        return self._ref
+
+    def compact(self) -> Dict[str, Any]:
+        return self._project(self)
+
+    def for_llm(self) -> Dict[str, Any]:
+        """交给LLM的内容：开启投影时为投影，否则为完整结果"""
+        return self.compact() if settings.TOOL_OUTPUT_COMPACT else self
+
+    def __repr__(self) -> str:
+        if not settings.TOOL_OUTPUT_COMPACT:
+            return dict.__repr__(self)
+        return json.dumps(self.compact(), ensure_ascii=False, separators=(",", ":"), default=str)
+
+    __str__ = __repr__
+
+def table(records: Sequence[Dict[str, Any]], columns: Sequence[str]) -> Dict[str, Any]:
+    """字典列表 -> 紧凑表格（列名只出现一次）"""
+    return {"columns": list(columns), "rows": [[record[column] for column in columns] for record in records]}
+
+def _stats(values: np.ndarray, digits: int = 3) -> Dict[str, float]:
+    if not len(values):
+        return {}
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        "mean": round(float(values.mean()), digits),
+        "p10": round(float(p10), digits),
+        "p50": round(float(p50), digits),
+        "p90": round(float(p90), digits)
+    }
+
+def project_rider_data(output: ToolOutput) -> Dict[str, Any]:
+    """花名册 -> 状态分布、指标分位数、按接单率的Top-K骑手"""
+    roster = output["riders"]
+    if not isinstance(roster, RiderRoster):
+        roster = RiderRoster.from_records(roster)
+    columns = roster.columns
+    top = np.argsort(-columns["acceptance_rate"], kind="stable")[:settings.TOOL_OUTPUT_TOP_K]
+    status_counts = np.bincount(columns["status"], minlength=len(STATUS_CODES))
+
+    return {
+        "site_id": output["site_id"],
+        "total_riders": output["total_riders"],
+        "status_counts": {code: int(count) for code, count in zip(STATUS_CODES, status_counts) if count},
+        "metrics": {
+            "acceptance_rate": _stats(columns["acceptance_rate"]),
+            "avg_response_time": _stats(columns["avg_response_time"], 0),
+            "completion_rate": _stats(columns["completion_rate"]),
+            "active_days": _stats(columns["active_days"], 0),
+            "distance_to_site": _stats(columns["distance_to_site"], 2)
+        },
+        "top_by_acceptance": table(
+            [
+                {
+                    "rider_id": roster.rider_id(int(index)),
+                    "status": roster.value("status", int(index)),
+                    "acceptance_rate": round(float(columns["acceptance_rate"][index]), 3),
+                    "response_time": int(columns["avg_response_time"][index]),
+                    "distance": round(float(columns["distance_to_site"][index]), 2)
+                }
+                for index in top
+            ],
+            ["rider_id", "status", "acceptance_rate", "response_time", "distance"]
+        ),
+        "riders_ref": output.ref,
+        "note": "完整骑手数据通过 riders_ref 引用，调用候选筛选工具时把 riders_ref 作为 riders_data 传入"
+    }
+
+def project_candidates(output: ToolOutput) -> Dict[str, Any]:
+    """筛选结果 -> 统计信息 + Top-K候选（ID、得分、到岗概率、距离）"""
+    selection = output["candidates"]
+    records: List[Dict[str, Any]] = selection.to_records() if isinstance(selection, CandidateSelection) else list(selection)
+    shown = [dict(record) for record in records[:settings.TOOL_OUTPUT_TOP_K]]
+    for record in shown:
+        record.setdefault("accept_probability", None)
+        record["score"] = round(record["score"], 1)
+
+    return {
+        "total_evaluated": output["total_evaluated"],
+        "total_qualified": output["total_qualified"],
+        "selected_count": output["selected_count"],
+        "avg_score": round(output["avg_score"], 2),
+        "expected_attendance": output["expected_attendance"],
+        "fill_probability": output["fill_probability"],
+        "candidates": table(shown, ["rider_id", "score", "accept_probability", "distance", "priority"]),
+        "omitted_candidates": len(records) - len(shown),
+        "selection_ref": output.ref,
+        "note": "完整候选名单（含姓名、电话）通过 selection_ref 引用，最终结果中原样返回 selection_ref"
+    }
+
+def project_history(output: ToolOutput) -> Dict[str, Any]:
+    """历史数据 -> 均值摘要 + 按天的紧凑表格"""
+    points = output["data_points"]
+    count = len(points) or 1
+    return {
+        "site_id": output["site_id"],
+        "days": len(points),
+        "avg_orders": round(sum(point["orders"] for point in points) / count, 2),
+        "avg_active_riders": round(sum(point["active_riders"] for point in points) / count, 2),
+        "avg_completion_rate": round(sum(point["completion_rate"] for point in points) / count, 3),
+        "avg_delivery_time": round(sum(point["avg_delivery_time"] for point in points) / count, 1),
+        "daily": table(
+            [{**point, "is_holiday": int(point["is_holiday"]), "is_weekend": int(point["is_weekend"])} for point in points],
+            ["date", "orders", "active_riders", "is_weekend", "is_holiday"]
+        )
+    }
+
+def project_trend(output: ToolOutput) -> Dict[str, Any]:
+    """24小时趋势 -> 起始小时 + 逐小时订单数组"""
+    hourly = output["hourly_orders"]
+    return {
+        "site_id": output["site_id"],
+        "growth_rate": round(output["growth_rate"], 4),
+        "peak_hours": output["peak_hours"],
+        "first_hour": hourly[0]["hour"] if hourly else None,
+        "hourly_orders": [hour["orders"] for hour in hourly],
+        "last_24h_orders": sum(hour["orders"] for hour in hourly)
+    }
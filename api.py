@@ -0,0 +1,96 @@
+"""
+即时物流骑手智能召回系统 - HTTP API
+基于FastAPI的服务接口，提供工作流执行与性能统计查询
+"""
+
+import asyncio
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+from main import LogisticsWorkflow, warm_start
+from agents.agent_pool import get_pool_stats
+from models.schemas import APIResponse
+from config.settings import settings, DESCRIPTION
+from utils.tracing import get_span_stats
+from utils.metrics import CONTENT_TYPE, render_metrics
+
+app = FastAPI(title=settings.APP_NAME, version=settings.VERSION, description=DESCRIPTION)
+
+# 各请求共用的工作流（服务中的Agent/Crew按角色池化，可并发复用）
+workflow = LogisticsWorkflow()
+
+@app.on_event("startup")
+def startup():
+    """启动时预热Agent池、模型与缓存"""
+    if settings.WARM_START_ENABLED:
+        warm_start(workflow)
+
+class WorkflowRequest(BaseModel):
+    """工作流执行请求"""
+    site_id: str = Field(..., description="站点ID")
+    target_date: str = Field(..., description="目标日期 YYYY-MM-DD")
+    manager_feedback: Optional[bool] = Field(None, description="站长反馈（为空时自动决策）")
+    profile: bool = Field(default=False, description="是否对本次运行做性能剖析")
+
+@app.get("/health")
+def health() -> APIResponse:
+    """健康检查"""
+    return APIResponse(success=True, message="ok", data={"version": settings.VERSION, "agent_pools": get_pool_stats()})
+
+@app.post("/workflows")
+def run_workflow(request: WorkflowRequest) -> APIResponse:
+    """执行完整召回工作流"""
+    result = asyncio.run(workflow.run_complete_workflow(
+        site_id=request.site_id,
+        target_date=request.target_date,
+        manager_feedback=request.manager_feedback,
+        profile=request.profile
+    ))
+    return APIResponse(
+        success=result["status"] == "completed",
+        message=result["message"],
+        data=result
+    )
+
+@app.post("/workflows/{workflow_id}/resume")
+def resume_workflow(workflow_id: str) -> APIResponse:
+    """从检查点继续失败或中断的工作流（已完成且输入未变化的阶段不再执行）"""
+    try:
+        result = asyncio.run(workflow.resume_workflow(workflow_id))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return APIResponse(
+        success=result["status"] == "completed",
+        message=result["message"],
+        data=result
+    )
+
+@app.post("/acceptance-model/retrain")
+def retrain_acceptance_model(min_samples: Optional[int] = None) -> APIResponse:
+    """用服务进程内累积的召回结果重新训练接受率模型，后续筛选按新模型排序"""
+    model = workflow.retrain_acceptance_model(min_samples)
+    if model is None:
+        return APIResponse(success=False, message="召回样本不足，接受率模型未更新",
+                           data={"calls": len(workflow.call_history)})
+    return APIResponse(success=True, message="ok", data={"trained_on": model.trained_on})
+
+@app.get("/traces/stats")
+def trace_stats(name: Optional[str] = None) -> APIResponse:
+    """
+    查询span耗时直方图
+
+    name 为空时返回全部span（stage.*、crew.kickoff、tool.*、call.attempt 等）
+    """
+    return APIResponse(success=True, message="ok", data=get_span_stats(name))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Prometheus指标导出"""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT)
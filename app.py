@@ -12,11 +12,10 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 from typing import Dict, Any
 
-from main import LogisticsWorkflow
-from agents.prediction_agent import PredictionService, PredictionRequest
-from agents.decision_agent import DecisionService
-from agents.rider_profiler_agent import RiderProfilerService
+from main import LogisticsWorkflow, warm_start
+from agents.prediction_agent import PredictionRequest
 from config.settings import settings
+from utils.metrics import start_metrics_server
 
 # 页面配置
 st.set_page_config(
@@ -65,6 +64,14 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_workflow() -> LogisticsWorkflow:
+    """进程内共用的工作流（首次调用时预热，之后每次按钮点击直接复用）"""
+    workflow = LogisticsWorkflow()
+    if settings.WARM_START_ENABLED:
+        warm_start(workflow)
+    return workflow
+
 def init_session_state():
     """初始化会话状态"""
     if 'workflow_result' not in st.session_state:
@@ -130,8 +137,8 @@ def create_prediction_section():
     if st.button("🚀 开始预测", type="primary"):
         with st.spinner("正在分析运力需求..."):
             try:
-                # 创建预测服务
-                prediction_service = PredictionService()
+                # 复用预热过的预测服务
+                prediction_service = get_workflow().prediction_service
                 
                 # 执行预测
                 request = PredictionRequest(
@@ -223,6 +230,12 @@ def create_workflow_section():
             "拒绝召回": False
         }
         feedback_value = feedback_map[manager_feedback]
+        
+        profile_enabled = st.checkbox(
+            "性能剖析",
+            value=False,
+            help="记录本次运行的调用栈采样与内存分配热点"
+        )
     
     if st.button("🚀 启动完整工作流", type="primary", key="start_workflow"):
         # 创建进度条
@@ -230,15 +243,16 @@ def create_workflow_section():
         status_text = st.empty()
         
         try:
-            # 创建工作流实例
-            workflow = LogisticsWorkflow()
+            # 复用预热过的工作流
+            workflow = get_workflow()
             
             # 执行工作流
             status_text.text("正在执行工作流...")
             result = asyncio.run(workflow.run_complete_workflow(
                 site_id=site_id,
                 target_date=target_date.strftime('%Y-%m-%d'),
-                manager_feedback=feedback_value
+                manager_feedback=feedback_value,
+                profile=profile_enabled
             ))
             
             progress_bar.progress(100)
@@ -256,6 +270,9 @@ def create_workflow_section():
             # 显示结果
             display_workflow_result(result)
             
+            if "profile_dir" in result:
+                st.info(f"📁 剖析结果: {result['profile_dir']}")
+            
         except Exception as e:
             st.error(f"❌ 工作流执行失败: {str(e)}")
             progress_bar.progress(0)
@@ -400,7 +417,7 @@ def create_demo_section():
     if st.button("🎯 运行演示", type="primary"):
         with st.spinner("正在运行演示场景..."):
             try:
-                workflow = LogisticsWorkflow()
+                workflow = get_workflow()
                 result = asyncio.run(workflow.run_complete_workflow(
                     site_id=scenario["site_id"],
                     target_date=scenario["date"],
@@ -417,6 +434,8 @@ def main():
     """主函数"""
     # 初始化
     init_session_state()
+    start_metrics_server()
+    get_workflow()
     
     # 页面标题
     st.markdown('<h1 class="main-header">🚚 即时物流骑手智能召回系统</h1>', unsafe_allow_html=True)
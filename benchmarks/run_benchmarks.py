@@ -0,0 +1,661 @@
+"""
+召回流程基准测试
+覆盖各数据工具、三个服务与端到端工作流，使用固定种子与本地LLM替身（agents/llm_backend.py），
+结果写入JSON文件，并可与基线对比标记性能回退
+
+用法:
+    python -m benchmarks.run_benchmarks --sites 1,10 --riders 50,500,5000
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/baseline.json
+    python -m benchmarks.run_benchmarks --output benchmarks/results/baseline.json
+    python -m benchmarks.run_benchmarks --suite load --load-sites 100 --llm-latency 2 --llm-jitter 1.5 --llm-dist lognormal
+"""
+
+import os
+
+# 基准测试不应依赖真实模型或把时间花在日志与trace导出上
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("TRACE_EXPORT_ENABLED", "false")
+# 重复运行同一工作流时不应因联系频次限制或拨打限流而改变工作量
+os.environ.setdefault("CONTACT_GUARD_ENABLED", "false")
+os.environ.setdefault("CALL_RATE_ENABLED", "false")
+# 基准只衡量计算本身，不写数据库与检查点
+os.environ.setdefault("DB_PERSIST_ENABLED", "false")
+os.environ.setdefault("CHECKPOINT_ENABLED", "false")
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from crewai import Crew
+from agents.crew_runner import set_kickoff_backend
+from agents.prediction_agent import (PredictionService, PredictionRequest, HistoricalDataTool, OrderTrendTool,
+                                    create_prediction_agent, create_prediction_task)
+from agents.decision_agent import DecisionService, DecisionRequest
+from agents.rider_profiler_agent import RiderProfilerService, RiderDataTool, ProfileGeneratorTool, CandidateSelectorTool
+from agents.llm_backend import LocalLLM, LATENCY_DISTRIBUTIONS
+from config.settings import settings
+from data.synthetic_world import WorldConfig, generate_world, synthetic_transcripts
+from main import LogisticsWorkflow
+from models.acceptance import AcceptanceModel, training_data_from_world
+from models.allocation import allocate
+from models.database import Repository, create_db_engine
+from models.intent import LEVELS, IntentWorkerPool, analyze_batch, get_tokenizer
+from models.ranking import CandidateRanking, candidate_index
+from models.roster import RiderRoster
+from models.schemas import CallRecord, CallStatus
+from models.write_behind import CallWriteBuffer
+from utils.call_scheduler import CallScheduler, OUTCOME_AGREED, OUTCOME_REJECTED, OUTCOME_NO_ANSWER
+from utils.circuit_breaker import get_llm_breaker
+from utils.metrics import KICKOFF_FALLBACKS
+from utils.random_state import get_random, get_rng, seeded
+
+DEFAULT_OUTPUT = "benchmarks/results/latest.json"
+TARGET_DATE = "2024-02-14"
+
+def _parse_ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+def measure(func: Callable[[], Any], repeat: int, seed: int, warmup: int = 1) -> Dict[str, float]:
+    """
+    重复执行并统计耗时（每次执行使用相同种子，保证工作量一致）
+
+    Returns:
+        Dict: min/median/mean/p95/max（秒）与执行次数
+    """
+    for _ in range(warmup):
+        with seeded(seed):
+            func()
+
+    timings = []
+    for _ in range(repeat):
+        with seeded(seed):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "repeat": repeat,
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "p95": timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+        "max": timings[-1]
+    }
+
+def bench_data(sites_sweep: List[int], riders_sweep: List[int], repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """合成世界生成基准（骑手数按每站骑手数 × 站点数计）"""
+    results = {}
+    for sites in sites_sweep:
+        for riders in riders_sweep:
+            config = WorldConfig(n_sites=sites, n_riders=sites * riders, days=365, n_calls=sites * riders, seed=seed)
+            results[f"data.generate_world[sites={sites},riders={riders}]"] = measure(
+                lambda: generate_world(config), repeat, seed
+            )
+    return results
+
+def bench_tools(riders_sweep: List[int], repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """数据工具基准"""
+    results = {}
+
+    historical_tool = HistoricalDataTool()
+    trend_tool = OrderTrendTool()
+    rider_tool = RiderDataTool()
+    profile_tool = ProfileGeneratorTool()
+    selector_tool = CandidateSelectorTool()
+
+    results["tool.historical_data_tool[days=30]"] = measure(lambda: historical_tool._run("site_001", 30), repeat, seed)
+    results["tool.order_trend_tool"] = measure(lambda: trend_tool._run("site_001"), repeat, seed)
+
+    profile = profile_tool._run(TARGET_DATE, 10, "medium")
+    for riders in riders_sweep:
+        results[f"tool.rider_data_tool[riders={riders}]"] = measure(
+            lambda: rider_tool._run("site_001", rider_count=riders, refresh=True), repeat, seed
+        )
+        with seeded(seed):
+            riders_data = rider_tool._run("site_001", rider_count=riders, refresh=True)
+        # 首次（预热）物化排名，之后为召回时的取前N名
+        results[f"tool.candidate_selector_tool[riders={riders}]"] = measure(
+            lambda: selector_tool._run(riders_data, profile), repeat, seed
+        )
+        results[f"ranking.rebuild[riders={riders}]"] = measure(
+            lambda: candidate_index.ranking("site_001", profile).rebuild(), repeat, seed
+        )
+        rider_id = riders_data["riders"].rider_id(0)
+        results[f"ranking.update_rider[riders={riders}]"] = measure(
+            lambda: candidate_index.update_rider("site_001", rider_id, distance_to_site=get_rng().uniform(0.5, 8.0)),
+            repeat, seed
+        )
+
+    return results
+
+def bench_services(riders_sweep: List[int], repeat: int, seed: int, llm: LocalLLM) -> Dict[str, Dict[str, float]]:
+    """三个服务的基准（kickoff由本地LLM替身执行）"""
+    results = {}
+
+    prediction_service = PredictionService()
+    decision_service = DecisionService()
+    profiler_service = RiderProfilerService()
+
+    prediction_request = PredictionRequest(site_id="site_001", target_date=TARGET_DATE)
+    results["service.prediction"] = measure(lambda: prediction_service.predict_demand(prediction_request), repeat, seed)
+
+    with seeded(seed):
+        prediction = prediction_service.predict_demand(prediction_request)
+    decision_request = DecisionRequest(site_id="site_001", prediction_result=prediction, manager_feedback=True)
+    results["service.decision"] = measure(lambda: decision_service.make_decision(decision_request), repeat, seed)
+
+    for riders in riders_sweep:
+        llm.rider_count = riders
+        results[f"service.profiling[riders={riders}]"] = measure(
+            lambda: profiler_service.select_candidates("site_001", TARGET_DATE, 10, "high"), repeat, seed
+        )
+    llm.rider_count = None
+
+    return results
+
+def bench_setup(repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """每次请求的准备开销：逐次新建Agent/Crew（池化前）vs 从池中借出并绑定任务，以及构造三个服务"""
+    request = PredictionRequest(site_id="site_001", target_date=TARGET_DATE)
+    pool = PredictionService().pool
+    pool.prefill()
+
+    def fresh():
+        agent = create_prediction_agent()
+        Crew(agents=[agent], tasks=[create_prediction_task(agent, request)], verbose=True)
+
+    def pooled():
+        lease = pool.acquire()
+        lease.bind(create_prediction_task(lease.agent, request))
+        pool.release(lease)
+
+    return {
+        "setup.prediction[fresh]": measure(fresh, repeat, seed),
+        "setup.prediction[pooled]": measure(pooled, repeat, seed),
+        "setup.services_init": measure(lambda: (PredictionService(), DecisionService(), RiderProfilerService()), repeat, seed)
+    }
+
+def bench_tokens(riders_sweep: List[int], seed: int) -> Dict[str, Dict[str, Any]]:
+    """
+    每次kickoff的估算token数：完整工具结果进入上下文（verbose）vs 工具输出投影（compact）
+    预测阶段不提供预取数据，Agent需要自己调用数据工具
+    """
+    usage: Dict[str, Dict[str, Any]] = {}
+    prediction_service = PredictionService()
+    decision_service = DecisionService()
+    profiler_service = RiderProfilerService()
+    prediction_request = PredictionRequest(site_id="site_001", target_date=TARGET_DATE)
+    compact = settings.TOOL_OUTPUT_COMPACT
+    try:
+        for riders in riders_sweep:
+            modes = {}
+            for mode in ("verbose", "compact"):
+                settings.TOOL_OUTPUT_COMPACT = mode == "compact"
+                llm = LocalLLM(rider_count=riders, seed=seed)
+                set_kickoff_backend(llm)
+                with seeded(seed):
+                    prediction = prediction_service.predict_demand(prediction_request)
+                    decision_service.make_decision(
+                        DecisionRequest(site_id="site_001", prediction_result=prediction, manager_feedback=True)
+                    )
+                    profiler_service.select_candidates("site_001", TARGET_DATE, 10, "high")
+                modes[mode] = {
+                    stage: {
+                        "prompt_tokens_per_kickoff": totals["prompt_tokens"] // totals["calls"],
+                        "completion_tokens_per_kickoff": totals["completion_tokens"] // totals["calls"]
+                    }
+                    for stage, totals in llm.by_stage.items()
+                }
+            modes["reduction"] = {
+                stage: 1 - modes["compact"][stage]["prompt_tokens_per_kickoff"] / modes["verbose"][stage]["prompt_tokens_per_kickoff"]
+                for stage in modes["verbose"]
+            }
+            usage[f"riders={riders}"] = modes
+    finally:
+        settings.TOOL_OUTPUT_COMPACT = compact
+    return usage
+
+def bench_batch(sites: int, seed: int) -> Dict[str, Dict[str, Any]]:
+    """
+    多站点预测与决策：逐站点kickoff vs 按token预算打包的批量kickoff（节假日，全部站点同意召回）
+    记录LLM调用次数、估算token数与耗时
+    """
+    prediction_service = PredictionService()
+    decision_service = DecisionService()
+    requests = [PredictionRequest(site_id=f"site_{index + 1:03d}", target_date=TARGET_DATE) for index in range(sites)]
+    with seeded(seed):
+        data = [{name: fetch() for name, fetch in prediction_service._fetchers(request).items()} for request in requests]
+
+    def per_site():
+        predictions = [prediction_service.predict_demand(request, site_data) for request, site_data in zip(requests, data)]
+        for prediction in predictions:
+            if prediction.has_gap:
+                decision_service.make_decision(
+                    DecisionRequest(site_id=prediction.site_id, prediction_result=prediction, manager_feedback=True)
+                )
+
+    def batched():
+        predictions = prediction_service.predict_batch(requests, data)
+        decision_service.decide_batch([
+            DecisionRequest(site_id=prediction.site_id, prediction_result=prediction, manager_feedback=True)
+            for prediction in predictions if prediction.has_gap
+        ])
+
+    usage = {}
+    for mode, run in (("per_site", per_site), ("batched", batched)):
+        llm = LocalLLM(seed=seed)
+        set_kickoff_backend(llm)
+        start = time.perf_counter()
+        with seeded(seed):
+            run()
+        usage[mode] = {**llm.stats(), "seconds": round(time.perf_counter() - start, 4)}
+    usage["call_reduction"] = usage["per_site"]["calls"] / max(1, usage["batched"]["calls"])
+    return {f"sites={sites}": usage}
+
+def _fallback_counts() -> Dict[str, int]:
+    """各阶段、各原因的确定性回退累计次数"""
+    return {
+        f"{stage}.{reason}": int(KICKOFF_FALLBACKS.value(stage=stage, reason=reason))
+        for stage in settings.AGENT_STAGE_TIMEOUTS
+        for reason in ("timeout", "error", "circuit_open")
+    }
+
+def bench_load(sites: int, seed: int, llm: LocalLLM) -> Dict[str, Dict[str, Any]]:
+    """
+    压测：按生产并发（BATCH_SITE_CONCURRENCY、MAX_CONCURRENT_AGENTS）批量运行全部站点，
+    LLM由本地替身按配置的延迟分布、失败率与非JSON比例模拟；
+    记录吞吐、LLM调用统计与确定性回退次数
+    """
+    workflow = LogisticsWorkflow()
+    site_ids = [f"site_{index + 1:03d}" for index in range(sites)]
+    llm.reset_stats()
+    get_llm_breaker().reset()
+    fallbacks_before = _fallback_counts()
+    start = time.perf_counter()
+    with seeded(seed):
+        outcomes = asyncio.run(workflow.run_batch(site_ids, TARGET_DATE, manager_feedback=True))
+    seconds = time.perf_counter() - start
+    fallbacks = {
+        key: count - fallbacks_before[key] for key, count in _fallback_counts().items() if count > fallbacks_before[key]
+    }
+    # 模拟失败可能使熔断器打开，避免影响后续用例
+    get_llm_breaker().reset()
+
+    statuses: Dict[str, int] = {}
+    for outcome in outcomes:
+        statuses[outcome.get("status", "unknown")] = statuses.get(outcome.get("status", "unknown"), 0) + 1
+    return {f"sites={sites}": {
+        "seconds": round(seconds, 4),
+        "sites_per_second": round(sites / seconds, 2),
+        "statuses": statuses,
+        "llm": llm.stats(),
+        "fallbacks": fallbacks,
+        "concurrency": {"sites": settings.BATCH_SITE_CONCURRENCY, "kickoffs": settings.MAX_CONCURRENT_AGENTS}
+    }}
+
+def bench_workflow(sites_sweep: List[int], riders_sweep: List[int], repeat: int, seed: int, llm: LocalLLM) -> Dict[str, Dict[str, float]]:
+    """端到端工作流基准：按站点数 × 骑手数扫描"""
+    results = {}
+    workflow = LogisticsWorkflow()
+
+    def run_sites(count: int):
+        for index in range(count):
+            asyncio.run(workflow.run_complete_workflow(
+                site_id=f"site_{index + 1:03d}",
+                target_date=TARGET_DATE,
+                manager_feedback=True
+            ))
+
+    for sites in sites_sweep:
+        for riders in riders_sweep:
+            llm.rider_count = riders
+            results[f"workflow.e2e[sites={sites},riders={riders}]"] = measure(lambda: run_sites(sites), repeat, seed)
+    llm.rider_count = None
+
+    return results
+
+def bench_allocation(sites_sweep: List[int], riders_sweep: List[int], repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """跨站点分配基准（合成世界的站点与骑手位置，每站缺口10人）"""
+    results = {}
+    profile = ProfileGeneratorTool()._run(TARGET_DATE, 10, "high")
+    for sites in sites_sweep:
+        for riders in riders_sweep:
+            world = generate_world(WorldConfig(n_sites=sites, n_riders=sites * riders, days=30, n_calls=1, seed=seed))
+            roster = RiderRoster.from_world(world)
+            site_ids = [f"site_{index + 1:03d}" for index in range(sites)]
+            results[f"allocation[sites={sites},riders={riders}]"] = measure(
+                lambda: allocate(roster, site_ids, world["sites"]["latitude"], world["sites"]["longitude"],
+                                 [15] * sites, [profile] * sites, radius_km=profile["max_distance"]),
+                repeat, seed
+            )
+    return results
+
+def bench_scheduler(sites_sweep: List[int], riders_sweep: List[int], repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """分级拨打调度基准（即时返回的假拨打：50%未接通、10%同意，一半站点设补位人数）"""
+    results = {}
+    tiers = ["high", "medium", "low"]
+
+    async def dial(job) -> str:
+        draw = get_random().random()
+        if draw < 0.5:
+            return OUTCOME_NO_ANSWER
+        return OUTCOME_AGREED if draw < 0.6 else OUTCOME_REJECTED
+
+    def schedule(sites: int, riders: int):
+        random = get_random()
+        scheduler = CallScheduler(dial, interval_unit=0.0, concurrency=100)
+        for site in range(sites):
+            site_id = f"site_{site + 1:03d}"
+            if site % 2:
+                scheduler.set_target(site_id, max(1, riders // 20))
+            for rider in range(riders):
+                scheduler.submit(site_id, f"{site_id}_R{rider:05d}", random.choice(tiers))
+        asyncio.run(scheduler.run())
+
+    for sites in sites_sweep:
+        for riders in riders_sweep:
+            results[f"scheduler[sites={sites},riders={riders}]"] = measure(
+                lambda: schedule(sites, riders), repeat, seed
+            )
+    return results
+
+def bench_intent(riders_sweep: List[int], repeat: int, seed: int) -> Dict[str, Any]:
+    """
+    通话意愿识别：单进程与进程池（CPU核数）分析合成转写的耗时与每核吞吐（条/秒/核）
+    """
+    results: Dict[str, Any] = {}
+    throughput: Dict[str, Any] = {}
+    workers = os.cpu_count() or 1
+    get_tokenizer()
+    pool = IntentWorkerPool(workers)
+    pool.warmup()
+    try:
+        for riders in riders_sweep:
+            count = riders * 20
+            rng = get_rng()
+            texts = synthetic_transcripts([LEVELS[index] for index in rng.integers(0, len(LEVELS), count)], rng)
+            inline = measure(lambda: analyze_batch(texts), repeat, seed)
+            pooled = measure(lambda: pool.analyze(texts), repeat, seed)
+            results[f"intent.inline[transcripts={count}]"] = inline
+            results[f"intent.pool[transcripts={count},workers={workers}]"] = pooled
+            throughput[f"transcripts={count}"] = {
+                "inline_per_core": count / inline["median"],
+                "pool_per_core": count / pooled["median"] / workers,
+                "workers": workers
+            }
+    finally:
+        pool.close()
+    return {"results": results, "throughput": throughput}
+
+def bench_writes(riders_sweep: List[int], repeat: int) -> Dict[str, Any]:
+    """
+    通话状态写入：每通电话经历 PENDING → CALLING → CONNECTED → COMPLETED 四次更新，
+    经延迟写入缓冲合并后批量写入临时SQLite，统计含最终刷盘的总耗时与每秒状态更新数
+    """
+    results: Dict[str, Any] = {}
+    throughput: Dict[str, Any] = {}
+    statuses = (CallStatus.PENDING, CallStatus.CALLING, CallStatus.CONNECTED, CallStatus.COMPLETED)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/writes.db")
+        repository = Repository(engine)
+        try:
+            for riders in riders_sweep:
+                count = riders * 20
+                now = datetime.now()
+
+                def run():
+                    buffer = CallWriteBuffer(repository)
+                    for index in range(count):
+                        record = CallRecord(call_id=f"bench_{index}", task_id=f"task_{index % 10}", rider_id=f"rider_{index}",
+                                            phone="", status=CallStatus.PENDING, start_time=now)
+                        for status in statuses:
+                            record.status = status
+                            buffer.put(record)
+                    buffer.close()
+
+                # 状态写入不涉及随机数，种子只为与其他用例保持同一调用方式
+                timing = measure(run, repeat, 0)
+                results[f"writes.call_status[calls={count},updates={count * len(statuses)}]"] = timing
+                throughput[f"calls={count}"] = {
+                    "updates_per_second": count * len(statuses) / timing["median"],
+                    "rows": repository.count("calls")
+                }
+        finally:
+            repository.dispose()
+    return {"results": results, "throughput": throughput}
+
+def bench_acceptance(riders_sweep: List[int], repeat: int, seed: int) -> Dict[str, Any]:
+    """
+    接受率模型：训练/批量打分耗时，以及按模型期望估算的每补位拨打数
+    （旧规则：按匹配得分取所需人数1.5倍；新规则：按到岗概率取达到目标置信度的最短名单）
+    """
+    results: Dict[str, Any] = {}
+    policy: Dict[str, Any] = {}
+    profile = ProfileGeneratorTool()._run(TARGET_DATE, 10, "medium")
+    for riders in riders_sweep:
+        world = generate_world(WorldConfig(n_sites=1, n_riders=riders, days=90, n_calls=riders * 20, seed=seed))
+        X, y = training_data_from_world(world)
+        model = AcceptanceModel().fit(X, y)
+        roster = RiderRoster.from_world(world)
+
+        results[f"acceptance.fit[calls={len(X)}]"] = measure(lambda: AcceptanceModel().fit(X, y), repeat, seed)
+        results[f"acceptance.score_roster[riders={riders}]"] = measure(
+            lambda: model.score_roster(roster, hour=10, weekday=2), repeat, seed
+        )
+
+        by_score = CandidateRanking(roster, profile).top(15)
+        old_expected = float(model.score_roster(roster, by_score.indices, hour=10, weekday=2).sum())
+        selection, fill_probability, _ = CandidateRanking(roster, profile, model).call_list(10, 0.9, 50, hour=10, weekday=2)
+        new_expected = float(selection.probabilities.sum())
+        policy[f"riders={riders}"] = {
+            "score_rule_calls": len(by_score),
+            "score_rule_calls_per_fill": len(by_score) / old_expected if old_expected else None,
+            "model_rule_calls": len(selection),
+            "model_rule_calls_per_fill": len(selection) / new_expected if new_expected else None,
+            "model_rule_fill_probability": fill_probability
+        }
+    return {"results": results, "policy": policy}
+
+def bench_memory(riders_sweep: List[int], seed: int) -> Dict[str, Dict[str, int]]:
+    """骑手数据内存占用：按列花名册 vs 每骑手一个字典"""
+    results = {}
+    rider_tool = RiderDataTool()
+    for riders in riders_sweep:
+        with seeded(seed):
+            roster = rider_tool._run("site_001", active_only=False, rider_count=riders, refresh=True)["riders"]
+
+        tracemalloc.start()
+        records = roster.to_records()
+        dict_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        compact = RiderRoster.from_records(records)
+        roster_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del records
+
+        results[f"memory.rider_roster[riders={riders}]"] = {
+            "dict_bytes": dict_bytes,
+            "roster_bytes": roster_bytes,
+            "column_bytes": compact.nbytes,
+            "bytes_per_rider_dict": dict_bytes // max(1, riders),
+            "bytes_per_rider_roster": roster_bytes // max(1, riders)
+        }
+    return results
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    与基线对比中位数耗时
+
+    Returns:
+        List[Dict]: 每个共同用例的对比结果，regression=True 表示超过阈值
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or base["median"] <= 0:
+            continue
+        ratio = result["median"] / base["median"]
+        rows.append({
+            "case": name,
+            "baseline": base["median"],
+            "current": result["median"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold
+        })
+    return rows
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="召回流程基准测试")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例重复次数")
+    parser.add_argument("--sites", default="1,5", help="站点数扫描，逗号分隔")
+    parser.add_argument("--riders", default="50,500", help="每站骑手数扫描，逗号分隔")
+    parser.add_argument("--batch-sites", type=int, default=200, help="批量预测/决策用例的站点数")
+    parser.add_argument("--load-sites", type=int, default=50, help="压测用例的站点数")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="本地LLM平均延迟（秒）")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="本地LLM延迟标准差（秒）")
+    parser.add_argument("--llm-dist", default="normal", choices=LATENCY_DISTRIBUTIONS, help="本地LLM延迟分布")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="本地LLM模拟失败概率")
+    parser.add_argument("--llm-malformed-rate", type=float, default=0.0, help="本地LLM返回非JSON文本的概率")
+    parser.add_argument("--suite", default="data,tools,setup,services,allocation,scheduler,intent,writes,acceptance,workflow,memory,tokens,batch", help="要运行的用例组（另有 load）")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="结果文件路径")
+    parser.add_argument("--baseline", default=None, help="基线结果文件，提供时进行回退对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="回退判定阈值（中位数变慢比例）")
+
+    args = parser.parse_args()
+    suites = set(args.suite.split(","))
+    riders_sweep = _parse_ints(args.riders)
+
+    llm = LocalLLM(latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed, distribution=args.llm_dist,
+                   failure_rate=args.llm_failure_rate, malformed_rate=args.llm_malformed_rate)
+    set_kickoff_backend(llm)
+
+    results: Dict[str, Dict[str, float]] = {}
+    if "data" in suites:
+        results.update(bench_data(_parse_ints(args.sites), riders_sweep, args.repeat, args.seed))
+    if "tools" in suites:
+        results.update(bench_tools(riders_sweep, args.repeat, args.seed))
+    if "setup" in suites:
+        results.update(bench_setup(args.repeat, args.seed))
+    if "services" in suites:
+        results.update(bench_services(riders_sweep, args.repeat, args.seed, llm))
+    if "allocation" in suites:
+        results.update(bench_allocation(_parse_ints(args.sites), riders_sweep, args.repeat, args.seed))
+    if "scheduler" in suites:
+        results.update(bench_scheduler(_parse_ints(args.sites), riders_sweep, args.repeat, args.seed))
+    if "workflow" in suites:
+        results.update(bench_workflow(_parse_ints(args.sites), riders_sweep, args.repeat, args.seed, llm))
+
+    acceptance_policy = {}
+    if "acceptance" in suites:
+        acceptance = bench_acceptance(riders_sweep, args.repeat, args.seed)
+        results.update(acceptance["results"])
+        acceptance_policy = acceptance["policy"]
+    intent_throughput = {}
+    if "intent" in suites:
+        intent = bench_intent(riders_sweep, args.repeat, args.seed)
+        results.update(intent["results"])
+        intent_throughput = intent["throughput"]
+    write_throughput = {}
+    if "writes" in suites:
+        writes = bench_writes(riders_sweep, args.repeat)
+        results.update(writes["results"])
+        write_throughput = writes["throughput"]
+    memory = bench_memory(riders_sweep, args.seed) if "memory" in suites else {}
+    token_usage = {}
+    if "tokens" in suites:
+        token_usage = bench_tokens(riders_sweep, args.seed)
+        set_kickoff_backend(llm)
+    batch_usage = {}
+    if "batch" in suites:
+        batch_usage = bench_batch(args.batch_sites, args.seed)
+        set_kickoff_backend(llm)
+    load = bench_load(args.load_sites, args.seed, llm) if "load" in suites else {}
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "llm_latency": args.llm_latency,
+            "llm_jitter": args.llm_jitter,
+            "llm_dist": args.llm_dist,
+            "llm_failure_rate": args.llm_failure_rate,
+            "llm_malformed_rate": args.llm_malformed_rate,
+            "llm": llm.stats()
+        },
+        "results": results,
+        "memory": memory,
+        "acceptance_policy": acceptance_policy,
+        "intent_throughput": intent_throughput,
+        "write_throughput": write_throughput,
+        "token_usage": token_usage,
+        "batch_usage": batch_usage,
+        "load": load
+    }
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(f"{'用例':<55} {'中位数(ms)':>12} {'p95(ms)':>12}")
+    for name, result in results.items():
+        print(f"{name:<55} {result['median'] * 1000:>12.3f} {result['p95'] * 1000:>12.3f}")
+    for name, result in memory.items():
+        print(f"{name:<55} dict={result['bytes_per_rider_dict']}B/骑手 roster={result['bytes_per_rider_roster']}B/骑手")
+    for name, result in intent_throughput.items():
+        print(f"{'intent.throughput[' + name + ']':<55} 单进程={result['inline_per_core']:,.0f}条/秒/核 "
+              f"进程池={result['pool_per_core']:,.0f}条/秒/核")
+    for name, result in write_throughput.items():
+        print(f"{'writes.throughput[' + name + ']':<55} {result['updates_per_second']:,.0f}次状态更新/秒")
+    for name, modes in token_usage.items():
+        for stage, reduction in modes["reduction"].items():
+            print(f"{'tokens.' + stage + '[' + name + ']':<55} 完整={modes['verbose'][stage]['prompt_tokens_per_kickoff']:,} "
+                  f"投影={modes['compact'][stage]['prompt_tokens_per_kickoff']:,} tokens/次 (-{reduction:.0%})")
+    for name, usage in batch_usage.items():
+        print(f"{'batch.llm[' + name + ']':<55} 逐站点={usage['per_site']['calls']}次/{usage['per_site']['prompt_tokens']:,}tokens "
+              f"批量={usage['batched']['calls']}次/{usage['batched']['prompt_tokens']:,}tokens (调用减少{usage['call_reduction']:.0f}倍)")
+    for name, result in load.items():
+        print(f"{'load[' + name + ']':<55} {result['seconds']:.2f}秒 {result['sites_per_second']:.2f}站点/秒 "
+              f"LLM调用={result['llm']['calls']}次 回退={sum(result['fallbacks'].values())}次")
+    print(f"\n结果已写入 {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        rows = compare(report, baseline, args.threshold)
+        regressions = [row for row in rows if row["regression"]]
+
+        print(f"\n与基线对比 ({args.baseline}, 阈值 +{args.threshold:.0%}):")
+        for row in rows:
+            flag = "回退" if row["regression"] else "正常"
+            print(f"  [{flag}] {row['case']}: {row['baseline'] * 1000:.3f}ms -> {row['current'] * 1000:.3f}ms ({row['ratio']:.2f}x)")
+
+        if regressions:
+            print(f"\n发现 {len(regressions)} 个性能回退")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
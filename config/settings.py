@@ -18,6 +18,16 @@ class Settings(BaseSettings):
     
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./logistics_system.db"
+    DB_PERSIST_ENABLED: bool = True  # 工作流结果是否写入数据库
+    DB_POOL_SIZE: int = 5  # 连接池大小（也是异步写入线程数）
+    DB_MAX_OVERFLOW: int = 10  # 连接池溢出上限
+    DB_POOL_RECYCLE: int = 1800  # 连接回收时间（秒）
+    DB_BATCH_SIZE: int = 1000  # 批量写入每批行数
+    DB_BUSY_TIMEOUT: float = 5.0  # SQLite等待写锁时间（秒）
+    DB_ECHO: bool = False  # 是否输出SQL
+    CALL_WRITE_FLUSH_SIZE: int = 2000  # 通话记录延迟写入：攒够该条数即刷盘
+    CALL_WRITE_FLUSH_INTERVAL: float = 0.5  # 通话记录延迟写入：最长刷盘间隔（秒）
+    CALL_WRITE_BUFFER_MAX: int = 20000  # 通话记录延迟写入：待写通话数上限（背压）
     
     # API配置
     API_HOST: str = "0.0.0.0"
@@ -32,6 +42,46 @@ class Settings(BaseSettings):
     MAX_CALL_ATTEMPTS: int = 3  # 最大拨打次数
     CALL_TIMEOUT: int = 30  # 通话超时时间（秒）
     RECALL_BATCH_SIZE: int = 10  # 批量召回数量
+    RECALL_TARGET_CONFIDENCE: float = 0.9  # 拨打名单凑够所需人数的目标置信度
+    ACCEPTANCE_MODEL_PATH: str = "data/models/acceptance.json"  # 接受率模型文件
+    ACCEPTANCE_RETRAIN_MIN_SAMPLES: int = 200  # 重新训练接受率模型所需的最少召回结果数
+    ACCEPTANCE_AUTO_RETRAIN: bool = True  # 批量运行与继续未完成工作流后用累积的召回结果重新训练接受率模型
+    CALL_RETRY_UNIT_SECONDS: float = 60.0  # call_intervals 每单位对应秒数（模拟执行时为0，不真实等待）
+    CALL_CONCURRENCY: int = 20  # 同时进行的拨打数上限
+    
+    # 拨打限流配置
+    CALL_RATE_ENABLED: bool = True  # 是否对拨打限流
+    CALL_RATE_BACKEND: str = "sqlite"  # sqlite / redis / memory
+    CALL_RATE_DB_PATH: str = "data/rate_limits.db"  # sqlite后端的共享状态文件
+    CALL_RATE_GLOBAL: float = 50.0  # 全局每秒拨打数
+    CALL_RATE_PER_SITE: float = 10.0  # 单站点每秒拨打数
+    CALL_RATE_PER_PROVIDER: float = 30.0  # 单线路供应商每秒拨打数
+    CALL_RATE_BURST_SECONDS: float = 3.0  # 桶容量 = 速率 × 该秒数
+    CALL_RATE_LEASE: int = 5  # 每次从共享存储租用的令牌数
+    CALL_RATE_MAX_WAIT: float = 30.0  # 单次拨打最长等待令牌时间（秒）
+    CALL_PROVIDER: str = "default"  # 当前线路供应商
+    
+    # 任务队列配置
+    JOB_QUEUE_PATH: str = "data/jobs.db"  # 任务队列SQLite文件（同机多进程共享）
+    JOB_VISIBILITY_TIMEOUT: float = 120.0  # 租约时长（秒），worker崩溃后任务在此之后重新可见
+    JOB_MAX_ATTEMPTS: int = 3  # 单个任务最多处理次数（含首次）
+    JOB_RETRY_BASE_SECONDS: float = 2.0  # 失败重试退避初始间隔（秒），每次翻倍
+    JOB_RETRY_MAX_SECONDS: float = 60.0  # 失败重试退避最长间隔（秒）
+    JOB_MAX_QUEUED: int = 1000  # 单个任务类型待处理任务数上限，超过时提交方等待
+    JOB_POLL_INTERVAL: float = 0.2  # 空闲worker轮询间隔（秒）
+    JOB_CONCURRENCY: Dict[str, int] = {"prediction": 4, "decision": 4, "selection": 2, "dial": 2}  # 各任务类型并发数
+    
+    # 检查点配置
+    CHECKPOINT_ENABLED: bool = True  # 是否保存工作流各阶段输出，失败后可从检查点继续
+    CHECKPOINT_DB_PATH: str = "data/checkpoints.db"  # 检查点SQLite文件
+    CHECKPOINT_STALE_SECONDS: float = 1800.0  # running 工作流超过该秒数没有心跳（阶段检查点）视为已中断，可被继续
+    
+    # 联系频次配置
+    CONTACT_GUARD_ENABLED: bool = True  # 候选筛选是否跳过/降级近期联系过的骑手
+    CONTACT_DB_PATH: str = "data/contact_history.db"  # 联系记录持久化文件
+    CONTACT_WINDOW_DAYS: int = 7  # 滑动窗口天数
+    CONTACT_DAILY_LIMIT: int = 1  # 单日最多联系次数
+    CONTACT_WINDOW_LIMIT: int = 3  # 窗口内最多联系次数
     
     # 分析配置
     SUCCESS_RATE_TARGET: float = 0.85  # 目标成功率
@@ -45,7 +95,10 @@ class Settings(BaseSettings):
     
     # 通话分析配置
     INTENT_CONFIDENCE_THRESHOLD: float = 0.8  # 意愿识别置信度阈值
-    CALL_ANALYSIS_MODEL: str = "sentiment_analysis"  # 通话分析模型
+    CALL_ANALYSIS_MODEL: str = "sentiment_analysis"  # 通话分析模型（内置词表；或已训练模型的JSON路径）
+    INTENT_WORKERS: int = 0  # 意愿分析进程数，0或负数表示不使用进程池（在工作线程中分析）
+    INTENT_BATCH_SIZE: int = 64  # 流式分析每批条数
+    INTENT_POOL_MIN_BATCH: int = 32  # 达到该批量才提交进程池，否则在当前进程分析
     
     # 节假日配置
     HOLIDAY_API_URL: str = "https://api.holiday.com"  # 节假日API
@@ -60,10 +113,55 @@ class Settings(BaseSettings):
     LOG_FILE: str = "logs/system.log"
     LOG_ROTATION: str = "1 day"
     LOG_RETENTION: str = "30 days"
+    LOG_ENQUEUE: bool = True  # 日志经队列由后台线程落盘
+    LOG_JSON_ENABLED: bool = False  # 是否输出结构化JSON日志
+    LOG_JSON_FILE: str = "logs/system.jsonl"
+    LOG_EVENT_RATE_LIMIT: float = 20.0  # 高频事件日志每类每秒放行条数
+    LOG_EVENT_BURST: int = 50  # 高频事件日志突发容量
+    
+    # 追踪配置
+    TRACING_ENABLED: bool = True  # 是否记录span耗时
+    TRACE_EXPORT_ENABLED: bool = True  # 工作流结束后是否导出trace文件
+    TRACE_DIR: str = "logs/traces"  # trace文件目录（Chrome Trace Event格式）
+    
+    # 指标配置
+    METRICS_PORT: int = 9108  # 独立 /metrics 端点端口（0表示不启动）
+    
+    # 剖析配置
+    PROFILE_DIR: str = "logs/profiles"  # 剖析产物目录（按workflow_id分目录）
+    PROFILE_MODE: str = "sampling"  # sampling 或 deterministic
+    PROFILE_SAMPLE_INTERVAL: float = 0.005  # 采样间隔（秒）
+    PROFILE_TRACEMALLOC_FRAMES: int = 10  # tracemalloc保留的栈深度
     
     # Agent配置
-    AGENT_TIMEOUT: int = 60  # Agent执行超时时间（秒）
-    MAX_CONCURRENT_AGENTS: int = 5  # 最大并发Agent数量
+    AGENT_TIMEOUT: int = 60  # Agent执行超时时间（秒），超时后放弃等待并改走确定性计算
+    AGENT_STAGE_TIMEOUTS: Dict[str, float] = {
+        "prediction": 60, "decision": 30, "profiling": 60, "prediction_batch": 180, "decision_batch": 120
+    }  # 各阶段超时，未配置的阶段使用 AGENT_TIMEOUT
+    MAX_CONCURRENT_AGENTS: int = 5  # 最大并发Agent数量（kickoff工作线程数）
+    LLM_BREAKER_FAILURES: int = 3  # LLM连续超时/失败多少次后熔断
+    LLM_BREAKER_RESET_SECONDS: float = 30  # 熔断多少秒后放行探测调用
+    AGENT_POOL_SIZE: int = 8  # 每个角色预建并复用的Agent/Crew数量（借完时临时创建）
+    WARM_START_ENABLED: bool = True  # 进程启动时预建Agent池并加载模型、词典与缓存
+    
+    # LLM后端配置
+    LLM_BACKEND: str = "crewai"  # crewai（真实模型）或 local（本地确定性替身，无需网络）
+    LOCAL_LLM_LATENCY: float = 0.0  # 本地替身每次kickoff的平均延迟（秒）
+    LOCAL_LLM_JITTER: float = 0.0  # 延迟标准差（秒）
+    LOCAL_LLM_LATENCY_DIST: str = "normal"  # fixed / normal / lognormal / exponential
+    LOCAL_LLM_FAILURE_RATE: float = 0.0  # 模拟调用失败的概率
+    LOCAL_LLM_MALFORMED_RATE: float = 0.0  # 返回非JSON文本的概率（覆盖文本解析回退路径）
+    LOCAL_LLM_SEED: int = 0  # 延迟、失败抽样的随机种子
+    
+    # 批量提示词配置
+    LLM_BATCH_TOKEN_BUDGET: int = 8000  # 多站点批量任务每次kickoff的token预算（输入 + 预计输出）
+    LLM_BATCH_MAX_SITES: int = 40  # 每批最多站点数
+    BATCH_SITE_CONCURRENCY: int = 8  # 批量运行时并发执行后续阶段（筛选、召回）的站点数
+    
+    # 工具输出配置
+    TOOL_OUTPUT_COMPACT: bool = True  # 工具结果以摘要/Top-K/紧凑表格进入LLM上下文，完整数据按引用读取
+    TOOL_OUTPUT_TOP_K: int = 10  # 投影中保留的骑手/候选人数
+    TOOL_OUTPUT_REFS_MAX: int = 256  # 旁路存储保留的完整结果数
     
     # 外部服务配置
     WEATHER_API_KEY: str = ""  # 天气API密钥
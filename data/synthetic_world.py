@@ -0,0 +1,348 @@
+"""
+城市级合成数据生成器
+一次性向量化生成站点、骑手、日/小时订单与拨打结果，输出为按列存储的
+.npz 文件，供数据存储、基准测试与仿真直接加载
+
+各字段分布与 RiderDataTool / HistoricalDataTool / OrderTrendTool 的模拟逻辑一致；
+所有随机数来自同一个带种子的 np.random.Generator，相同配置与种子生成完全相同的数据。
+
+用法:
+    python -m data.synthetic_world --sites 200 --riders 1000000 --days 730 --output data/worlds/beijing
+"""
+
+import argparse
+import json
+import time
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+from models.schemas import RiderStatus, IntentLevel
+
+# 表名 -> 列名 -> 列数组
+World = Dict[str, Dict[str, np.ndarray]]
+
+# 节假日（月-日）
+HOLIDAY_DATES = ("01-01", "02-14", "05-01", "10-01")
+
+# 骑手状态编码顺序与分布（active, inactive, busy, offline）
+STATUS_CODES: List[str] = [status.value for status in RiderStatus]
+STATUS_WEIGHTS = (0.6, 0.2, 0.15, 0.05)
+
+# 一天24小时的订单基线（高峰15、次高峰8、低峰3）
+HOURLY_BASE = np.array(
+    [3, 3, 3, 3, 3, 3, 3, 8, 8, 8, 8, 15, 15, 15, 8, 8, 8, 8, 15, 15, 15, 3, 3, 3],
+    dtype=np.float32
+)
+
+EARTH_RADIUS_KM = 6371.0
+
+# 拨打的接通率与同意后的到岗率（召回模拟执行与历史拨打共用）
+CONNECT_RATE = 0.8
+ATTEND_RATE = 0.9
+
+# 合成通话转写的话术（按意愿等级）
+TRANSCRIPT_OPENINGS = ("喂，你好", "你好，我是骑手", "嗯，哪位", "喂", "你好，站点的吧")
+TRANSCRIPT_PHRASES: Dict[str, Tuple[str, ...]] = {
+    IntentLevel.STRONG.value: (
+        "可以的，没问题", "好的，我明天准时到", "行，我一定来", "放心吧，肯定到岗",
+        "愿意的，节日加班没问题", "好，我能来，几点到站点"
+    ),
+    IntentLevel.HESITANT.value: (
+        "我看看吧，到时候再说", "可能可以，不一定", "我考虑一下", "尽量吧，不确定能不能来",
+        "也许能来，我再看看安排", "试试吧，到时候告诉你"
+    ),
+    IntentLevel.NEUTRAL.value: (
+        "嗯，知道了", "收到，我了解一下", "哦，听到了", "嗯嗯，你说", "知道了，还有别的事吗"
+    ),
+    IntentLevel.REJECT.value: (
+        "不行，我回老家了", "没空，节日要休息", "不去了，家里有事", "算了吧，我不干了",
+        "没时间，别打了", "不行，我已经辞职了"
+    )
+}
+
+# 留出话术：不由内置词表的模板拼成，用于评估分类器在没见过的说法上的准确率
+TRANSCRIPT_HELDOUT_PHRASES: Dict[str, Tuple[str, ...]] = {
+    IntentLevel.STRONG.value: (
+        "成，明早我就过去", "这个活我接了", "来来来，算我一个", "妥了，早上七点到", "包在我身上"
+    ),
+    IntentLevel.HESITANT.value: (
+        "得看家里情况", "现在说不好", "等我问问家里人", "要是有空就过去", "回头给你答复"
+    ),
+    IntentLevel.NEUTRAL.value: (
+        "明白，你继续说", "晓得了", "这样啊", "你是说节日那几天是吧", "好像听说过"
+    ),
+    IntentLevel.REJECT.value: (
+        "那几天真去不了", "已经买了回家的票", "我不跑了", "今年不打算接单了", "家里走不开"
+    )
+}
+
+def synthetic_transcripts(intents: List[str], rng: np.random.Generator,
+                          phrases: Dict[str, Tuple[str, ...]] = None) -> List[str]:
+    """
+    按意愿等级生成合成通话转写（开场白 + 1~2句对应话术）
+
+    Args:
+        intents: 每通电话的意愿等级（IntentLevel 值）
+        rng: 随机数生成器
+        phrases: 各等级的话术，默认 TRANSCRIPT_PHRASES（与内置词表同源，只适合测吞吐）
+    """
+    phrases = phrases or TRANSCRIPT_PHRASES
+    openings = rng.integers(0, len(TRANSCRIPT_OPENINGS), len(intents))
+    extra = rng.random(len(intents)) < 0.4
+    transcripts = []
+    for intent, opening, twice in zip(intents, openings, extra):
+        candidates = phrases[intent]
+        picks = rng.integers(0, len(candidates), 2 if twice else 1)
+        transcripts.append("，".join([TRANSCRIPT_OPENINGS[opening]] + [candidates[pick] for pick in picks]) + "。")
+    return transcripts
+
+@dataclass
+class WorldConfig:
+    """合成世界配置"""
+    n_sites: int = 50
+    n_riders: int = 10000
+    days: int = 365  # 日订单历史天数
+    hourly_days: int = 28  # 小时订单历史天数
+    n_calls: int = 100000  # 历史拨打记录数
+    seed: int = 42
+    city: str = "北京"
+    center: Tuple[float, float] = (39.9042, 116.4074)
+    city_radius_deg: float = 0.15  # 站点分布范围（度）
+    rider_spread_deg: float = 0.03  # 骑手相对站点的位置标准差（度）
+    end_date: str = field(default_factory=lambda: str(np.datetime64("today", "D")))
+
+def site_code(index: int) -> str:
+    """站点序号 -> 站点ID"""
+    return f"site_{index + 1:03d}"
+
+def rider_code(index: int) -> str:
+    """骑手序号 -> 骑手ID"""
+    return f"rider_{index:07d}"
+
+def haversine_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """向量化球面距离（公里）"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def _calendar(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """由 datetime64[D] 数组计算周末与节假日标记"""
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 为周四
+    months = days.astype("datetime64[M]")
+    month = months.astype(np.int64) % 12 + 1
+    day_of_month = (days - months.astype("datetime64[D]")).astype(np.int64) + 1
+    holiday_codes = [int(item[:2]) * 100 + int(item[3:]) for item in HOLIDAY_DATES]
+    return weekday >= 5, np.isin(month * 100 + day_of_month, holiday_codes)
+
+def generate_sites(config: WorldConfig, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """生成站点表"""
+    n = config.n_sites
+    return {
+        "site": np.arange(n, dtype=np.int32),
+        "latitude": config.center[0] + rng.uniform(-config.city_radius_deg, config.city_radius_deg, n),
+        "longitude": config.center[1] + rng.uniform(-config.city_radius_deg, config.city_radius_deg, n),
+        "coverage_radius": np.full(n, 5.0, dtype=np.float32)
+    }
+
+def generate_riders(config: WorldConfig, sites: Dict[str, np.ndarray], rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """生成骑手表（每列一个数组）"""
+    n = config.n_riders
+    site = rng.integers(0, config.n_sites, n, dtype=np.int32)
+
+    latitude = sites["latitude"][site] + rng.normal(0, config.rider_spread_deg, n)
+    longitude = sites["longitude"][site] + rng.normal(0, config.rider_spread_deg, n)
+    distance = haversine_km(latitude, longitude, sites["latitude"][site], sites["longitude"][site])
+
+    now = np.datetime64(config.end_date, "s").astype(np.int64) + 86400
+    return {
+        "rider": np.arange(n, dtype=np.int32),
+        "site": site,
+        "status": rng.choice(len(STATUS_CODES), n, p=STATUS_WEIGHTS).astype(np.int8),
+        "acceptance_rate": np.clip(rng.normal(0.8, 0.15, n), 0.3, 1.0).astype(np.float32),
+        "avg_response_time": np.maximum(30, rng.normal(120, 40, n)).astype(np.int32),
+        "completion_rate": np.clip(rng.normal(0.92, 0.08, n), 0.7, 1.0).astype(np.float32),
+        "active_days": rng.integers(10, 301, n, dtype=np.int16),
+        "latitude": latitude,
+        "longitude": longitude,
+        "last_active_time": now - rng.integers(0, 25, n) * 3600,
+        "avg_orders_per_day": rng.integers(15, 41, n, dtype=np.int16),
+        "peak_hour_availability": rng.random(n) < 0.5,
+        "weekend_availability": rng.random(n) < 0.5,
+        "holiday_experience": rng.integers(0, 11, n, dtype=np.int8),
+        "distance_to_site": distance.astype(np.float32)
+    }
+
+def generate_daily_orders(config: WorldConfig, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """生成站点×日的订单历史"""
+    end = np.datetime64(config.end_date, "D")
+    days = np.arange(end - config.days + 1, end + 1)
+    is_weekend, is_holiday = _calendar(days)
+
+    base = 100.0 * np.where(is_weekend, 1.3, 1.0) * np.where(is_holiday, 1.8, 1.0)
+    # 站点规模系数，使不同站点的订单量级有差异
+    site_scale = rng.uniform(0.6, 1.6, config.n_sites)
+    shape = (config.n_sites, config.days)
+
+    orders = base[None, :] * site_scale[:, None] + rng.normal(0, 20, shape)
+    return {
+        "site": np.repeat(np.arange(config.n_sites, dtype=np.int32), config.days),
+        "day": np.tile(days.astype(np.int32), config.n_sites),
+        "orders": np.maximum(0, orders).astype(np.int32).ravel(),
+        "active_riders": rng.integers(15, 25, shape, dtype=np.int16).ravel(),
+        "completion_rate": rng.uniform(0.85, 0.98, shape).astype(np.float32).ravel(),
+        "avg_delivery_time": rng.integers(25, 45, shape, dtype=np.int16).ravel(),
+        "is_weekend": np.tile(is_weekend, config.n_sites),
+        "is_holiday": np.tile(is_holiday, config.n_sites)
+    }
+
+def generate_hourly_orders(config: WorldConfig, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """生成站点×小时的订单历史"""
+    end = np.datetime64(config.end_date, "D") + 1
+    hours = np.arange(
+        (end - config.hourly_days).astype("datetime64[h]"),
+        end.astype("datetime64[h]")
+    )
+    hour_of_day = hours.astype(np.int64) % 24
+    shape = (config.n_sites, hours.size)
+
+    orders = HOURLY_BASE[hour_of_day][None, :] + rng.normal(0, 3, shape)
+    return {
+        "site": np.repeat(np.arange(config.n_sites, dtype=np.int32), hours.size),
+        "hour": np.tile(hours.astype(np.int64) * 3600, config.n_sites),
+        "orders": np.maximum(0, orders).astype(np.int16).ravel()
+    }
+
+def generate_calls(config: WorldConfig, riders: Dict[str, np.ndarray], rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    生成历史拨打与出勤结果
+
+    接通率约80%；接通后同意概率随接单率、距离、节假日经验和拨打时段变化，
+    同意后约90%实际出勤，为后续接受率模型提供可学习的信号。
+    """
+    n = config.n_calls
+    rider = rng.integers(0, config.n_riders, n, dtype=np.int32)
+    end = np.datetime64(config.end_date, "D").astype(np.int64)
+    day = (end - rng.integers(0, config.days, n)).astype(np.int32)
+    hour = rng.choice(np.arange(8, 21), n).astype(np.int8)
+    weekday = ((day.astype(np.int64) + 3) % 7).astype(np.int8)
+
+    acceptance = riders["acceptance_rate"][rider]
+    distance = riders["distance_to_site"][rider]
+    experience = riders["holiday_experience"][rider]
+
+    logit = (
+        -1.0
+        + 3.0 * (acceptance - 0.8)
+        - 0.25 * (distance - 3.0)
+        + 0.08 * experience
+        - 0.3 * (hour >= 19)
+        + 0.2 * (weekday >= 5)
+    )
+    agree_probability = 1.0 / (1.0 + np.exp(-logit))
+
+    connected = rng.random(n) < CONNECT_RATE
+    agreed = connected & (rng.random(n) < agree_probability)
+    attended = agreed & (rng.random(n) < ATTEND_RATE)
+
+    return {
+        "rider": rider,
+        "site": riders["site"][rider],
+        "day": day,
+        "hour": hour,
+        "weekday": weekday,
+        "connected": connected,
+        "agreed": agreed,
+        "attended": attended,
+        "duration": np.where(connected, rng.integers(15, 91, n), 0).astype(np.int16),
+        "delay_minutes": np.where(attended, rng.exponential(5.0, n), 0).astype(np.int16)
+    }
+
+def generate_world(config: WorldConfig) -> World:
+    """
+    生成完整合成世界
+
+    Args:
+        config: 生成配置
+
+    Returns:
+        World: 表名 -> 列字典
+    """
+    rng = np.random.default_rng(config.seed)
+    sites = generate_sites(config, rng)
+    riders = generate_riders(config, sites, rng)
+    return {
+        "sites": sites,
+        "riders": riders,
+        "orders_daily": generate_daily_orders(config, rng),
+        "orders_hourly": generate_hourly_orders(config, rng),
+        "calls": generate_calls(config, riders, rng)
+    }
+
+def save_world(world: World, path: str, config: WorldConfig = None) -> Path:
+    """按表写出列式 .npz 文件与元信息"""
+    target = Path(path)
+    target.mkdir(parents=True, exist_ok=True)
+    for table, columns in world.items():
+        np.savez(target / f"{table}.npz", **columns)
+
+    meta = {
+        "tables": {table: int(len(next(iter(columns.values())))) for table, columns in world.items()},
+        "status_codes": STATUS_CODES
+    }
+    if config is not None:
+        meta["config"] = asdict(config)
+    (target / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    return target
+
+def load_world(path: str, tables: List[str] = None) -> World:
+    """
+    加载列式文件
+
+    Args:
+        path: save_world 写出的目录
+        tables: 仅加载指定表，默认全部
+    """
+    source = Path(path)
+    names = tables or [file.stem for file in sorted(source.glob("*.npz"))]
+    world = {}
+    for table in names:
+        with np.load(source / f"{table}.npz") as data:
+            world[table] = {column: data[column] for column in data.files}
+    return world
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="生成城市级合成数据")
+    parser.add_argument("--sites", type=int, default=50, help="站点数")
+    parser.add_argument("--riders", type=int, default=10000, help="骑手数")
+    parser.add_argument("--days", type=int, default=365, help="日订单历史天数")
+    parser.add_argument("--hourly-days", type=int, default=28, help="小时订单历史天数")
+    parser.add_argument("--calls", type=int, default=100000, help="历史拨打记录数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--output", required=True, help="输出目录")
+
+    args = parser.parse_args()
+    config = WorldConfig(
+        n_sites=args.sites,
+        n_riders=args.riders,
+        days=args.days,
+        hourly_days=args.hourly_days,
+        n_calls=args.calls,
+        seed=args.seed
+    )
+
+    start = time.perf_counter()
+    world = generate_world(config)
+    generated = time.perf_counter() - start
+    target = save_world(world, args.output, config)
+
+    print(f"生成耗时 {generated:.2f}秒，写出耗时 {time.perf_counter() - start - generated:.2f}秒")
+    for table, columns in world.items():
+        rows = len(next(iter(columns.values())))
+        size = sum(column.nbytes for column in columns.values())
+        print(f"  {table}: {rows}行, {size / 1024 / 1024:.1f}MB")
+    print(f"已写入 {target}")
+
+if __name__ == "__main__":
+    main()
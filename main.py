@@ -5,20 +5,97 @@
 
 import argparse
 import asyncio
+import inspect
 from datetime import datetime
-from typing import Dict, Any, List
+from collections import deque
+from typing import Callable, Dict, Any, Deque, List, Optional, Union
 import json
+import time
+import uuid
+from contextlib import contextmanager
 
 from agents.prediction_agent import PredictionService, PredictionRequest
 from agents.decision_agent import DecisionService, DecisionRequest
 from agents.rider_profiler_agent import RiderProfilerService
-from models.schemas import WorkflowStatus, APIResponse
+from agents.crew_runner import get_kickoff_backend
+from agents.tool_output import get_side_channel
+from models.schemas import (WorkflowStatus, APIResponse, CallRecord, CallStatus, AttendanceRecord, IntentLevel, AnalyticsResult,
+                            RecallTask, PredictionResult, DecisionResult, RiderCandidate)
+from models.analytics import AnalyticsEngine, reprocess
+from models.database import RepositorySession, get_async_repository
+from models.intent import IntentStream, get_intent_pool, get_intent_classifier, get_tokenizer
+from models.write_behind import get_call_writer
+from models.acceptance import AcceptanceModel, training_data_from_records, set_acceptance_model, get_acceptance_model
+from models.ranking import candidate_index
+from data.synthetic_world import ATTEND_RATE, CONNECT_RATE, synthetic_transcripts
 from config.settings import settings
-from utils.logger import setup_logger
+from utils.logger import setup_logger, log_sampled, log_performance
+from utils.tracing import tracer
+from utils.random_state import get_random, get_rng
+from utils.circuit_breaker import get_llm_breaker
+from utils.contact_guard import get_contact_guard
+from utils.rate_limiter import get_call_rate_limiter
+from utils.call_scheduler import CallScheduler, CallJob, OUTCOME_AGREED, OUTCOME_REJECTED, OUTCOME_NO_ANSWER, OUTCOME_LIMITED, OUTCOME_SKIPPED
+from utils.profiler import WorkflowProfiler, profiled
+from utils.dag import DAG
+from utils.checkpoint import WORKFLOW_COMPLETED, WORKFLOW_FAILED, get_checkpoint_store, input_hash
+from utils.job_queue import STATUS_DONE, Job, JobQueue, WorkerPool, get_job_queue
+from utils.metrics import WORKFLOWS_STARTED, WORKFLOWS_COMPLETED, WORKFLOW_DURATION, STAGE_DURATION, CALLS, registry, record_cache_access
 
 # 设置日志
 logger = setup_logger(__name__)
 
+# 工作流结果 -> 指标标签
+WORKFLOW_OUTCOMES = {
+    "无需召回": "no_gap",
+    "召回被拒绝": "rejected",
+    "召回成功": "recalled",
+    "执行失败": "failed"
+}
+
+# 队列模式下的任务类型（按工作流阶段）
+JOB_PREDICTION = "prediction"
+JOB_DECISION = "decision"
+JOB_SELECTION = "selection"
+JOB_DIAL = "dial"
+
+# 内存中保留的召回结果条数上限
+RECALL_HISTORY_LIMIT = 50000
+
+def new_workflow_id(site_id: str) -> str:
+    """新工作流ID（时间戳便于阅读，随机后缀保证同一秒内对同一站点的多次运行互不共用检查点）"""
+    return f"workflow_{site_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+class WorkflowRun:
+    """
+    单次工作流运行的状态（进度与剖析会话）
+    
+    同一个 LogisticsWorkflow 会被并发请求共用（API、批量运行），每次运行各自持有 WorkflowRun，
+    经 _execute_workflow / _stage 显式传递，不放在共享的工作流对象上
+    """
+    
+    def __init__(self, workflow_id: str, profiler: WorkflowProfiler = None):
+        self.workflow_id = workflow_id
+        self.profiler = profiler
+        self.status = WorkflowStatus(
+            workflow_id=workflow_id,
+            current_stage="初始化",
+            completed_stages=[],
+            progress=0.0,
+            status="running"
+        )
+    
+    def update(self, stage: str, progress: float, status: str = "running", error: str = None):
+        """更新工作流状态"""
+        if stage not in self.status.completed_stages and stage != self.status.current_stage:
+            self.status.completed_stages.append(self.status.current_stage)
+        
+        self.status.current_stage = stage
+        self.status.progress = progress
+        self.status.status = status
+        if error:
+            self.status.error_message = error
+
 class LogisticsWorkflow:
     """物流调度工作流协调器"""
     
@@ -28,10 +105,19 @@ class LogisticsWorkflow:
         self.decision_service = DecisionService()
         self.profiler_service = RiderProfilerService()
         
-        # 工作流状态
+        # 最近一次启动的工作流状态（只读；各次运行的状态在各自的 WorkflowRun 中）
         self.workflow_status = None
         
-    async def run_complete_workflow(self, site_id: str, target_date: str, manager_feedback: bool = None) -> Dict[str, Any]:
+        # 召回结果（用于重新训练接受率模型）
+        self.call_history: Deque[CallRecord] = deque(maxlen=RECALL_HISTORY_LIMIT)
+        self.attendance_history: Deque[AttendanceRecord] = deque(maxlen=RECALL_HISTORY_LIMIT)
+        self._rider_features: Dict[str, Dict[str, Any]] = {}
+        
+        # 召回效果流式分析（通话与出勤事件逐条计入）
+        self.analytics = AnalyticsEngine()
+        
+    async def run_complete_workflow(self, site_id: str, target_date: str, manager_feedback: bool = None, profile: bool = False,
+                                    workflow_id: str = None, precomputed: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         运行完整的召回工作流
         
@@ -39,49 +125,213 @@ class LogisticsWorkflow:
             site_id: 站点ID
             target_date: 目标日期
             manager_feedback: 站长反馈（None表示需要等待反馈）
+            profile: 是否对本次运行做性能剖析（产物写入 PROFILE_DIR/workflow_id）
+            workflow_id: 工作流ID，已有检查点时复用输入未变化的阶段
+            precomputed: 已批量算好的阶段结果（prediction / decision / candidates），对应阶段不再单独调用LLM
             
         Returns:
             Dict: 工作流执行结果
         """
-        workflow_id = f"workflow_{site_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        workflow_id = workflow_id or new_workflow_id(site_id)
+        checkpoints = get_checkpoint_store()
+        if checkpoints is not None:
+            checkpoints.start(workflow_id, {"site_id": site_id, "target_date": target_date, "manager_feedback": manager_feedback})
         
-        # 初始化工作流状态
-        self.workflow_status = WorkflowStatus(
-            workflow_id=workflow_id,
-            current_stage="初始化",
-            completed_stages=[],
-            progress=0.0,
-            status="running"
-        )
+        WORKFLOWS_STARTED.inc()
+        started = time.perf_counter()
+        run = WorkflowRun(workflow_id, WorkflowProfiler(workflow_id) if profile else None)
+        self.workflow_status = run.status
+        if run.profiler is not None:
+            run.profiler.start()
+        
+        try:
+            with tracer.trace(workflow_id, site_id=site_id, target_date=target_date) as root:
+                result = await self._execute_workflow(run, site_id, target_date, manager_feedback, precomputed)
+                root.set(outcome=result["result"])
+        finally:
+            if run.profiler is not None:
+                profile_dir = run.profiler.stop()
+                logger.info(f"剖析结果已写入: {profile_dir}")
+        
+        if run.profiler is not None:
+            result["profile_dir"] = str(profile_dir)
+        outcome = WORKFLOW_OUTCOMES.get(result["result"], "unknown")
+        WORKFLOWS_COMPLETED.inc(outcome=outcome)
+        # 各阶段kickoff有超时上界，端到端耗时按结果记录（关注长尾）
+        WORKFLOW_DURATION.observe(time.perf_counter() - started, outcome=outcome)
+        if checkpoints is not None:
+            checkpoints.finish(workflow_id, WORKFLOW_COMPLETED if result["status"] == "completed" else WORKFLOW_FAILED, result.get("error"))
+        
+        return result
+    
+    async def resume_workflow(self, workflow_id: str, profile: bool = False) -> Dict[str, Any]:
+        """
+        从检查点继续执行工作流：已完成且输入未变化的阶段直接复用，只执行失败及之后的阶段
+        
+        Raises:
+            KeyError: 没有该工作流的检查点
+        """
+        checkpoints = get_checkpoint_store()
+        params = checkpoints.params(workflow_id) if checkpoints is not None else None
+        if params is None:
+            raise KeyError(f"没有工作流 {workflow_id} 的检查点")
+        logger.info(f"从检查点继续工作流 {workflow_id}，已完成阶段: {checkpoints.stages(workflow_id)}")
+        return await self.run_complete_workflow(profile=profile, workflow_id=workflow_id, **params)
+    
+    async def resume_unfinished(self, since: float = None) -> List[Dict[str, Any]]:
+        """
+        继续所有失败或中断的工作流（如部分站点失败的T-3批次），每个工作流只重跑未完成的阶段；
+        仍在运行（心跳未超过 CHECKPOINT_STALE_SECONDS）的工作流不会被重复执行
+        
+        Args:
+            since: 只处理该时间戳之后更新过的工作流
+        """
+        checkpoints = get_checkpoint_store()
+        if checkpoints is None:
+            return []
+        results = [await self.resume_workflow(workflow_id) for workflow_id in checkpoints.unfinished(since)]
+        if results and settings.ACCEPTANCE_AUTO_RETRAIN:
+            await asyncio.to_thread(self.retrain_acceptance_model)
+        return results
+    
+    async def run_batch(self, site_ids: List[str], target_date: str,
+                        manager_feedback: Union[bool, Dict[str, bool], None] = None) -> List[Dict[str, Any]]:
+        """
+        多站点批量运行（如节假日前对全部站点做预测与召回）
+        
+        预测与决策按token预算打包成少量多站点任务（每批一次kickoff）；
+        多个站点同时召回时一次求解跨站点分配（同一骑手只进一个站点的名单），
+        之后各站点以 BATCH_SITE_CONCURRENCY 并发执行召回
+        
+        Args:
+            site_ids: 站点ID列表
+            target_date: 目标日期
+            manager_feedback: 站长反馈（可按站点给出），为空的站点使用模拟反馈
+            
+        Returns:
+            List[Dict]: 与 site_ids 顺序一致的工作流结果
+        """
+        random = get_random()
+        feedback = {
+            site_id: (manager_feedback.get(site_id) if isinstance(manager_feedback, dict) else manager_feedback)
+            for site_id in site_ids
+        }
+        # 与单站点一致，没有站长反馈时模拟（80%概率同意）
+        feedback = {site_id: random.random() < 0.8 if value is None else value for site_id, value in feedback.items()}
+        
+        requests = [PredictionRequest(site_id=site_id, target_date=target_date, include_weather=True) for site_id in site_ids]
+        with self._stage("prediction_batch"):
+            inputs = await asyncio.gather(*(self.prediction_service.input_dag(request).run() for request in requests))
+            predictions = await asyncio.to_thread(self.prediction_service.predict_batch, requests, [run.results for run in inputs])
+        
+        gaps = [prediction for prediction in predictions if prediction.has_gap]
+        with self._stage("decision_batch"):
+            decided = await asyncio.to_thread(self.decision_service.decide_batch, [
+                DecisionRequest(site_id=prediction.site_id, prediction_result=prediction,
+                                manager_feedback=feedback[prediction.site_id], notes="系统自动决策（批量）")
+                for prediction in gaps
+            ])
+        decisions = {prediction.site_id: decision for prediction, decision in zip(gaps, decided)}
+        logger.info(f"批量预测与决策完成: {len(site_ids)} 个站点，存在缺口 {len(gaps)} 个，"
+                    f"启动召回 {sum(decision.accepted for decision in decided)} 个")
+        
+        # 相邻站点的候选名单会重叠，多个站点召回时统一分配，避免同一骑手被多个站点重复拨打
+        recalls = [prediction for prediction in gaps if decisions[prediction.site_id].accepted]
+        allocated: Dict[str, List[RiderCandidate]] = {}
+        if len(recalls) > 1:
+            with self._stage("allocation"):
+                demands = [
+                    self.profiler_service.site_demand(prediction.site_id, prediction.required_riders,
+                                                      self._urgency(prediction.gap_ratio))
+                    for prediction in recalls
+                ]
+                allocated = await asyncio.to_thread(self.profiler_service.allocate_candidates, demands, target_date)
+            logger.info(f"跨站点分配完成: {len(recalls)} 个站点，共 {sum(map(len, allocated.values()))} 名候选")
+        
+        semaphore = asyncio.Semaphore(settings.BATCH_SITE_CONCURRENCY)
+        
+        async def run_site(prediction: PredictionResult) -> Dict[str, Any]:
+            precomputed = {"prediction": prediction}
+            if prediction.site_id in decisions:
+                precomputed["decision"] = decisions[prediction.site_id]
+            if prediction.site_id in allocated:
+                precomputed["candidates"] = allocated[prediction.site_id]
+            async with semaphore:
+                return await self.run_complete_workflow(prediction.site_id, target_date, feedback[prediction.site_id],
+                                                        precomputed=precomputed)
+        
+        results = list(await asyncio.gather(*(run_site(prediction) for prediction in predictions)))
+        if settings.ACCEPTANCE_AUTO_RETRAIN:
+            # 一批站点的召回结果足以更新接受率模型，下一批按新模型排序
+            await asyncio.to_thread(self.retrain_acceptance_model)
+        return results
+    
+    async def _checkpoint(self, workflow_id: str, stage: str, inputs: Dict[str, Any], compute: Callable) -> Dict[str, Any]:
+        """
+        执行阶段或复用检查点
+        
+        Args:
+            inputs: 阶段输入（含上游阶段输出），哈希一致时复用已保存的输出
+            compute: 无参函数（同步或异步），返回可JSON序列化的阶段输出
+        """
+        checkpoints = get_checkpoint_store()
+        digest = input_hash(stage, inputs)
+        if checkpoints is not None:
+            output = checkpoints.load(workflow_id, stage, digest)
+            record_cache_access("checkpoint", output is not None)
+            if output is not None:
+                logger.info(f"阶段 {stage} 输入未变化，复用检查点")
+                return output
+        
+        output = compute()
+        if inspect.isawaitable(output):
+            output = await output
+        if checkpoints is not None:
+            checkpoints.save(workflow_id, stage, digest, output)
+        return output
+    
+    @staticmethod
+    def _fingerprint(model) -> Dict[str, Any]:
+        """模型内容（不含创建/更新时间），作为下游阶段的输入参与哈希"""
+        return model.dict(exclude={"created_at", "updated_at"})
+    
+    @contextmanager
+    def _stage(self, name: str, run: WorkflowRun = None):
+        """记录单个阶段的span，并输出阶段耗时（run 开启剖析时记录该阶段的分配热点）"""
+        start = time.perf_counter()
+        with tracer.span(f"stage.{name}") as span:
+            if run is None or run.profiler is None:
+                yield span
+            else:
+                with run.profiler.stage(name):
+                    yield span
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=name)
+        log_performance(f"stage.{name}", span.wall_time, {"cpu_time": round(span.cpu_time, 4)})
+    
+    async def _execute_workflow(self, run: WorkflowRun, site_id: str, target_date: str, manager_feedback: bool = None,
+                                precomputed: Dict[str, Any] = None) -> Dict[str, Any]:
+        """按阶段依赖图执行工作流（互不依赖的阶段并发执行）"""
+        workflow_id = run.workflow_id
         
         logger.info(f"开始执行召回工作流: {workflow_id}")
         logger.info(f"站点: {site_id}, 目标日期: {target_date}")
         
         try:
-            # 阶段1: 预测分析
-            logger.info("=" * 50)
-            logger.info("阶段1: 运力缺口预测")
-            logger.info("=" * 50)
-            
-            self._update_workflow_status("预测分析", 20.0)
-            
-            prediction_request = PredictionRequest(
-                site_id=site_id,
-                target_date=target_date,
-                include_weather=True
-            )
+            # 本次工作流要写入数据库的记录，结束时一个事务写入
+            repository = get_async_repository()
+            session = repository.session() if repository is not None else None
             
-            prediction_result = self.prediction_service.predict_demand(prediction_request)
-            
-            logger.info(f"预测完成:")
-            logger.info(f"  存在缺口: {prediction_result.has_gap}")
-            logger.info(f"  缺口比例: {prediction_result.gap_ratio:.2%}")
-            logger.info(f"  需要骑手: {prediction_result.required_riders}人")
-            logger.info(f"  置信度: {prediction_result.confidence:.2%}")
+            dag = self._workflow_dag(run, site_id, target_date, manager_feedback, session, precomputed or {})
+            dag_run = await dag.run()
+            path, length = dag_run.critical_path(dag)
+            logger.info(f"阶段耗时 {dag_run.elapsed:.2f}秒，关键路径: {' → '.join(path)} ({length:.2f}秒)"
+                        + (f"，已取消投机执行: {dag_run.cancelled}" if dag_run.cancelled else ""))
             
+            prediction_result = dag_run.results["prediction"]
             # 如果没有缺口，直接结束
             if not prediction_result.has_gap:
-                self._update_workflow_status("完成", 100.0, "success")
+                run.update("完成", 100.0, "success")
+                await self._persist(session, run=run)
                 return {
                     "workflow_id": workflow_id,
                     "status": "completed",
@@ -90,39 +340,11 @@ class LogisticsWorkflow:
                     "message": "预测显示运力充足，无需召回骑手"
                 }
             
-            # 阶段2: 决策确认
-            logger.info("\n" + "=" * 50)
-            logger.info("阶段2: 站长决策确认")
-            logger.info("=" * 50)
-            
-            self._update_workflow_status("决策确认", 40.0)
-            
-            # 如果没有提供站长反馈，使用模拟反馈
-            if manager_feedback is None:
-                logger.info("等待站长确认...")
-                # 在实际项目中，这里会等待真实的站长反馈
-                # 这里使用模拟反馈（80%概率同意）
-                import random
-                manager_feedback = random.random() < 0.8
-                logger.info(f"收到站长反馈: {'同意' if manager_feedback else '拒绝'}")
-            
-            decision_request = DecisionRequest(
-                site_id=site_id,
-                prediction_result=prediction_result,
-                manager_feedback=manager_feedback,
-                notes="系统自动决策"
-            )
-            
-            decision_result = self.decision_service.make_decision(decision_request)
-            
-            logger.info(f"决策结果:")
-            logger.info(f"  是否启动召回: {decision_result.accepted}")
-            logger.info(f"  下一步: {decision_result.next_step}")
-            logger.info(f"  原因: {decision_result.reason}")
-            
             # 如果决策不通过，结束流程
+            decision_result = dag_run.results["decision"]
             if not decision_result.accepted:
-                self._update_workflow_status("完成", 100.0, "success")
+                run.update("完成", 100.0, "success")
+                await self._persist(session, self._recall_task(workflow_id, prediction_result, "rejected"), run=run)
                 return {
                     "workflow_id": workflow_id,
                     "status": "completed",
@@ -132,55 +354,14 @@ class LogisticsWorkflow:
                     "message": decision_result.reason
                 }
             
-            # 阶段3: 骑手筛选
-            logger.info("\n" + "=" * 50)
-            logger.info("阶段3: 候选骑手筛选")
-            logger.info("=" * 50)
-            
-            self._update_workflow_status("骑手筛选", 60.0)
-            
-            # 根据缺口比例确定紧急程度
-            if prediction_result.gap_ratio > 0.3:
-                urgency = "high"
-            elif prediction_result.gap_ratio > 0.15:
-                urgency = "medium"
-            else:
-                urgency = "low"
-                
-            candidates = self.profiler_service.select_candidates(
-                site_id=site_id,
-                target_date=target_date,
-                required_riders=prediction_result.required_riders,
-                urgency=urgency
-            )
-            
-            logger.info(f"筛选完成:")
-            logger.info(f"  找到候选人: {len(candidates)}人")
-            logger.info(f"  紧急程度: {urgency}")
-            
-            if candidates:
-                logger.info("  前3名候选人:")
-                for i, candidate in enumerate(candidates[:3], 1):
-                    logger.info(f"    {i}. {candidate.name} (得分: {candidate.score:.1f}, 距离: {candidate.distance:.1f}km)")
-            
-            # 阶段4: 模拟召回执行
-            logger.info("\n" + "=" * 50)
-            logger.info("阶段4: 召回执行 (模拟)")
-            logger.info("=" * 50)
-            
-            self._update_workflow_status("召回执行", 80.0)
-            
-            # 模拟召回结果
-            recall_results = self._simulate_recall_execution(candidates)
-            
-            logger.info(f"召回执行完成:")
-            logger.info(f"  拨打总数: {recall_results['total_calls']}")
-            logger.info(f"  接通数量: {recall_results['connected_calls']}")
-            logger.info(f"  同意数量: {recall_results['agreed_calls']}")
-            logger.info(f"  成功率: {recall_results['success_rate']:.1%}")
+            candidates = dag_run.results["profiling"]
+            recalled = dag_run.results["recall"]
+            recall_results = recalled["recall_results"]
+            analytics = AnalyticsResult(**recalled["analytics"])
             
             # 阶段5: 完成
-            self._update_workflow_status("完成", 100.0, "success")
+            run.update("完成", 100.0, "success")
+            await self._persist(session, self._recall_task(workflow_id, prediction_result, "completed"), analytics, run=run)
             
             logger.info("\n" + "=" * 50)
             logger.info("工作流执行完成")
@@ -194,12 +375,13 @@ class LogisticsWorkflow:
                 "decision": decision_result.dict(),
                 "candidates": [c.dict() for c in candidates],
                 "recall_results": recall_results,
+                "analytics": analytics.dict(),
                 "message": f"成功召回 {recall_results['agreed_calls']} 名骑手"
             }
             
         except Exception as e:
             logger.error(f"工作流执行失败: {str(e)}")
-            self._update_workflow_status("错误", self.workflow_status.progress, "error", str(e))
+            run.update("错误", run.status.progress, "error", str(e))
             
             return {
                 "workflow_id": workflow_id,
@@ -209,65 +391,657 @@ class LogisticsWorkflow:
                 "message": f"工作流执行失败: {str(e)}"
             }
     
-    def _update_workflow_status(self, stage: str, progress: float, status: str = "running", error: str = None):
-        """更新工作流状态"""
-        if self.workflow_status:
-            if stage not in self.workflow_status.completed_stages and stage != self.workflow_status.current_stage:
-                self.workflow_status.completed_stages.append(self.workflow_status.current_stage)
-            
-            self.workflow_status.current_stage = stage
-            self.workflow_status.progress = progress
-            self.workflow_status.status = status
-            if error:
-                self.workflow_status.error_message = error
-    
-    def _simulate_recall_execution(self, candidates: List) -> Dict[str, Any]:
-        """模拟召回执行过程"""
-        import random
-        
-        total_calls = len(candidates)
-        connected_calls = 0
-        agreed_calls = 0
-        
-        for candidate in candidates:
-            # 模拟拨打结果
-            # 接通率约80%
-            if random.random() < 0.8:
-                connected_calls += 1
+    def _workflow_dag(self, run: WorkflowRun, site_id: str, target_date: str, manager_feedback: Optional[bool],
+                      session: Optional[RepositorySession], precomputed: Dict[str, Any]) -> DAG:
+        """
+        工作流阶段依赖图
+        
+            prediction ──┬── decision ──────────┐
+                         └── profile（投机）────┼── profiling ── recall
+            roster（投机）──────────────────────┘
+        
+        花名册预取与画像生成不依赖站长决策，在预测/等待决策期间提前执行，决策为否（或无缺口）时取消；
+        预测阶段内部的历史、趋势、天气数据也并发获取。各阶段结果写入检查点，重跑时输入未变化的阶段直接复用。
+        """
+        workflow_id = run.workflow_id
+        has_gap = ("prediction", lambda prediction: prediction.has_gap)
+        accepted = ("decision", lambda decision: decision.accepted)
+        
+        async def prediction() -> PredictionResult:
+            # 阶段1: 预测分析
+            logger.info("=" * 50)
+            logger.info("阶段1: 运力缺口预测")
+            logger.info("=" * 50)
+            
+            run.update("预测分析", 20.0)
+            
+            with self._stage("prediction", run):
+                prediction_request = PredictionRequest(
+                    site_id=site_id,
+                    target_date=target_date,
+                    include_weather=True
+                )
+                
+                async def predict() -> Dict[str, Any]:
+                    if "prediction" in precomputed:
+                        return precomputed["prediction"].dict()
+                    data = (await self.prediction_service.input_dag(prediction_request).run()).results
+                    return (await asyncio.to_thread(profiled(self.prediction_service.predict_demand), prediction_request, data)).dict()
                 
-                # 同意率根据候选人得分决定
-                agree_probability = min(0.9, candidate.score / 100)
-                if random.random() < agree_probability:
-                    agreed_calls += 1
+                prediction_result = PredictionResult(**await self._checkpoint(
+                    workflow_id, "prediction", prediction_request.dict(), predict
+                ))
+            
+            logger.info(f"预测完成:")
+            logger.info(f"  存在缺口: {prediction_result.has_gap}")
+            logger.info(f"  缺口比例: {prediction_result.gap_ratio:.2%}")
+            logger.info(f"  需要骑手: {prediction_result.required_riders}人")
+            logger.info(f"  置信度: {prediction_result.confidence:.2%}")
+            if session is not None:
+                session.add(prediction_result)
+            return prediction_result
         
-        success_rate = agreed_calls / total_calls if total_calls > 0 else 0
+        async def decision(prediction: PredictionResult) -> DecisionResult:
+            # 阶段2: 决策确认
+            logger.info("\n" + "=" * 50)
+            logger.info("阶段2: 站长决策确认")
+            logger.info("=" * 50)
+            
+            run.update("决策确认", 40.0)
+            
+            def decide() -> Dict[str, Any]:
+                if "decision" in precomputed:
+                    return precomputed["decision"].dict()
+                feedback = manager_feedback
+                # 如果没有提供站长反馈，使用模拟反馈
+                if feedback is None:
+                    logger.info("等待站长确认...")
+                    # 在实际项目中，这里会等待真实的站长反馈
+                    # 这里使用模拟反馈（80%概率同意）
+                    feedback = get_random().random() < 0.8
+                    logger.info(f"收到站长反馈: {'同意' if feedback else '拒绝'}")
+                
+                decision_request = DecisionRequest(
+                    site_id=site_id,
+                    prediction_result=prediction,
+                    manager_feedback=feedback,
+                    notes="系统自动决策"
+                )
+                
+                return self.decision_service.make_decision(decision_request).dict()
+            
+            with self._stage("decision", run):
+                decision_result = DecisionResult(**await self._checkpoint(
+                    workflow_id, "decision",
+                    {"prediction": self._fingerprint(prediction), "manager_feedback": manager_feedback},
+                    lambda: asyncio.to_thread(profiled(decide))
+                ))
+            
+            logger.info(f"决策结果:")
+            logger.info(f"  是否启动召回: {decision_result.accepted}")
+            logger.info(f"  下一步: {decision_result.next_step}")
+            logger.info(f"  原因: {decision_result.reason}")
+            return decision_result
+        
+        def roster() -> int:
+            return self.profiler_service.fetch_roster(site_id)
+        
+        def profile(prediction: PredictionResult) -> Dict[str, Any]:
+            return self.profiler_service.build_profile(target_date, prediction.required_riders, self._urgency(prediction.gap_ratio))
+        
+        async def profiling(prediction: PredictionResult, roster: int, profile: Dict[str, Any]) -> List[RiderCandidate]:
+            # 阶段3: 骑手筛选（花名册已预取进排名索引，画像已提前生成）
+            logger.info("\n" + "=" * 50)
+            logger.info("阶段3: 候选骑手筛选")
+            logger.info("=" * 50)
+            
+            run.update("骑手筛选", 60.0)
+            
+            urgency = self._urgency(prediction.gap_ratio)
+            
+            with self._stage("profiling", run) as span:
+                selection = {
+                    "site_id": site_id,
+                    "target_date": target_date,
+                    "required_riders": prediction.required_riders,
+                    "urgency": urgency
+                }
+                
+                async def select() -> Dict[str, Any]:
+                    if "candidates" in precomputed:
+                        # 批量运行中已由跨站点分配给出
+                        return {"candidates": [c.dict() for c in precomputed["candidates"]]}
+                    selected = await asyncio.to_thread(profiled(self.profiler_service.select_candidates), profile=profile, **selection)
+                    return {"candidates": [c.dict() for c in selected]}
+                
+                selected = await self._checkpoint(workflow_id, "profiling", selection, select)
+                candidates = [RiderCandidate(**c) for c in selected["candidates"]]
+                span.set(candidates=len(candidates), urgency=urgency, roster=roster)
+            
+            logger.info(f"筛选完成:")
+            logger.info(f"  找到候选人: {len(candidates)}人")
+            logger.info(f"  紧急程度: {urgency}")
+            
+            if candidates:
+                logger.info("  前3名候选人:")
+                for i, candidate in enumerate(candidates[:3], 1):
+                    logger.info(f"    {i}. {candidate.name} (得分: {candidate.score:.1f}, 距离: {candidate.distance:.1f}km)")
+            return candidates
+        
+        async def recall(prediction: PredictionResult, profiling: List[RiderCandidate]) -> Dict[str, Any]:
+            # 阶段4: 模拟召回执行
+            logger.info("\n" + "=" * 50)
+            logger.info("阶段4: 召回执行 (模拟)")
+            logger.info("=" * 50)
+            
+            run.update("召回执行", 80.0)
+            
+            async def execute() -> Dict[str, Any]:
+                recall_results = await self._simulate_recall_execution(
+                    profiling, workflow_id, site_id, target_date, prediction.required_riders, session
+                )
+                return {"recall_results": recall_results, "analytics": self.analytics.snapshot(workflow_id).dict()}
+            
+            # 模拟召回结果（拨打结果与效果分析一起写入检查点，继续执行时不会重复拨打）
+            with self._stage("recall", run):
+                recalled = await self._checkpoint(
+                    workflow_id, "recall",
+                    {"candidates": [c.dict() for c in profiling], "required_riders": prediction.required_riders},
+                    execute
+                )
+            
+            recall_results = recalled["recall_results"]
+            logger.info(f"召回执行完成:")
+            logger.info(f"  拨打总数: {recall_results['total_calls']}")
+            logger.info(f"  接通数量: {recall_results['connected_calls']}")
+            logger.info(f"  同意数量: {recall_results['agreed_calls']}")
+            logger.info(f"  成功率: {recall_results['success_rate']:.1%}")
+            logger.info(f"  到岗人数: {recall_results['attended_riders']} (期望 {recall_results['expected_attendance']})")
+            logger.info(f"  通话意愿: {recall_results['intent_levels']}")
+            analytics = recalled["analytics"]
+            logger.info(f"  召回成功率: {analytics['recall_success_rate']:.1%}, 意愿预测准确率: {analytics['prediction_accuracy']:.1%}")
+            for recommendation in analytics["recommendations"]:
+                logger.info(f"  建议: {recommendation}")
+            return recalled
+        
+        dag = DAG(workflow_id)
+        dag.add("prediction", prediction)
+        dag.add("decision", decision, deps=("prediction",), guards=(has_gap,))
+        dag.add("roster", roster, guards=(has_gap, accepted), speculative=True)
+        dag.add("profile", profile, deps=("prediction",), guards=(has_gap, accepted), speculative=True)
+        dag.add("profiling", profiling, deps=("prediction", "roster", "profile"), guards=(accepted,))
+        dag.add("recall", recall, deps=("prediction", "profiling"))
+        return dag
+    
+    @staticmethod
+    def _urgency(gap_ratio: float) -> str:
+        """根据缺口比例确定紧急程度"""
+        if gap_ratio > 0.3:
+            return "high"
+        if gap_ratio > 0.15:
+            return "medium"
+        return "low"
+    
+    @staticmethod
+    def _recall_task(task_id: str, prediction_result, status: str) -> RecallTask:
+        return RecallTask(
+            task_id=task_id,
+            site_id=prediction_result.site_id,
+            target_date=prediction_result.target_date,
+            required_riders=prediction_result.required_riders,
+            status=status,
+            created_by="workflow"
+        )
+    
+    async def _persist(self, session: Optional[RepositorySession], *models, run: WorkflowRun = None):
+        """写入本次工作流的记录（失败只记录日志，不影响工作流结果）"""
+        if session is None:
+            return
+        session.add_all(models)
+        try:
+            with self._stage("persist", run):
+                await session.flush()
+        except Exception as e:
+            logger.error(f"工作流结果写入数据库失败: {e}")
+    
+    async def _simulate_recall_execution(self, candidates: List, task_id: str, site_id: str, target_date: str,
+                                         required_riders: int = None, session: RepositorySession = None) -> Dict[str, Any]:
+        """模拟召回执行过程，拨打与出勤结果记入历史供接受率模型重新训练"""
+        random = get_random()
+        limiter = get_call_rate_limiter() if settings.CALL_RATE_ENABLED else None
+        expected_time = datetime.strptime(target_date, "%Y-%m-%d").replace(hour=9)
+        counts = {"total": 0, "connected": 0, "agreed": 0, "attended": 0, "limited": 0, "skipped": 0}
+        guard = get_contact_guard()
+        dialed = {}
+        records = []
+        attendance = []
+        writer = get_call_writer() if session is not None else None
+        self.analytics.register_task(task_id, site_id, required_riders)
+        
+        async def dial(job: CallJob) -> str:
+            candidate = job.payload
+            # 每次拨打前按全局/站点/供应商限流获取令牌，当日额度用完或等待超时则停止该站点拨打
+            if limiter is not None and not await limiter.acquire(site_id, settings.CALL_PROVIDER, settings.CALL_RATE_MAX_WAIT):
+                counts["limited"] += 1
+                return OUTCOME_LIMITED
+            # 拨打前记录联系：筛选后其他工作流（或批量中的其他站点）可能已拨打该骑手；重拨不重复计数
+            if guard is not None and candidate.rider_id not in dialed:
+                if not await asyncio.to_thread(guard.try_record, candidate.rider_id):
+                    counts["skipped"] += 1
+                    return OUTCOME_SKIPPED
+            
+            with tracer.span("call.attempt", rider_id=candidate.rider_id, attempt=job.attempt) as span:
+                start_time = datetime.now()
+                counts["total"] += 1
+                dialed[candidate.rider_id] = candidate
+                if writer is not None:
+                    # 拨打中状态先进写入缓冲，结束后同一通话的最终状态会合并为一行落库
+                    await writer.put_async(CallRecord(
+                        call_id=self._call_id(task_id, candidate.rider_id, job.attempt),
+                        task_id=task_id,
+                        rider_id=candidate.rider_id,
+                        phone=candidate.phone,
+                        status=CallStatus.CALLING,
+                        start_time=start_time
+                    ))
+                
+                # 模拟拨打结果
+                connected = random.random() < CONNECT_RATE
+                agreed = False
+                if connected:
+                    counts["connected"] += 1
+                    
+                    if candidate.accept_probability is not None:
+                        # 模型预测的是到岗概率 = 接通 × 同意 × 到岗
+                        agree_probability = min(0.95, candidate.accept_probability / (CONNECT_RATE * ATTEND_RATE))
+                    else:
+                        # 同意率根据候选人得分决定
+                        agree_probability = min(0.9, candidate.score / 100)
+                    agreed = random.random() < agree_probability
+                    if agreed:
+                        counts["agreed"] += 1
+                span.set(connected=connected, agreed=agreed)
+            
+            transcript = None
+            if connected:
+                # 模拟通话转写：同意多为强意愿，拒绝多为拒绝/犹豫
+                draw = random.random()
+                if agreed:
+                    intent = IntentLevel.STRONG if draw < 0.8 else IntentLevel.HESITANT
+                else:
+                    intent = IntentLevel.REJECT if draw < 0.6 else (IntentLevel.HESITANT if draw < 0.85 else IntentLevel.NEUTRAL)
+                transcript = synthetic_transcripts([intent.value], get_rng())[0]
+            record = self._record_call_outcome(candidate, task_id, site_id, start_time, connected, agreed, job.attempt, transcript)
+            records.append(record)
+            if writer is not None:
+                await writer.put_async(record)
+            intents.submit(record)
+            self.analytics.on_call(record)
+            if agreed:
+                attended = random.random() < ATTEND_RATE
+                counts["attended"] += int(attended)
+                attendance.append(AttendanceRecord(
+                    record_id=f"{task_id}_{candidate.rider_id}",
+                    rider_id=candidate.rider_id,
+                    task_id=task_id,
+                    target_date=target_date,
+                    expected_time=expected_time,
+                    actual_time=expected_time if attended else None,
+                    is_attended=attended
+                ))
+            
+            log_sampled(
+                "call",
+                f"拨打 {candidate.rider_id}(第{job.attempt + 1}次): {'同意' if agreed else ('拒绝' if connected else '未接通')}",
+                rider_id=candidate.rider_id
+            )
+            if agreed:
+                return OUTCOME_AGREED
+            return OUTCOME_REJECTED if connected else OUTCOME_NO_ANSWER
+        
+        # 按优先级分级拨打，未接通按 call_intervals 重拨；模拟执行不真实等待重拨间隔，凑够人数即停止
+        # 接通的通话转写流式送入意愿分析，结果写回通话记录
+        intents = IntentStream(get_intent_pool()).start()
+        try:
+            scheduler = CallScheduler(dial, interval_unit=0.0)
+            scheduler.set_target(site_id, required_riders)
+            for candidate in candidates:
+                scheduler.submit(site_id, candidate.rider_id, candidate.priority, candidate)
+            await scheduler.run()
+        finally:
+            # 拨打异常时也要结束后台分析任务
+            intent_summary = await intents.close()
+        
+        # 出勤结果在目标日期才得知，此时通话意愿已写回，可计入意愿预测准确率
+        for record in attendance:
+            self.attendance_history.append(record)
+            self.analytics.on_attendance(record)
+        if writer is not None:
+            # 意愿分析结果回写到缓冲中的通话记录
+            for record in records:
+                if record.intent_level is not None:
+                    writer.put(record)
+        if session is not None:
+            session.add_all(attendance)
+        
+        if counts["limited"]:
+            logger.warning(f"站点 {site_id} 拨打额度不足，部分候选未拨打")
+        
+        total_calls = counts["total"]
+        CALLS.inc(total_calls, result="placed")
+        CALLS.inc(counts["connected"], result="connected")
+        CALLS.inc(counts["agreed"], result="agreed")
+        
+        success_rate = counts["agreed"] / total_calls if total_calls > 0 else 0
+        expected_attendance = sum(c.accept_probability or 0.0 for c in dialed.values())
         
         return {
             "total_calls": total_calls,
-            "connected_calls": connected_calls,
-            "agreed_calls": agreed_calls,
+            "dialed_riders": len(dialed),
+            "connected_calls": counts["connected"],
+            "agreed_calls": counts["agreed"],
+            "attended_riders": counts["attended"],
+            "retries": scheduler.stats["retries"],
+            "intent_levels": intent_summary["levels"],
+            "rate_limited": counts["limited"],
+            "skipped_contacts": counts["skipped"],
             "success_rate": success_rate,
+            "expected_attendance": round(expected_attendance, 2),
+            "calls_per_attendance": total_calls / counts["attended"] if counts["attended"] else None,
             "execution_time": datetime.now().isoformat()
         }
     
+    @staticmethod
+    def _call_id(task_id: str, rider_id: str, attempt: int = 0) -> str:
+        return f"{task_id}_{rider_id}" + (f"_{attempt}" if attempt else "")
+    
+    def _record_call_outcome(self, candidate, task_id: str, site_id: str, start_time: datetime, connected: bool,
+                             agreed: bool, attempt: int = 0, transcript: str = None) -> CallRecord:
+        """记录通话结果及拨打时的骑手特征"""
+        record = CallRecord(
+            call_id=self._call_id(task_id, candidate.rider_id, attempt),
+            task_id=task_id,
+            rider_id=candidate.rider_id,
+            phone=candidate.phone,
+            status=CallStatus.COMPLETED if connected else CallStatus.FAILED,
+            start_time=start_time,
+            end_time=datetime.now(),
+            transcript=transcript,
+            notes="同意" if agreed else None
+        )
+        self.call_history.append(record)
+        
+        rider = candidate_index.rider(site_id, candidate.rider_id)
+        if rider is not None:
+            self._rider_features[candidate.rider_id] = {
+                "acceptance_rate": rider.acceptance_rate,
+                "distance_to_site": rider.distance_to_site,
+                "holiday_experience": rider.holiday_experience
+            }
+        return record
+    
+    def retrain_acceptance_model(self, min_samples: int = None, save: bool = True) -> Optional[AcceptanceModel]:
+        """
+        用累积的召回结果重新训练接受率模型并替换当前模型（get_acceptance_model 随即返回新模型，
+        各站点的物化排名在下次读取时按新模型重建）
+        
+        Args:
+            min_samples: 最少训练样本数，不足时不训练，默认 ACCEPTANCE_RETRAIN_MIN_SAMPLES
+            save: 是否写入 ACCEPTANCE_MODEL_PATH
+            
+        Returns:
+            AcceptanceModel: 新模型，样本不足时为None
+        """
+        min_samples = settings.ACCEPTANCE_RETRAIN_MIN_SAMPLES if min_samples is None else min_samples
+        X, y = training_data_from_records(self.call_history, self.attendance_history, self._rider_features)
+        if len(X) < min_samples:
+            logger.info(f"召回样本不足（{len(X)} < {min_samples}），暂不重新训练接受率模型")
+            return None
+        
+        model = AcceptanceModel().fit(X, y)
+        set_acceptance_model(model)
+        if save:
+            model.save(settings.ACCEPTANCE_MODEL_PATH)
+        logger.info(f"接受率模型已用 {len(X)} 条召回结果重新训练")
+        return model
+    
+    def reanalyze_history(self) -> Dict[str, AnalyticsResult]:
+        """按累积的通话与出勤记录批量重新计算各任务的分析结果"""
+        return reprocess(list(self.call_history), list(self.attendance_history), self.analytics.task_info())
+    
+    # 队列模式：各阶段作为独立任务提交到持久化队列，由 worker 进程处理，阶段输出随负载传给下一阶段
+    
+    def job_handlers(self) -> Dict[str, Callable]:
+        """任务类型 -> 处理函数（供 WorkerPool 使用）"""
+        return {
+            JOB_PREDICTION: self._prediction_job,
+            JOB_DECISION: self._decision_job,
+            JOB_SELECTION: self._selection_job,
+            JOB_DIAL: self._dial_job
+        }
+    
+    async def submit_workflow(self, site_id: str, target_date: str, manager_feedback: bool = None,
+                              job_queue: JobQueue = None, timeout: float = None, workflow_id: str = None) -> str:
+        """
+        把工作流提交到任务队列（队列已满时等待，超时抛出 queue.Full）
+        
+        每次提交生成新的 workflow_id，同一站点的多次提交互不去重
+        
+        Args:
+            workflow_id: 重试同一次提交时传入首次的 workflow_id（任务ID不变，不会重复入队）
+        
+        Returns:
+            str: 预测任务ID，可用 JobQueue.wait_chain 等待整条工作流结束
+        """
+        workflow_id = workflow_id or new_workflow_id(site_id)
+        payload = {
+            "workflow_id": workflow_id,
+            "site_id": site_id,
+            "target_date": target_date,
+            "manager_feedback": manager_feedback
+        }
+        WORKFLOWS_STARTED.inc()
+        return await (job_queue or get_job_queue()).enqueue_async(
+            JOB_PREDICTION, payload, job_id=f"{workflow_id}:{JOB_PREDICTION}", timeout=timeout
+        )
+    
+    @staticmethod
+    async def _next_job(job_type: str, payload: Dict[str, Any], max_attempts: int = None, **outputs) -> str:
+        # 任务ID由 workflow_id 与阶段决定，上一阶段重试不会重复提交
+        return await get_job_queue().enqueue_async(job_type, {**payload, **outputs}, job_id=f"{payload['workflow_id']}:{job_type}",
+                                                   max_attempts=max_attempts)
+    
+    @staticmethod
+    def job_failed(job: Job):
+        """任务最终失败即整条工作流失败（供 WorkerPool 的 on_failure 使用）"""
+        WORKFLOWS_COMPLETED.inc(outcome=WORKFLOW_OUTCOMES["执行失败"])
+    
+    @staticmethod
+    def _finish_job(payload: Dict[str, Any], outcome: str, **result) -> Dict[str, Any]:
+        WORKFLOWS_COMPLETED.inc(outcome=WORKFLOW_OUTCOMES[outcome])
+        return {"workflow_id": payload["workflow_id"], "status": "completed", "result": outcome, **result}
+    
+    @staticmethod
+    def _job_session() -> Optional[RepositorySession]:
+        repository = get_async_repository()
+        return repository.session() if repository is not None else None
+    
+    async def _prediction_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.trace(f"{payload['workflow_id']}:{JOB_PREDICTION}", site_id=payload["site_id"]):
+            with self._stage("prediction"):
+                request = PredictionRequest(site_id=payload["site_id"], target_date=payload["target_date"], include_weather=True)
+                data = (await self.prediction_service.input_dag(request).run()).results
+                prediction_result = await asyncio.to_thread(self.prediction_service.predict_demand, request, data)
+            await self._persist(self._job_session(), prediction_result)
+        
+        prediction = prediction_result.dict()
+        if not prediction_result.has_gap:
+            return self._finish_job(payload, "无需召回", prediction=prediction, message="预测显示运力充足，无需召回骑手")
+        return {"prediction": prediction, "next_job": await self._next_job(JOB_DECISION, payload, prediction=prediction)}
+    
+    async def _decision_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        prediction_result = PredictionResult(**payload["prediction"])
+        manager_feedback = payload["manager_feedback"]
+        if manager_feedback is None:
+            # 与同步模式一致，没有站长反馈时使用模拟反馈（80%概率同意）
+            manager_feedback = get_random().random() < 0.8
+        
+        with tracer.trace(f"{payload['workflow_id']}:{JOB_DECISION}", site_id=payload["site_id"]):
+            with self._stage("decision"):
+                request = DecisionRequest(
+                    site_id=payload["site_id"],
+                    prediction_result=prediction_result,
+                    manager_feedback=manager_feedback,
+                    notes="系统自动决策"
+                )
+                decision_result = await asyncio.to_thread(self.decision_service.make_decision, request)
+            if not decision_result.accepted:
+                await self._persist(self._job_session(), self._recall_task(payload["workflow_id"], prediction_result, "rejected"))
+        
+        decision = decision_result.dict()
+        if not decision_result.accepted:
+            return self._finish_job(payload, "召回被拒绝", prediction=payload["prediction"], decision=decision,
+                                    message=decision_result.reason)
+        return {"decision": decision, "next_job": await self._next_job(JOB_SELECTION, payload, decision=decision)}
+    
+    async def _selection_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        prediction_result = PredictionResult(**payload["prediction"])
+        urgency = self._urgency(prediction_result.gap_ratio)
+        with tracer.trace(f"{payload['workflow_id']}:{JOB_SELECTION}", site_id=payload["site_id"]):
+            with self._stage("profiling") as span:
+                candidates = await asyncio.to_thread(
+                    self.profiler_service.select_candidates,
+                    site_id=payload["site_id"],
+                    target_date=payload["target_date"],
+                    required_riders=prediction_result.required_riders,
+                    urgency=urgency
+                )
+                span.set(candidates=len(candidates), urgency=urgency)
+        
+        records = [c.dict() for c in candidates]
+        # 拨打不可重跑（重试会把名单上的骑手再拨一遍），只处理一次，失败或租约过期即整条工作流失败
+        next_job = await self._next_job(JOB_DIAL, payload, max_attempts=1, candidates=records)
+        return {"candidates": len(records), "urgency": urgency, "next_job": next_job}
+    
+    async def _dial_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        workflow_id = payload["workflow_id"]
+        prediction_result = PredictionResult(**payload["prediction"])
+        candidates = [RiderCandidate(**c) for c in payload["candidates"]]
+        session = self._job_session()
+        with tracer.trace(f"{workflow_id}:{JOB_DIAL}", site_id=payload["site_id"]):
+            with self._stage("recall"):
+                recall_results = await self._simulate_recall_execution(
+                    candidates, workflow_id, payload["site_id"], payload["target_date"], prediction_result.required_riders, session
+                )
+            analytics = self.analytics.snapshot(workflow_id)
+            await self._persist(session, self._recall_task(workflow_id, prediction_result, "completed"), analytics)
+        
+        return self._finish_job(
+            payload, "召回成功",
+            prediction=payload["prediction"],
+            decision=payload["decision"],
+            candidates=payload["candidates"],
+            recall_results=recall_results,
+            analytics=analytics.dict(),
+            message=f"成功召回 {recall_results['agreed_calls']} 名骑手"
+        )
+    
     def get_workflow_status(self) -> WorkflowStatus:
-        """获取当前工作流状态"""
+        """获取最近一次启动的工作流状态"""
         return self.workflow_status
 
+def warm_start(workflow: LogisticsWorkflow = None) -> Dict[str, float]:
+    """
+    进程启动时预热：预建各角色的Agent/Crew池，加载LLM后端、接受率模型、分词词典与意愿分析进程池，
+    创建仓储、检查点、联系频次、限流等进程级单例，首个请求不再承担这些初始化开销
+    
+    Args:
+        workflow: 要预热的工作流（各服务共用进程级的Agent池），为空时新建
+        
+    Returns:
+        Dict[str, float]: 各项预热耗时（秒）
+    """
+    workflow = workflow or LogisticsWorkflow()
+    services = (workflow.prediction_service, workflow.decision_service, workflow.profiler_service)
+    steps = {
+        "agent_pools": lambda: [service.pool.prefill() for service in services],
+        "llm_backend": get_kickoff_backend,
+        "llm_breaker": get_llm_breaker,
+        "acceptance_model": get_acceptance_model,
+        "intent": lambda: (get_tokenizer(), get_intent_classifier(), get_intent_pool()),
+        "side_channel": get_side_channel,
+        "repository": get_async_repository,
+        "checkpoints": get_checkpoint_store,
+        "contact_guard": get_contact_guard,
+        "rate_limiter": get_call_rate_limiter,
+        "call_writer": get_call_writer
+    }
+    
+    timings = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        step()
+        timings[name] = round(time.perf_counter() - start, 4)
+    logger.info(f"预热完成，耗时 {sum(timings.values()):.2f}秒: {timings}")
+    return timings
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="即时物流骑手智能召回系统")
-    parser.add_argument("--site-id", required=True, help="站点ID")
-    parser.add_argument("--date", required=True, help="目标日期 (YYYY-MM-DD)")
+    parser.add_argument("--site-id", help="站点ID")
+    parser.add_argument("--sites", default=None, help="批量运行多个站点（逗号分隔，预测与决策按批提交给LLM）")
+    parser.add_argument("--date", help="目标日期 (YYYY-MM-DD)")
     parser.add_argument("--manager-feedback", type=bool, default=None, help="站长反馈 (True/False)")
     parser.add_argument("--demo", action="store_true", help="运行演示模式")
+    parser.add_argument("--metrics-file", default=None, help="运行结束后写出Prometheus指标文件")
+    parser.add_argument("--profile", action="store_true", help="对工作流做性能剖析（火焰图与内存分配热点）")
+    parser.add_argument("--resume", default=None, help="从检查点继续指定工作流（只重跑未完成的阶段）")
+    parser.add_argument("--resume-unfinished", action="store_true", help="继续所有失败或中断（心跳超时）的工作流")
+    parser.add_argument("--enqueue", action="store_true", help="把工作流提交到任务队列并等待worker处理完成")
+    parser.add_argument("--no-wait", action="store_true", help="与 --enqueue 一起使用，提交后立即返回任务ID")
+    parser.add_argument("--worker", action="store_true", help="作为worker处理任务队列中的工作流任务")
+    parser.add_argument("--drain", action="store_true", help="与 --worker 一起使用，队列处理完即退出")
+    parser.add_argument("--retrain", action="store_true", help="运行结束后用本次的召回结果重新训练接受率模型")
     
     args = parser.parse_args()
+    if not (args.demo or args.worker or args.resume or args.resume_unfinished) and not ((args.site_id or args.sites) and args.date):
+        parser.error("需要 --site-id（或 --sites）与 --date")
     
     # 创建工作流实例
     workflow = LogisticsWorkflow()
     
-    if args.demo:
+    if args.worker:
+        # worker模式：按 JOB_CONCURRENCY 并发处理各类任务，可在多个进程中同时运行
+        if settings.WARM_START_ENABLED:
+            warm_start(workflow)
+        pool = WorkerPool(get_job_queue(), workflow.job_handlers(), on_failure=workflow.job_failed)
+        try:
+            asyncio.run(pool.run(drain=args.drain))
+        except KeyboardInterrupt:
+            pass
+        print(f"worker退出: {pool.stats}")
+    elif args.resume or args.resume_unfinished:
+        if args.resume:
+            results = [asyncio.run(workflow.resume_workflow(args.resume, profile=args.profile))]
+        else:
+            results = asyncio.run(workflow.resume_unfinished())
+        print("\n最终结果:")
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    elif args.sites:
+        results = asyncio.run(workflow.run_batch(args.sites.split(","), args.date, args.manager_feedback))
+        print("\n最终结果:")
+        print(json.dumps([{key: result.get(key) for key in ("workflow_id", "status", "result", "message")} for result in results],
+                         ensure_ascii=False, indent=2))
+    elif args.enqueue:
+        job_queue = get_job_queue()
+        job_id = asyncio.run(workflow.submit_workflow(args.site_id, args.date, args.manager_feedback, job_queue))
+        print(f"已提交任务: {job_id}")
+        if not args.no_wait:
+            job = asyncio.run(job_queue.wait_chain(job_id))
+            print("\n最终结果:")
+            print(json.dumps(job.result if job.status == STATUS_DONE else {"job_id": job.job_id, "status": job.status, "error": job.error},
+                             ensure_ascii=False, indent=2))
+    elif args.demo:
         # 演示模式：运行多个场景
         demo_scenarios = [
             {"site_id": "site_001", "date": "2024-02-14", "feedback": True},   # 情人节，同意召回
@@ -286,7 +1060,8 @@ def main():
             result = asyncio.run(workflow.run_complete_workflow(
                 site_id=scenario["site_id"],
                 target_date=scenario["date"],
-                manager_feedback=scenario["feedback"]
+                manager_feedback=scenario["feedback"],
+                profile=args.profile
             ))
             
             print(f"结果: {result['result']}")
@@ -303,11 +1078,19 @@ def main():
         result = asyncio.run(workflow.run_complete_workflow(
             site_id=args.site_id,
             target_date=args.date,
-            manager_feedback=args.manager_feedback
+            manager_feedback=args.manager_feedback,
+            profile=args.profile
         ))
         
         print("\n最终结果:")
         print(json.dumps(result, ensure_ascii=False, indent=2))
+    
+    if args.retrain:
+        model = workflow.retrain_acceptance_model()
+        print(f"接受率模型已重新训练（{model.trained_on}条）" if model is not None else "召回样本不足，接受率模型未更新")
+    
+    if args.metrics_file:
+        registry.write_textfile(args.metrics_file)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+骑手召回接受率模型
+由历史拨打结果（CallRecord / AttendanceRecord）训练逻辑回归，预测"拨打后实际到岗"的概率，
+整份花名册用NumPy一次批量打分。画像筛选据此按期望出勤排序，并选出以目标置信度
+凑够所需人数的最短拨打名单，减少每个补位所需的拨打次数。
+
+用法:
+    python -m models.acceptance --world data/worlds/demo --output data/models/acceptance.json
+"""
+
+import argparse
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config.settings import settings
+from models.roster import RiderRoster
+from models.schemas import CallRecord, AttendanceRecord
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FEATURES = ["acceptance_rate", "distance", "holiday_experience", "hour", "evening", "weekend"]
+
+def feature_matrix(acceptance_rate: np.ndarray, distance: np.ndarray, holiday_experience: np.ndarray,
+                   hour: Any, weekday: Any) -> np.ndarray:
+    """
+    构造特征矩阵（列顺序同 FEATURES），hour/weekday 可为标量或与骑手等长的数组
+
+    hour 按 (hour-14)/6 缩放，另加晚间（19点后）与周末指示特征
+    """
+    n = len(acceptance_rate)
+    hour = np.broadcast_to(np.asarray(hour, dtype=np.float64), (n,))
+    weekday = np.broadcast_to(np.asarray(weekday), (n,))
+    return np.column_stack([
+        np.asarray(acceptance_rate, dtype=np.float64),
+        np.asarray(distance, dtype=np.float64),
+        np.asarray(holiday_experience, dtype=np.float64),
+        (hour - 14.0) / 6.0,
+        (hour >= 19).astype(np.float64),
+        (weekday >= 5).astype(np.float64)
+    ])
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+class AcceptanceModel:
+    """逻辑回归接受率模型（牛顿法/IRLS训练，特征先标准化）"""
+
+    def __init__(self, coef: Sequence[float] = None, intercept: float = 0.0,
+                 mean: Sequence[float] = None, scale: Sequence[float] = None, trained_on: int = 0):
+        k = len(FEATURES)
+        self.coef = np.zeros(k) if coef is None else np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.mean = np.zeros(k) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = np.ones(k) if scale is None else np.asarray(scale, dtype=np.float64)
+        self.trained_on = trained_on
+
+    def fit(self, X: np.ndarray, y: np.ndarray, l2: float = 1e-3, iterations: int = 25, tol: float = 1e-6) -> "AcceptanceModel":
+        """
+        训练模型
+
+        Args:
+            X: 特征矩阵（feature_matrix 输出）
+            y: 是否到岗（0/1）
+            l2: L2正则系数
+            iterations: 最大牛顿迭代次数
+        """
+        y = np.asarray(y, dtype=np.float64)
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        Z = np.column_stack([np.ones(len(X)), (X - self.mean) / self.scale])
+
+        weights = np.zeros(Z.shape[1])
+        penalty = l2 * len(X) * np.eye(Z.shape[1])
+        penalty[0, 0] = 0.0  # 截距不做正则
+        for _ in range(iterations):
+            p = _sigmoid(Z @ weights)
+            gradient = Z.T @ (p - y) + penalty @ weights
+            hessian = (Z * (p * (1 - p))[:, None]).T @ Z + penalty
+            step = np.linalg.solve(hessian, gradient)
+            weights -= step
+            if np.abs(step).max() < tol:
+                break
+
+        self.intercept = float(weights[0])
+        self.coef = weights[1:]
+        self.trained_on = len(X)
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """批量预测到岗概率"""
+        return _sigmoid(self.intercept + ((X - self.mean) / self.scale) @ self.coef)
+
+    def rider_logit(self, roster: RiderRoster, indices: np.ndarray = None) -> np.ndarray:
+        """
+        只含骑手自身特征的logit（拨打时刻取固定值），同一批拨打内与到岗概率同序
+        """
+        pick = slice(None) if indices is None else indices
+        columns = roster.columns
+        X = feature_matrix(
+            columns["acceptance_rate"][pick],
+            columns["distance_to_site"][pick],
+            columns["holiday_experience"][pick],
+            14,
+            0
+        )
+        return ((X - self.mean) / self.scale) @ self.coef
+
+    def score_roster(self, roster: RiderRoster, indices: np.ndarray = None, hour: int = None,
+                     weekday: int = None, distances: np.ndarray = None) -> np.ndarray:
+        """
+        为花名册（或其中部分骑手）批量打分
+
+        Args:
+            indices: 骑手下标，为空时为全部骑手
+            hour / weekday: 拨打时刻，默认当前时间
+            distances: 到目标站点的距离，为空时使用到所属站点的距离
+        """
+        now = datetime.now()
+        hour = now.hour if hour is None else hour
+        weekday = now.weekday() if weekday is None else weekday
+        pick = slice(None) if indices is None else indices
+        columns = roster.columns
+        X = feature_matrix(
+            columns["acceptance_rate"][pick],
+            columns["distance_to_site"][pick] if distances is None else distances,
+            columns["holiday_experience"][pick],
+            hour,
+            weekday
+        )
+        return self.predict_proba(X)
+
+    def log_loss(self, X: np.ndarray, y: np.ndarray) -> float:
+        p = np.clip(self.predict_proba(X), 1e-9, 1 - 1e-9)
+        return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "features": FEATURES,
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "trained_on": self.trained_on
+        }
+
+    def save(self, path: str) -> Path:
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return target
+
+    @classmethod
+    def load(cls, path: str) -> "AcceptanceModel":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("features") != FEATURES:
+            raise ValueError(f"模型特征与当前版本不一致: {data.get('features')}")
+        return cls(data["coef"], data["intercept"], data["mean"], data["scale"], data.get("trained_on", 0))
+
+def training_data_from_world(world: Dict[str, Dict[str, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """由合成世界的 calls 表构造训练数据（标签为是否到岗）"""
+    calls = world["calls"]
+    riders = world["riders"]
+    rider = calls["rider"]
+    X = feature_matrix(
+        riders["acceptance_rate"][rider],
+        riders["distance_to_site"][rider],
+        riders["holiday_experience"][rider],
+        calls["hour"],
+        calls["weekday"]
+    )
+    return X, calls["attended"].astype(np.float64)
+
+def training_data_from_records(call_records: Sequence[CallRecord], attendance_records: Sequence[AttendanceRecord],
+                               rider_features: Dict[str, Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    由通话与出勤记录构造训练数据
+
+    Args:
+        call_records: 通话记录（以 start_time 作为拨打时刻）
+        attendance_records: 出勤记录，按 (rider_id, task_id) 与通话关联
+        rider_features: 骑手ID -> 含 acceptance_rate、distance_to_site、holiday_experience 的字典
+    """
+    attended = {(record.rider_id, record.task_id): record.is_attended for record in attendance_records}
+    rows: List[Tuple[float, float, float, int, int]] = []
+    labels: List[float] = []
+    for call in call_records:
+        features = rider_features.get(call.rider_id)
+        if features is None or call.start_time is None:
+            continue
+        rows.append((
+            features["acceptance_rate"],
+            features.get("distance_to_site", features.get("distance", 0.0)),
+            features.get("holiday_experience", 0),
+            call.start_time.hour,
+            call.start_time.weekday()
+        ))
+        labels.append(float(attended.get((call.rider_id, call.task_id), False)))
+
+    if not rows:
+        return np.zeros((0, len(FEATURES))), np.zeros(0)
+    columns = np.array(rows, dtype=np.float64).T
+    return feature_matrix(*columns), np.array(labels)
+
+def smallest_call_list(probabilities: np.ndarray, required: int, confidence: float) -> Tuple[int, float]:
+    """
+    按概率从高到低拨打，求使"到岗人数 ≥ required"的概率达到 confidence 的最短名单长度
+
+    到岗人数服从泊松二项分布，逐个加入骑手时递推其分布（超过 required 的部分合并），
+    每步 O(required)
+
+    Args:
+        probabilities: 已按降序排列的到岗概率
+
+    Returns:
+        Tuple[int, float]: 名单长度与该长度下的达成概率；全部拨打仍达不到时返回全部长度
+    """
+    if required <= 0:
+        return 0, 1.0
+    distribution = np.zeros(required + 1)
+    distribution[0] = 1.0
+    for count, p in enumerate(probabilities, 1):
+        reached = distribution[-1]
+        distribution[1:] = distribution[1:] * (1 - p) + distribution[:-1] * p
+        distribution[0] *= 1 - p
+        distribution[-1] += reached * p  # 已凑够的状态保持凑够
+        if distribution[-1] >= confidence:
+            return count, float(distribution[-1])
+    return len(probabilities), float(distribution[-1])
+
+_model: Optional[AcceptanceModel] = None
+_model_lock = threading.Lock()
+
+def _bootstrap_model() -> AcceptanceModel:
+    """没有已训练模型时，用与模拟数据同分布的合成世界训练一个"""
+    from data.synthetic_world import WorldConfig, generate_world
+
+    world = generate_world(WorldConfig(n_sites=20, n_riders=20000, days=90, n_calls=100000, seed=0))
+    model = AcceptanceModel().fit(*training_data_from_world(world))
+    logger.info(f"未找到接受率模型 {settings.ACCEPTANCE_MODEL_PATH}，已用合成数据训练（{model.trained_on}条）")
+    return model
+
+def get_acceptance_model() -> AcceptanceModel:
+    """获取当前接受率模型（优先加载 ACCEPTANCE_MODEL_PATH）"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            path = Path(settings.ACCEPTANCE_MODEL_PATH)
+            _model = AcceptanceModel.load(str(path)) if path.exists() else _bootstrap_model()
+        return _model
+
+def set_acceptance_model(model: AcceptanceModel):
+    """替换当前接受率模型（如用最新召回结果重新训练后）"""
+    global _model
+    with _model_lock:
+        _model = model
+
+def main():
+    """由合成世界训练并保存模型"""
+    from data.synthetic_world import load_world
+
+    parser = argparse.ArgumentParser(description="训练骑手接受率模型")
+    parser.add_argument("--world", required=True, help="合成世界目录（data.synthetic_world 输出）")
+    parser.add_argument("--output", default=settings.ACCEPTANCE_MODEL_PATH, help="模型输出路径")
+    parser.add_argument("--holdout", type=float, default=0.2, help="验证集比例")
+    args = parser.parse_args()
+
+    X, y = training_data_from_world(load_world(args.world, tables=["riders", "calls"]))
+    split = int(len(X) * (1 - args.holdout))
+    model = AcceptanceModel().fit(X[:split], y[:split])
+    print(f"训练样本 {split}，验证集 log loss: {model.log_loss(X[split:], y[split:]):.4f}")
+    print(f"模型已写入 {model.save(args.output)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+跨站点骑手分配
+节前相邻站点同时召回时，把所有站点的候选名额放在一起求解一次指派问题，
+保证每个骑手最多分给一个站点，避免同一骑手被多个站点重复拨打。
+
+- 候选边：按半径截断，只为目标站点半径内且满足该站点画像要求的骑手建边（稀疏）
+- 收益：匹配得分（按到目标站点的距离计算） - 距离惩罚
+- 求解：拍卖算法（Bertsekas），站点的每个名额是一个出价者，
+  骑手是物品；名额也可以放弃（收益不为正时），因此站点缺口大于可用骑手时同样适用
+"""
+
+from collections import deque
+from typing import Any, Dict, Sequence
+import numpy as np
+from data.synthetic_world import haversine_km
+from models.ranking import qualification_mask, match_scores
+from models.roster import RiderRoster, CandidateSelection
+
+class CandidateEdges:
+    """站点 -> 候选骑手的稀疏边（CSR布局）"""
+
+    __slots__ = ("site_ptr", "riders", "distances", "scores", "benefits")
+
+    def __init__(self, site_ptr: np.ndarray, riders: np.ndarray, distances: np.ndarray,
+                 scores: np.ndarray, benefits: np.ndarray):
+        self.site_ptr = site_ptr
+        self.riders = riders
+        self.distances = distances
+        self.scores = scores
+        self.benefits = benefits
+
+    def __len__(self) -> int:
+        return len(self.riders)
+
+    def site(self, site: int) -> slice:
+        return slice(self.site_ptr[site], self.site_ptr[site + 1])
+
+def build_edges(roster: RiderRoster, latitudes: Sequence[float], longitudes: Sequence[float],
+                profiles: Sequence[Dict[str, Any]], radius_km: float, distance_weight: float) -> CandidateEdges:
+    """
+    为每个站点生成半径内的合格候选边
+
+    骑手按纬度排序后二分查找纬度带，只对带内骑手计算球面距离，
+    站点数 × 带内骑手数 远小于 站点数 × 骑手总数
+    """
+    rider_lat = roster.columns["current_latitude"]
+    rider_lon = roster.columns["current_longitude"]
+    order = np.argsort(rider_lat, kind="stable")
+    sorted_lat = rider_lat[order]
+    lat_span = radius_km / 111.0
+
+    site_ptr = [0]
+    parts = {"riders": [], "distances": [], "scores": [], "benefits": []}
+    for latitude, longitude, profile in zip(latitudes, longitudes, profiles):
+        lo, hi = np.searchsorted(sorted_lat, [latitude - lat_span, latitude + lat_span])
+        band = order[lo:hi]
+        distance = haversine_km(rider_lat[band], rider_lon[band], latitude, longitude)
+        near = distance <= radius_km
+        band, distance = band[near], distance[near]
+
+        qualified = qualification_mask(roster, profile, band, distance)
+        band, distance = band[qualified], distance[qualified]
+        scores = match_scores(roster, band, profile, distance)
+
+        parts["riders"].append(band)
+        parts["distances"].append(distance)
+        parts["scores"].append(scores)
+        parts["benefits"].append(scores - distance_weight * distance)
+        site_ptr.append(site_ptr[-1] + len(band))
+
+    def joined(name: str, dtype: Any) -> np.ndarray:
+        return np.concatenate(parts[name]).astype(dtype) if parts[name] else np.zeros(0, dtype=dtype)
+
+    return CandidateEdges(
+        np.asarray(site_ptr, dtype=np.int64),
+        joined("riders", np.int64),
+        joined("distances", np.float64),
+        joined("scores", np.float64),
+        joined("benefits", np.float64)
+    )
+
+def auction_assign(edges: CandidateEdges, slots: Sequence[int], n_riders: int, epsilon: float = 0.01) -> np.ndarray:
+    """
+    拍卖算法求解带名额的稀疏指派，最大化总收益
+
+    不做ε缩放：价格从0开始单调上升，未被出价的骑手价格始终为0，
+    这正是不对称指派（名额可放弃）下ε-最优所需的条件
+
+    Args:
+        edges: 候选边
+        slots: 每个站点的名额数
+        n_riders: 骑手总数
+        epsilon: 出价增量（结果与最优解的差距不超过 名额总数 × epsilon）
+
+    Returns:
+        np.ndarray: 每个骑手分配到的站点序号，未分配为 -1
+    """
+    prices = np.zeros(n_riders)
+    owner = np.full(n_riders, -1, dtype=np.int64)
+    queue = deque(site for site, count in enumerate(slots) for _ in range(count))
+
+    while queue:
+        site = queue.popleft()
+        edge_range = edges.site(site)
+        riders = edges.riders[edge_range]
+        if not len(riders):
+            continue
+
+        net = edges.benefits[edge_range] - prices[riders]
+        # 同一站点的名额彼此等价，不与自己已持有的骑手竞价
+        net[owner[riders] == site] = -np.inf
+        best = int(np.argmax(net))
+        best_value = net[best]
+        if best_value <= 0:
+            # 名额放弃：剩余骑手都不值得（收益为负或价格过高）
+            continue
+
+        net[best] = -np.inf
+        second_value = max(0.0, float(net.max())) if len(net) > 1 else 0.0
+        rider = riders[best]
+        prices[rider] += best_value - second_value + epsilon
+
+        previous = owner[rider]
+        owner[rider] = site
+        if previous >= 0:
+            queue.append(previous)
+
+    return owner
+
+def allocate(roster: RiderRoster, site_ids: Sequence[str], latitudes: Sequence[float],
+             longitudes: Sequence[float], slots: Sequence[int], profiles: Sequence[Dict[str, Any]],
+             radius_km: float = 5.0, distance_weight: float = 2.0, epsilon: float = 0.01) -> Dict[str, Any]:
+    """
+    跨站点分配候选骑手
+
+    Args:
+        roster: 参与分配的骑手（各站点共享）
+        site_ids / latitudes / longitudes: 站点ID与位置
+        slots: 每个站点的候选名额
+        profiles: 每个站点的骑手画像（ProfileGeneratorTool 输出）
+        radius_km: 候选边半径
+        distance_weight: 每公里距离扣减的收益
+        epsilon: 拍卖出价增量
+
+    Returns:
+        Dict: selections（站点ID -> 按得分降序的 CandidateSelection）、
+            total_benefit、edges、assigned
+    """
+    edges = build_edges(roster, latitudes, longitudes, profiles, radius_km, distance_weight)
+    owner = auction_assign(edges, slots, len(roster), epsilon)
+
+    selections = {}
+    total_benefit = 0.0
+    for site, site_id in enumerate(site_ids):
+        edge_range = edges.site(site)
+        chosen = owner[edges.riders[edge_range]] == site
+        riders = edges.riders[edge_range][chosen]
+        scores = edges.scores[edge_range][chosen]
+        distances = edges.distances[edge_range][chosen]
+        total_benefit += float(edges.benefits[edge_range][chosen].sum())
+
+        order = np.argsort(-scores, kind="stable")
+        selections[site_id] = CandidateSelection(roster, riders[order], scores[order], distances[order])
+
+    return {
+        "selections": selections,
+        "total_benefit": round(total_benefit, 2),
+        "edges": len(edges),
+        "assigned": int((owner >= 0).sum())
+    }
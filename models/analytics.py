@@ -0,0 +1,331 @@
+"""
+召回效果分析
+以事件流方式消费通话记录（CallRecord）与出勤记录（AttendanceRecord），
+按任务维护计数器，每个事件 O(1) 更新并可随时生成 AnalyticsResult 快照；
+历史数据的重新计算走 reprocess，对全部记录做一次向量化批处理，指标口径与逐条消费一致
+（批处理没有登记时间，任务开始时间取最早事件）。
+
+指标口径：
+- call_success_rate: 接通 / 拨打
+- recall_success_rate: 到岗 / 需补位人数（封顶1）；未知需补位人数时为 同意 / 拨打
+- attendance_rate: 到岗 / 出勤记录数（同意的骑手）
+- prediction_accuracy: 通话意愿（强意愿视为会到岗）与实际出勤一致的比例
+- avg_response_time: 任务开始到骑手同意的平均秒数
+- total_process_time: 任务开始到最后一个事件的秒数
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterable, Callable, Dict, Optional, Sequence, Tuple, Union
+import numpy as np
+from config.settings import settings
+from models.schemas import AnalyticsResult, AttendanceRecord, CallRecord, CallStatus, IntentLevel
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+Event = Union[CallRecord, AttendanceRecord]
+
+# 视为接通的通话状态
+CONNECTED_STATUSES = frozenset([CallStatus.CONNECTED, CallStatus.COMPLETED])
+
+def _is_agreed(record: CallRecord) -> bool:
+    return record.notes == "同意"
+
+class TaskCounters:
+    """单个召回任务的累计计数"""
+
+    __slots__ = (
+        "task_id", "site_id", "required_riders", "started_at", "last_event_at", "events",
+        "calls", "connected", "agreed", "attendance_records", "attended", "delay_minutes",
+        "agreed_end_total", "responses", "predicted", "predicted_correct", "last_call"
+    )
+
+    def __init__(self, task_id: str, site_id: str, required_riders: Optional[int], started_at: Optional[datetime]):
+        self.task_id = task_id
+        self.site_id = site_id
+        self.required_riders = required_riders
+        self.started_at = started_at
+        self.last_event_at = started_at
+        self.events = 0
+        self.calls = 0
+        self.connected = 0
+        self.agreed = 0
+        self.attendance_records = 0
+        self.attended = 0
+        self.delay_minutes = 0
+        # 同意通话结束时间之和（时间戳），响应时间在快照时按当前任务开始时间扣减，与事件顺序无关
+        self.agreed_end_total = 0.0
+        self.responses = 0
+        self.predicted = 0
+        self.predicted_correct = 0
+        # 骑手 -> 最近一次接通的通话（出勤到达时读取其意愿等级）
+        self.last_call: Dict[str, CallRecord] = {}
+
+    def _touch(self, when: Optional[datetime]):
+        self.events += 1
+        if when is None:
+            return
+        if self.started_at is None or when < self.started_at:
+            self.started_at = when
+        if self.last_event_at is None or when > self.last_event_at:
+            self.last_event_at = when
+
+    def add_call(self, record: CallRecord):
+        self._touch(record.end_time or record.start_time)
+        self.calls += 1
+        if record.status in CONNECTED_STATUSES:
+            self.connected += 1
+            self.last_call[record.rider_id] = record
+        if _is_agreed(record):
+            self.agreed += 1
+            if record.end_time is not None:
+                self.agreed_end_total += record.end_time.timestamp()
+                self.responses += 1
+
+    def add_attendance(self, record: AttendanceRecord):
+        self._touch(record.actual_time)
+        self.attendance_records += 1
+        if record.is_attended:
+            self.attended += 1
+            self.delay_minutes += record.delay_minutes
+        call = self.last_call.get(record.rider_id)
+        if call is not None and call.intent_level is not None:
+            self.predicted += 1
+            self.predicted_correct += int((call.intent_level == IntentLevel.STRONG) == record.is_attended)
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
+
+def build_result(task_id: str, site_id: str, required_riders: Optional[int], calls: int, connected: int,
+                 agreed: int, attendance_records: int, attended: int, delay_minutes: float, response_seconds: float,
+                 responses: int, predicted: int, predicted_correct: int, process_seconds: float, version: int = 0) -> AnalyticsResult:
+    """由计数生成分析结果（逐条消费与批处理共用，保证口径一致）"""
+    if required_riders:
+        recall_success_rate = min(1.0, attended / required_riders)
+    else:
+        recall_success_rate = _ratio(agreed, calls)
+    call_success_rate = _ratio(connected, calls)
+    attendance_rate = _ratio(attended, attendance_records)
+    avg_response_time = max(0.0, _ratio(response_seconds, responses))
+
+    recommendations = []
+    if calls and call_success_rate < settings.SUCCESS_RATE_TARGET:
+        recommendations.append(f"接通率 {call_success_rate:.1%} 低于目标，建议调整拨打时段或增加重拨")
+    if attendance_records and attendance_rate < settings.ATTENDANCE_RATE_TARGET:
+        recommendations.append(f"出勤率 {attendance_rate:.1%} 低于目标，建议上班前再次提醒已同意的骑手")
+    if agreed and avg_response_time > settings.RESPONSE_TIME_TARGET:
+        recommendations.append(f"平均响应 {avg_response_time:.0f} 秒超过目标，建议提高拨打并发")
+    if required_riders and attendance_records and attended < required_riders:
+        recommendations.append(f"到岗 {attended}/{required_riders} 人，建议扩大召回半径或提高激励")
+
+    return AnalyticsResult(
+        analysis_id=f"analysis_{task_id}_{version}",
+        task_id=task_id,
+        site_id=site_id,
+        total_calls=calls,
+        successful_calls=connected,
+        agreed_calls=agreed,
+        attended_riders=attended,
+        recall_success_rate=round(recall_success_rate, 4),
+        call_success_rate=round(call_success_rate, 4),
+        attendance_rate=round(attendance_rate, 4),
+        prediction_accuracy=round(_ratio(predicted_correct, predicted), 4),
+        avg_response_time=round(avg_response_time, 2),
+        avg_delay_minutes=round(_ratio(delay_minutes, attended), 2),
+        total_process_time=round(process_seconds, 2),
+        recommendations=recommendations
+    )
+
+class AnalyticsEngine:
+    """召回效果流式分析（按任务计数，事件 O(1)）"""
+
+    def __init__(self, max_tasks: int = 10000):
+        """
+        Args:
+            max_tasks: 保留的任务数上限，超出后淘汰最早登记的任务
+        """
+        self.max_tasks = max_tasks
+        self._tasks: "OrderedDict[str, TaskCounters]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register_task(self, task_id: str, site_id: str, required_riders: int = None, started_at: datetime = None):
+        """登记任务（site_id 与需补位人数用于计算召回成功率）"""
+        with self._lock:
+            counters = self._tasks.get(task_id)
+            if counters is None:
+                counters = self._tasks[task_id] = TaskCounters(task_id, site_id, required_riders, started_at or datetime.now())
+                while len(self._tasks) > self.max_tasks:
+                    self._tasks.popitem(last=False)
+            elif required_riders is not None:
+                counters.required_riders = required_riders
+
+    def _counters(self, task_id: str) -> TaskCounters:
+        counters = self._tasks.get(task_id)
+        if counters is None:
+            counters = self._tasks[task_id] = TaskCounters(task_id, "", None, None)
+            while len(self._tasks) > self.max_tasks:
+                self._tasks.popitem(last=False)
+        return counters
+
+    def on_call(self, record: CallRecord) -> AnalyticsResult:
+        """消费一条通话记录，返回该任务的最新快照"""
+        with self._lock:
+            counters = self._counters(record.task_id)
+            counters.add_call(record)
+            return self._snapshot(counters)
+
+    def on_attendance(self, record: AttendanceRecord) -> AnalyticsResult:
+        """消费一条出勤记录，返回该任务的最新快照"""
+        with self._lock:
+            counters = self._counters(record.task_id)
+            counters.add_attendance(record)
+            return self._snapshot(counters)
+
+    def on_event(self, event: Event) -> AnalyticsResult:
+        if isinstance(event, CallRecord):
+            return self.on_call(event)
+        return self.on_attendance(event)
+
+    async def consume(self, events: AsyncIterable[Event], on_snapshot: Callable[[AnalyticsResult], Any] = None) -> int:
+        """
+        消费异步事件流直至结束
+
+        Args:
+            events: CallRecord / AttendanceRecord 异步迭代器
+            on_snapshot: 每个事件后的快照回调
+
+        Returns:
+            int: 消费的事件数
+        """
+        count = 0
+        async for event in events:
+            snapshot = self.on_event(event)
+            count += 1
+            if on_snapshot is not None:
+                on_snapshot(snapshot)
+        return count
+
+    def _snapshot(self, counters: TaskCounters) -> AnalyticsResult:
+        process_seconds = response_seconds = 0.0
+        if counters.started_at is not None and counters.last_event_at is not None:
+            process_seconds = (counters.last_event_at - counters.started_at).total_seconds()
+            response_seconds = counters.agreed_end_total - counters.responses * counters.started_at.timestamp()
+        return build_result(
+            counters.task_id, counters.site_id, counters.required_riders, counters.calls, counters.connected,
+            counters.agreed, counters.attendance_records, counters.attended, counters.delay_minutes,
+            response_seconds, counters.responses, counters.predicted, counters.predicted_correct, process_seconds, counters.events
+        )
+
+    def snapshot(self, task_id: str) -> Optional[AnalyticsResult]:
+        """任务当前的分析结果，未知任务返回None"""
+        with self._lock:
+            counters = self._tasks.get(task_id)
+            return self._snapshot(counters) if counters is not None else None
+
+    def task_info(self) -> Dict[str, Tuple[str, Optional[int]]]:
+        """已登记任务的 (站点ID, 需补位人数)，供 reprocess 使用"""
+        with self._lock:
+            return {task_id: (counters.site_id, counters.required_riders) for task_id, counters in self._tasks.items()}
+
+def _timestamps(values: Sequence[Optional[datetime]]) -> np.ndarray:
+    return np.array([value.timestamp() if value is not None else np.nan for value in values], dtype=np.float64)
+
+def reprocess(call_records: Sequence[CallRecord], attendance_records: Sequence[AttendanceRecord],
+              tasks: Dict[str, Tuple[str, Optional[int]]] = None) -> Dict[str, AnalyticsResult]:
+    """
+    批量重新计算历史记录的分析结果
+
+    先把记录转成列数组，再用 bincount 按任务聚合；意愿与出勤的对应关系按
+    (任务, 骑手) 编码后排序二分查找，取该骑手在任务中最后一次接通的通话
+
+    Args:
+        call_records: 通话记录
+        attendance_records: 出勤记录
+        tasks: 任务ID -> (站点ID, 需补位人数)
+
+    Returns:
+        Dict[str, AnalyticsResult]: 任务ID -> 分析结果
+    """
+    tasks = tasks or {}
+    task_ids = sorted({record.task_id for record in call_records} | {record.task_id for record in attendance_records})
+    if not task_ids:
+        return {}
+    task_code = {task_id: code for code, task_id in enumerate(task_ids)}
+    rider_ids = sorted({record.rider_id for record in call_records} | {record.rider_id for record in attendance_records})
+    rider_code = {rider_id: code for code, rider_id in enumerate(rider_ids)}
+    n_tasks, n_riders = len(task_ids), len(rider_ids)
+
+    def count(codes: np.ndarray, weights: np.ndarray = None) -> np.ndarray:
+        return np.bincount(codes, weights=weights, minlength=n_tasks)
+
+    # 通话列
+    call_task = np.array([task_code[record.task_id] for record in call_records], dtype=np.int64)
+    call_rider = np.array([rider_code[record.rider_id] for record in call_records], dtype=np.int64)
+    connected = np.array([record.status in CONNECTED_STATUSES for record in call_records], dtype=bool)
+    agreed = np.array([_is_agreed(record) for record in call_records], dtype=bool)
+    intent = np.array([
+        -1 if record.intent_level is None else int(record.intent_level == IntentLevel.STRONG) for record in call_records
+    ], dtype=np.int8)
+    call_start = _timestamps([record.start_time for record in call_records])
+    call_end = _timestamps([record.end_time for record in call_records])
+    call_time = np.where(np.isnan(call_end), call_start, call_end)
+
+    # 出勤列
+    att_task = np.array([task_code[record.task_id] for record in attendance_records], dtype=np.int64)
+    att_rider = np.array([rider_code[record.rider_id] for record in attendance_records], dtype=np.int64)
+    attended = np.array([record.is_attended for record in attendance_records], dtype=bool)
+    delay = np.array([record.delay_minutes for record in attendance_records], dtype=np.float64)
+    att_time = _timestamps([record.actual_time for record in attendance_records])
+
+    # 任务起止时间：登记时间未知时取最早事件
+    event_task = np.concatenate([call_task, att_task])
+    event_time = np.concatenate([call_time, att_time])
+    valid = ~np.isnan(event_time)
+    started = np.full(n_tasks, np.inf)
+    finished = np.full(n_tasks, -np.inf)
+    np.minimum.at(started, event_task[valid], event_time[valid])
+    np.maximum.at(finished, event_task[valid], event_time[valid])
+
+    # 响应时间：同意通话的结束时间 - 任务开始
+    responded = agreed & ~np.isnan(call_end)
+    response = call_end[responded] - started[call_task[responded]]
+
+    # 出勤对应的最近一次接通通话的意愿
+    predicted = np.zeros(n_tasks)
+    predicted_correct = np.zeros(n_tasks)
+    if len(att_task) and connected.any():
+        keys = call_task[connected] * n_riders + call_rider[connected]
+        intents = intent[connected]
+        # 倒序后 unique 取每个 (任务, 骑手) 最后一次接通
+        unique_keys, last = np.unique(keys[::-1], return_index=True)
+        last_intent = intents[::-1][last]
+        att_keys = att_task * n_riders + att_rider
+        position = np.clip(np.searchsorted(unique_keys, att_keys), 0, len(unique_keys) - 1)
+        matched = (unique_keys[position] == att_keys) & (last_intent[position] >= 0)
+        predicted = count(att_task[matched])
+        predicted_correct = count(att_task[matched], (last_intent[position][matched] == 1) == attended[matched])
+
+    totals = {
+        "calls": count(call_task),
+        "connected": count(call_task, connected),
+        "agreed": count(call_task, agreed),
+        "attendance_records": count(att_task),
+        "attended": count(att_task, attended),
+        "delay": count(att_task, delay * attended),
+        "response": count(call_task[responded], response),
+        "responses": count(call_task[responded])
+    }
+
+    results = {}
+    for code, task_id in enumerate(task_ids):
+        site_id, required_riders = tasks.get(task_id, ("", None))
+        process_seconds = finished[code] - started[code] if np.isfinite(started[code]) else 0.0
+        results[task_id] = build_result(
+            task_id, site_id, required_riders, int(totals["calls"][code]), int(totals["connected"][code]),
+            int(totals["agreed"][code]), int(totals["attendance_records"][code]), int(totals["attended"][code]),
+            float(totals["delay"][code]), float(totals["response"][code]), int(totals["responses"][code]), int(predicted[code]),
+            int(predicted_correct[code]), float(process_seconds)
+        )
+    return results
@@ -0,0 +1,338 @@
+"""
+数据持久化
+把 DB_TABLES 中的各表映射到对应的 pydantic 模型（列由模型字段生成，字段变更无需同步维护两份定义）：
+
+    sites -> SiteInfo          riders -> RiderProfile      orders -> 订单量（无对应模型）
+    predictions -> PredictionResult                        recalls -> RecallTask
+    calls -> CallRecord        attendance -> AttendanceRecord
+    analytics -> AnalyticsResult
+
+- 连接池：非SQLite使用 QueuePool（DB_POOL_SIZE / DB_MAX_OVERFLOW，pre-ping 与定期回收）；
+  SQLite 文件库每个连接打开 WAL、synchronous=NORMAL、busy_timeout 等
+- 批量写入：同一事务内按 DB_BATCH_SIZE 分块 executemany；有业务主键的表按主键 upsert
+- 异步：AsyncRepository 在专用线程池中执行同步写入，工作流 await 时不阻塞事件循环；
+  RepositorySession 收集一次工作流的全部记录，退出时在一个事务中写入
+"""
+
+import asyncio
+import enum
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Type, Union
+from pydantic import BaseModel
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, Text, create_engine, event, func, insert, select
+)
+from sqlalchemy.engine import Connection, Engine
+from config.settings import settings, DB_TABLES
+from models.schemas import (
+    AnalyticsResult, AttendanceRecord, CallRecord, PredictionResult, RecallTask, RiderProfile, SiteInfo
+)
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 表名 -> (模型, 业务主键；None表示自增主键、只追加)
+SCHEMA_TABLES: Dict[str, tuple] = {
+    "sites": (SiteInfo, "site_id"),
+    "riders": (RiderProfile, "rider_id"),
+    "predictions": (PredictionResult, None),
+    "recalls": (RecallTask, "task_id"),
+    "calls": (CallRecord, "call_id"),
+    "attendance": (AttendanceRecord, "record_id"),
+    "analytics": (AnalyticsResult, "analysis_id")
+}
+
+# 需要索引的外键类字段
+INDEXED_FIELDS = {"site_id", "task_id", "rider_id", "target_date"}
+
+# 长文本字段
+TEXT_FIELDS = {"transcript", "suggestion", "notes"}
+
+def _column_type(name: str, annotation: Any):
+    """pydantic 字段类型 -> SQLAlchemy 列类型"""
+    if typing.get_origin(annotation) is Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    if typing.get_origin(annotation) in (list, dict) or annotation in (list, dict):
+        return JSON
+    if isinstance(annotation, type):
+        if issubclass(annotation, enum.Enum):
+            return String(32)
+        if issubclass(annotation, bool):
+            return Boolean
+        if issubclass(annotation, int):
+            return Integer
+        if issubclass(annotation, float):
+            return Float
+        if issubclass(annotation, datetime):
+            return DateTime
+    return Text if name in TEXT_FIELDS else String(128)
+
+def _schema_table(metadata: MetaData, name: str, schema: Type[BaseModel], key: Optional[str]) -> Table:
+    columns = []
+    if key is None:
+        columns.append(Column("id", Integer, primary_key=True, autoincrement=True))
+    for field_name, field in schema.model_fields.items():
+        columns.append(Column(
+            field_name,
+            _column_type(field_name, field.annotation),
+            primary_key=field_name == key,
+            nullable=field_name != key,
+            index=field_name != key and field_name in INDEXED_FIELDS,
+            comment=field.description
+        ))
+    return Table(name, metadata, *columns, comment=DB_TABLES.get(name))
+
+def build_metadata() -> MetaData:
+    """按 SCHEMA_TABLES 生成全部表定义"""
+    metadata = MetaData()
+    for name, (schema, key) in SCHEMA_TABLES.items():
+        _schema_table(metadata, name, schema, key)
+    Table(
+        "orders", metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("site_id", String(128), nullable=False, index=True),
+        Column("order_date", String(16), nullable=False, index=True),
+        Column("hour", Integer, nullable=True, comment="小时（日订单为空）"),
+        Column("orders", Integer, nullable=False),
+        comment=DB_TABLES["orders"]
+    )
+    return metadata
+
+def _tune_sqlite(dbapi_connection, _):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.DB_BUSY_TIMEOUT * 1000)}")
+    cursor.execute("PRAGMA cache_size=-16000")  # 约16MB页缓存
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def create_db_engine(url: str = None, echo: bool = None) -> Engine:
+    """
+    按 DATABASE_URL 创建连接池化的引擎
+
+    SQLite 文件库额外打开WAL等调优；内存库不能跨连接共享，保持SQLAlchemy默认池
+    """
+    url = url or settings.DATABASE_URL
+    options: Dict[str, Any] = {"echo": settings.DB_ECHO if echo is None else echo, "future": True}
+    if url.startswith("sqlite"):
+        path = url.split("///", 1)[-1]
+        if path and path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW)
+        options["connect_args"] = {"check_same_thread": False, "timeout": settings.DB_BUSY_TIMEOUT}
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=True
+        )
+
+    engine = create_engine(url, **options)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _tune_sqlite)
+    return engine
+
+def to_row(model: BaseModel) -> Dict[str, Any]:
+    """模型 -> 数据表行（枚举转为值）"""
+    row = model.model_dump()
+    for name, value in row.items():
+        if isinstance(value, enum.Enum):
+            row[name] = value.value
+    return row
+
+def _table_name(model: BaseModel) -> str:
+    for name, (schema, _) in SCHEMA_TABLES.items():
+        if type(model) is schema:
+            return name
+    raise TypeError(f"没有对应数据表的模型: {type(model).__name__}")
+
+class Repository:
+    """同步仓储：按模型读写对应数据表"""
+
+    def __init__(self, engine: Engine = None, batch_size: int = None, create_tables: bool = True):
+        self.engine = engine or create_db_engine()
+        self.batch_size = batch_size or settings.DB_BATCH_SIZE
+        self.metadata = build_metadata()
+        self.tables = self.metadata.tables
+        if create_tables:
+            self.metadata.create_all(self.engine)
+
+    @contextmanager
+    def transaction(self) -> Iterator[Connection]:
+        """一个事务（从连接池取连接，结束时提交或回滚）"""
+        with self.engine.begin() as connection:
+            yield connection
+
+    def _statement(self, table_name: str):
+        table = self.tables[table_name]
+        key = SCHEMA_TABLES.get(table_name, (None, None))[1]
+        dialect = self.engine.dialect.name
+        if key is None or dialect not in ("sqlite", "postgresql"):
+            return insert(table)
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table)
+        # 主键冲突时更新其余列（如通话状态、意愿等级回写）
+        return statement.on_conflict_do_update(
+            index_elements=[key],
+            set_={column.name: statement.excluded[column.name] for column in table.columns if column.name != key}
+        )
+
+    def insert_rows(self, table_name: str, rows: Sequence[Dict[str, Any]], connection: Connection = None) -> int:
+        """按批写入字典行（有业务主键的表为upsert）"""
+        if not rows:
+            return 0
+        statement = self._statement(table_name)
+        if connection is None:
+            with self.transaction() as connection:
+                return self.insert_rows(table_name, rows, connection)
+        for start in range(0, len(rows), self.batch_size):
+            connection.execute(statement, list(rows[start:start + self.batch_size]))
+        return len(rows)
+
+    def save(self, model: BaseModel, connection: Connection = None):
+        """写入单个模型"""
+        self.insert_rows(_table_name(model), [to_row(model)], connection)
+
+    def save_many(self, models: Iterable[BaseModel], connection: Connection = None) -> int:
+        """批量写入模型（可混合多种模型，按表分组写入同一事务）"""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for model in models:
+            grouped.setdefault(_table_name(model), []).append(to_row(model))
+        if connection is None:
+            with self.transaction() as connection:
+                return self.save_many_rows(grouped, connection)
+        return self.save_many_rows(grouped, connection)
+
+    def save_many_rows(self, grouped: Dict[str, List[Dict[str, Any]]], connection: Connection) -> int:
+        return sum(self.insert_rows(name, rows, connection) for name, rows in grouped.items())
+
+    def insert_orders(self, site_id: str, dates: Sequence[str], orders: Sequence[int], hours: Sequence[int] = None) -> int:
+        """批量写入订单量（日订单 hours 为空）"""
+        rows = [
+            {"site_id": site_id, "order_date": str(day), "hour": None if hours is None else int(hours[index]), "orders": int(count)}
+            for index, (day, count) in enumerate(zip(dates, orders))
+        ]
+        return self.insert_rows("orders", rows)
+
+    def get(self, schema: Type[BaseModel], key: Any) -> Optional[BaseModel]:
+        """按业务主键读取"""
+        name = next(name for name, (table_schema, _) in SCHEMA_TABLES.items() if table_schema is schema)
+        key_column = SCHEMA_TABLES[name][1]
+        if key_column is None:
+            raise ValueError(f"{name} 表没有业务主键，请使用 query")
+        table = self.tables[name]
+        with self.engine.connect() as connection:
+            row = connection.execute(select(table).where(table.c[key_column] == key)).mappings().first()
+        return schema(**row) if row is not None else None
+
+    def query(self, schema: Type[BaseModel], limit: int = None, **filters) -> List[BaseModel]:
+        """按字段等值过滤读取"""
+        name = next(name for name, (table_schema, _) in SCHEMA_TABLES.items() if table_schema is schema)
+        table = self.tables[name]
+        statement = select(table)
+        for column, value in filters.items():
+            statement = statement.where(table.c[column] == (value.value if isinstance(value, enum.Enum) else value))
+        if limit:
+            statement = statement.limit(limit)
+        with self.engine.connect() as connection:
+            rows = connection.execute(statement).mappings().all()
+        return [schema(**{key: value for key, value in row.items() if key != "id"}) for row in rows]
+
+    def count(self, table_name: str) -> int:
+        table = self.tables[table_name]
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(table)).scalar_one()
+
+    def dispose(self):
+        self.engine.dispose()
+
+class RepositorySession:
+    """异步工作单元：收集模型，退出时在一个事务中写入"""
+
+    def __init__(self, repository: "AsyncRepository"):
+        self._repository = repository
+        self._pending: List[BaseModel] = []
+
+    def add(self, model: BaseModel):
+        self._pending.append(model)
+
+    def add_all(self, models: Iterable[BaseModel]):
+        self._pending.extend(models)
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, []
+        return await self._repository.save_many(pending) if pending else 0
+
+    async def __aenter__(self) -> "RepositorySession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            await self.flush()
+        else:
+            self._pending.clear()
+
+class AsyncRepository:
+    """异步仓储：同步写入在专用线程池执行（线程数与连接池大小一致）"""
+
+    def __init__(self, repository: Repository = None, workers: int = None):
+        self.repository = repository or Repository()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or settings.DB_POOL_SIZE, thread_name_prefix="db"
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    def session(self) -> RepositorySession:
+        return RepositorySession(self)
+
+    async def save(self, model: BaseModel):
+        await self._run(self.repository.save, model)
+
+    async def save_many(self, models: Iterable[BaseModel]) -> int:
+        return await self._run(self.repository.save_many, list(models))
+
+    async def get(self, schema: Type[BaseModel], key: Any) -> Optional[BaseModel]:
+        return await self._run(self.repository.get, schema, key)
+
+    async def query(self, schema: Type[BaseModel], limit: int = None, **filters) -> List[BaseModel]:
+        return await self._run(self.repository.query, schema, limit, **filters)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.repository.dispose()
+
+_repository: Optional[Repository] = None
+_async_repository: Optional[AsyncRepository] = None
+_repository_lock = threading.Lock()
+
+def get_repository() -> Repository:
+    """进程内共享的仓储（首次调用时建表）"""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = Repository()
+        return _repository
+
+def get_async_repository() -> Optional[AsyncRepository]:
+    """进程内共享的异步仓储（DB_PERSIST_ENABLED 关闭时为None）"""
+    global _async_repository
+    if not settings.DB_PERSIST_ENABLED:
+        return None
+    repository = get_repository()
+    with _repository_lock:
+        if _async_repository is None:
+            _async_repository = AsyncRepository(repository)
+        return _async_repository
@@ -0,0 +1,387 @@
+"""
+通话意愿识别
+把通话转写分为 强意愿 / 犹豫 / 中立 / 拒绝（IntentLevel），结果写回 CallRecord：
+
+- 分词：jieba，词典在每个进程只加载一次（另加召回场景词，如"没问题""回老家"）；
+  默认在工作线程中分词，配置 INTENT_WORKERS 后大批量提交到进程池，池中每个进程启动时加载词典与分类器
+- 分类：本地轻量词袋线性模型（各词对四个等级的权重 + 否定词翻转），softmax 给出置信度；
+  默认使用内置词表，也可由已标注转写按朴素贝叶斯训练后保存为JSON
+- 流式：IntentStream 由拨打流程逐条送入通话记录，凑批后分析并写回，不阻塞拨打
+
+用法:
+    python -m models.intent --count 20000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import jieba
+import numpy as np
+from config.settings import settings
+from models.schemas import CallRecord, IntentLevel
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 分类输出顺序
+LEVELS: List[str] = [IntentLevel.STRONG.value, IntentLevel.HESITANT.value, IntentLevel.NEUTRAL.value, IntentLevel.REJECT.value]
+
+# 内置词表：词 -> 对应等级与权重
+LEXICON: Dict[str, Tuple[str, float]] = {
+    "可以": ("strong", 1.5), "没问题": ("strong", 2.5), "好的": ("strong", 1.5), "行": ("strong", 1.2),
+    "一定": ("strong", 2.0), "肯定": ("strong", 2.0), "准时": ("strong", 2.0), "愿意": ("strong", 2.0),
+    "能来": ("strong", 2.0), "放心": ("strong", 1.5), "到岗": ("strong", 1.0), "马上": ("strong", 1.5),
+    "看看": ("hesitant", 1.5), "考虑": ("hesitant", 2.0), "再说": ("hesitant", 2.0), "不一定": ("hesitant", 2.5),
+    "可能": ("hesitant", 1.5), "尽量": ("hesitant", 2.0), "试试": ("hesitant", 1.5), "不确定": ("hesitant", 2.5),
+    "也许": ("hesitant", 1.5), "到时候": ("hesitant", 1.5), "安排": ("hesitant", 0.5),
+    "知道": ("neutral", 1.0), "了解": ("neutral", 1.0), "收到": ("neutral", 1.0), "听到": ("neutral", 1.0),
+    "嗯嗯": ("neutral", 0.5), "哦": ("neutral", 0.5),
+    "不行": ("reject", 2.5), "不去": ("reject", 2.5), "没空": ("reject", 2.5), "没时间": ("reject", 2.5),
+    "回老家": ("reject", 2.5), "不干": ("reject", 2.5), "辞职": ("reject", 2.5), "算了": ("reject", 2.0),
+    "别打": ("reject", 2.0), "有事": ("reject", 1.5), "休息": ("reject", 1.0)
+}
+
+# 否定词后紧跟的意愿词按"拒绝"计
+NEGATIONS = frozenset(["不", "没", "没有", "别", "不会"])
+
+# 加入分词词典的场景词（避免被切碎）
+DOMAIN_WORDS = [word for word in LEXICON if len(word) > 1] + ["站点", "骑手", "加班", "节日"]
+
+_tokenizer: Optional[jieba.Tokenizer] = None
+_tokenizer_lock = threading.Lock()
+
+def get_tokenizer() -> jieba.Tokenizer:
+    """本进程共享的分词器（首次调用时加载词典）"""
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            jieba.setLogLevel(logging.WARNING)
+            tokenizer = jieba.Tokenizer()
+            tokenizer.initialize()
+            for word in DOMAIN_WORDS:
+                tokenizer.add_word(word, freq=100000)
+            _tokenizer = tokenizer
+        return _tokenizer
+
+def tokenize_batch(texts: Sequence[str]) -> List[List[str]]:
+    """批量分词（去掉空白与标点）"""
+    tokenizer = get_tokenizer()
+    return [
+        [token for token in tokenizer.lcut(text or "", HMM=False) if token.strip() and not _is_punctuation(token)]
+        for text in texts
+    ]
+
+def _is_punctuation(token: str) -> bool:
+    return all(not char.isalnum() for char in token)
+
+class IntentClassifier:
+    """词袋线性意愿分类器"""
+
+    def __init__(self, weights: Dict[str, Sequence[float]] = None, bias: Sequence[float] = None, trained_on: int = 0):
+        if weights is None:
+            weights = {}
+            for word, (level, weight) in LEXICON.items():
+                vector = weights.setdefault(word, [0.0] * len(LEVELS))
+                vector[LEVELS.index(level)] += weight
+            # 没有命中任何意愿词时倾向"中立"
+            bias = [0.0, 0.0, 0.5, 0.0]
+        self.weights = {word: np.asarray(vector, dtype=np.float64) for word, vector in weights.items()}
+        self.bias = np.zeros(len(LEVELS)) if bias is None else np.asarray(bias, dtype=np.float64)
+        self.trained_on = trained_on
+        self._reject = LEVELS.index(IntentLevel.REJECT.value)
+
+    def logits(self, tokens: Sequence[str]) -> np.ndarray:
+        logits = self.bias.copy()
+        negated = False
+        for token in tokens:
+            vector = self.weights.get(token)
+            if vector is not None:
+                if negated and vector.argmax() != self._reject:
+                    # "不可以""没愿意"：意愿词的权重转给拒绝
+                    logits[self._reject] += vector.max()
+                else:
+                    logits += vector
+            negated = token in NEGATIONS
+        return logits
+
+    def classify(self, tokens: Sequence[str]) -> Tuple[str, float]:
+        """
+        Returns:
+            Tuple[str, float]: (意愿等级, 置信度)
+        """
+        logits = self.logits(tokens)
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        best = int(probabilities.argmax())
+        return LEVELS[best], float(probabilities[best])
+
+    def classify_batch(self, token_lists: Sequence[Sequence[str]]) -> List[Tuple[str, float]]:
+        return [self.classify(tokens) for tokens in token_lists]
+
+    def fit(self, token_lists: Sequence[Sequence[str]], labels: Sequence[str], alpha: float = 1.0,
+            min_count: int = 2) -> "IntentClassifier":
+        """
+        按多项式朴素贝叶斯由已标注转写训练（权重为各等级对数似然减去均值）
+
+        Args:
+            token_lists: 分词结果
+            labels: 意愿等级（IntentLevel 值）
+            alpha: 拉普拉斯平滑
+            min_count: 词频下限
+        """
+        counts = {level: Counter() for level in LEVELS}
+        priors = Counter(labels)
+        for tokens, label in zip(token_lists, labels):
+            counts[label].update(tokens)
+        vocabulary = [word for word, total in sum(counts.values(), Counter()).items() if total >= min_count]
+
+        weights = np.zeros((len(vocabulary), len(LEVELS)))
+        for column, level in enumerate(LEVELS):
+            level_counts = np.array([counts[level][word] for word in vocabulary], dtype=np.float64)
+            weights[:, column] = np.log((level_counts + alpha) / (level_counts.sum() + alpha * len(vocabulary)))
+        weights -= weights.mean(axis=1, keepdims=True)
+
+        total = sum(priors.values())
+        self.weights = dict(zip(vocabulary, weights))
+        self.bias = np.log(np.array([(priors[level] + alpha) / (total + alpha * len(LEVELS)) for level in LEVELS]))
+        self.trained_on = total
+        return self
+
+    def accuracy(self, token_lists: Sequence[Sequence[str]], labels: Sequence[str]) -> float:
+        predicted = [level for level, _ in self.classify_batch(token_lists)]
+        return sum(p == y for p, y in zip(predicted, labels)) / len(labels) if labels else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "levels": LEVELS,
+            "weights": {word: vector.tolist() for word, vector in self.weights.items()},
+            "bias": self.bias.tolist(),
+            "trained_on": self.trained_on
+        }
+
+    def save(self, path: str) -> Path:
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(json.dumps(self.to_dict(), ensure_ascii=False), encoding="utf-8")
+        return target
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        if data.get("levels") != LEVELS:
+            raise ValueError(f"模型等级与当前版本不一致: {data.get('levels')}")
+        return cls(data["weights"], data["bias"], data.get("trained_on", 0))
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_lock = threading.Lock()
+
+def get_intent_classifier() -> IntentClassifier:
+    """
+    获取当前意愿分类器：CALL_ANALYSIS_MODEL 为已训练模型的JSON路径时加载，否则使用内置词表
+    """
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            path = Path(settings.CALL_ANALYSIS_MODEL)
+            _classifier = IntentClassifier.load(str(path)) if path.suffix == ".json" and path.exists() else IntentClassifier()
+        return _classifier
+
+def set_intent_classifier(classifier: IntentClassifier):
+    """替换当前意愿分类器（已创建的进程池需重建后生效）"""
+    global _classifier
+    with _classifier_lock:
+        _classifier = classifier
+
+# 进程池中每个进程各自持有的分类器
+_worker_classifier: Optional[IntentClassifier] = None
+
+def _init_worker(model: Dict[str, Any]):
+    global _worker_classifier
+    get_tokenizer()
+    _worker_classifier = IntentClassifier(model["weights"], model["bias"], model.get("trained_on", 0))
+
+def _analyze_in_worker(texts: List[str]) -> List[Tuple[str, float]]:
+    # 只把 (等级, 置信度) 传回主进程，避免回传分词结果的序列化开销
+    return _worker_classifier.classify_batch(tokenize_batch(texts))
+
+def analyze_batch(texts: Sequence[str], classifier: IntentClassifier = None) -> List[Tuple[str, float]]:
+    """在当前进程分词并分类"""
+    return (classifier or get_intent_classifier()).classify_batch(tokenize_batch(texts))
+
+class IntentWorkerPool:
+    """分词/分类进程池（每个进程启动时加载一次词典与分类器）"""
+
+    def __init__(self, workers: int = None, classifier: IntentClassifier = None):
+        self.workers = workers or max(settings.INTENT_WORKERS, 0) or os.cpu_count() or 1
+        self.classifier = classifier or get_intent_classifier()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self.classifier.to_dict(),)
+        )
+
+    def _chunks(self, texts: Sequence[str], chunk_size: int = None) -> List[List[str]]:
+        chunk_size = chunk_size or max(1, math.ceil(len(texts) / self.workers))
+        return [list(texts[start:start + chunk_size]) for start in range(0, len(texts), chunk_size)]
+
+    def analyze(self, texts: Sequence[str], chunk_size: int = None) -> List[Tuple[str, float]]:
+        """同步批量分析（按进程数切块）"""
+        results: List[Tuple[str, float]] = []
+        for part in self._executor.map(_analyze_in_worker, self._chunks(texts, chunk_size)):
+            results.extend(part)
+        return results
+
+    async def analyze_async(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """异步批量分析，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _analyze_in_worker, chunk) for chunk in self._chunks(texts)
+        ))
+        return [result for part in parts for result in part]
+
+    def warmup(self):
+        """让每个进程完成初始化（加载词典）"""
+        self.analyze(["好的"] * self.workers, chunk_size=1)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+_pool: Optional[IntentWorkerPool] = None
+_pool_lock = threading.Lock()
+
+def get_intent_pool() -> Optional[IntentWorkerPool]:
+    """进程内共享的意愿分析进程池（INTENT_WORKERS 不大于0时不使用进程池，返回None）"""
+    global _pool
+    if settings.INTENT_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool.classifier is not get_intent_classifier():
+            if _pool is not None:
+                _pool.close()
+            _pool = IntentWorkerPool()
+        return _pool
+
+def apply_intent(record: CallRecord, level: str, confidence: float, threshold: float = None):
+    """把分析结果写回通话记录（置信度低于阈值记为中立）"""
+    threshold = settings.INTENT_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    record.intent_level = IntentLevel(level) if confidence >= threshold else IntentLevel.NEUTRAL
+    record.confidence = round(confidence, 4)
+
+class IntentStream:
+    """
+    流式意愿分析：拨打流程逐条 submit 通话记录，后台凑够 batch_size 条
+    或等待 max_delay 秒后整批分析并写回
+    """
+
+    def __init__(self, pool: IntentWorkerPool = None, batch_size: int = None, max_delay: float = 0.05,
+                 threshold: float = None, classifier: IntentClassifier = None):
+        """
+        Args:
+            pool: 进程池，为空时在当前进程的工作线程中分析
+            batch_size: 每批条数
+            max_delay: 凑批最长等待秒数
+            threshold: 置信度阈值
+            classifier: 在当前进程分析时使用的分类器
+        """
+        self.pool = pool
+        self.batch_size = batch_size or settings.INTENT_BATCH_SIZE
+        self.max_delay = max_delay
+        self.threshold = threshold
+        self.classifier = classifier
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.analyzed = 0
+        self.levels = Counter()
+
+    def start(self) -> "IntentStream":
+        self._task = asyncio.create_task(self._consume())
+        return self
+
+    def submit(self, record: CallRecord):
+        """送入一条通话记录（无转写的记录忽略）"""
+        if record.transcript:
+            self._queue.put_nowait(record)
+
+    async def _next_batch(self) -> List[Optional[CallRecord]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _consume(self):
+        while True:
+            batch = await self._next_batch()
+            closing = batch[-1] is None
+            records = [record for record in batch if record is not None]
+            if records:
+                texts = [record.transcript for record in records]
+                # 小批量在当前进程分析（放到工作线程，不阻塞拨打），省去进程间传输
+                if self.pool is not None and len(records) >= settings.INTENT_POOL_MIN_BATCH:
+                    results = await self.pool.analyze_async(texts)
+                else:
+                    results = await asyncio.to_thread(analyze_batch, texts, self.classifier)
+                for record, (level, confidence) in zip(records, results):
+                    apply_intent(record, level, confidence, self.threshold)
+                    self.levels[record.intent_level.value] += 1
+                self.analyzed += len(records)
+            if closing:
+                return
+
+    async def close(self) -> Dict[str, Any]:
+        """处理完已送入的记录后结束，返回各等级计数"""
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+        return {"analyzed": self.analyzed, "levels": dict(self.levels)}
+
+def main():
+    """合成转写上的吞吐，以及留出话术上的准确率"""
+    from data.synthetic_world import TRANSCRIPT_HELDOUT_PHRASES, synthetic_transcripts
+
+    parser = argparse.ArgumentParser(description="通话意愿识别吞吐测试")
+    parser.add_argument("--count", type=int, default=20000, help="转写条数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    labels = [LEVELS[index] for index in rng.integers(0, len(LEVELS), args.count)]
+    texts = synthetic_transcripts(labels, rng)
+
+    get_tokenizer()
+    start = time.perf_counter()
+    inline = analyze_batch(texts)
+    inline_seconds = time.perf_counter() - start
+
+    pool = IntentWorkerPool(args.workers)
+    pool.warmup()
+    start = time.perf_counter()
+    pooled = pool.analyze(texts)
+    pool_seconds = time.perf_counter() - start
+    pool.close()
+
+    # 吞吐用的话术与内置词表同源，准确率只在留出话术上评估
+    heldout = synthetic_transcripts(labels, rng, TRANSCRIPT_HELDOUT_PHRASES)
+    accuracy = get_intent_classifier().accuracy(tokenize_batch(heldout), labels)
+    print(f"单进程: {len(texts) / inline_seconds:,.0f} 条/秒")
+    print(f"{args.workers}进程: {len(texts) / pool_seconds:,.0f} 条/秒（每核 {len(texts) / pool_seconds / args.workers:,.0f}）")
+    print(f"进程池结果与单进程一致: {inline == pooled}")
+    print(f"留出话术准确率: {accuracy:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+候选骑手增量排名
+按站点维护骑手花名册，并为每种画像（紧急程度 × 周末/节假日标记）物化一份
+按预测到岗概率（未给模型时按匹配得分）排序的堆。骑手状态、位置或表现指标变化时只重算该骑手并压入新条目
+（O(log n)，旧条目按版本号惰性失效），召回时取前N名只需遍历堆顶附近 O(N log N)，
+不再对整个花名册重新筛选排序。
+"""
+
+import heapq
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from models.acceptance import AcceptanceModel, get_acceptance_model, smallest_call_list
+from models.roster import RiderRoster, RiderRow, CandidateSelection, STATUS_CODES
+from models.schemas import RiderStatus
+from utils.contact_guard import ContactGuard
+
+# 画像键：(紧急程度, 是否周末, 是否节假日)
+ProfileKey = Tuple[str, bool, bool]
+
+def profile_key(profile: Dict[str, Any]) -> ProfileKey:
+    """画像 -> 物化排名的键（筛选阈值只由紧急程度和日期标记决定）"""
+    return (
+        profile.get("urgency_level", "medium"),
+        bool(profile.get("is_weekend")),
+        bool(profile.get("is_holiday"))
+    )
+
+def qualification_mask(roster: RiderRoster, profile: Dict[str, Any], indices: np.ndarray = None,
+                       distance: np.ndarray = None) -> np.ndarray:
+    """
+    检查是否满足基础要求，返回布尔掩码（indices为空时针对全部骑手）
+
+    distance 为空时使用骑手到所属站点的距离，跨站点分配时传入到目标站点的距离
+    """
+    columns = roster.columns
+    pick = slice(None) if indices is None else indices
+    if distance is None:
+        distance = columns["distance_to_site"][pick]
+    return (
+        (columns["acceptance_rate"][pick] >= profile["min_acceptance_rate"])
+        & (columns["avg_response_time"][pick] <= profile["max_response_time"])
+        & (columns["completion_rate"][pick] >= profile["min_completion_rate"])
+        & (columns["active_days"][pick] >= profile["min_active_days"])
+        & (distance <= profile["max_distance"])
+        & (columns["status"][pick] == STATUS_CODES.index(RiderStatus.ACTIVE.value))  # 必须是活跃状态
+    )
+
+def match_scores(roster: RiderRoster, indices: np.ndarray, profile: Dict[str, Any],
+                 distance: np.ndarray = None) -> np.ndarray:
+    """计算指定骑手的匹配得分（distance 含义同 qualification_mask）"""
+    columns = roster.columns
+    acceptance_rate = columns["acceptance_rate"][indices].astype(np.float64)
+    response_time = columns["avg_response_time"][indices].astype(np.float64)
+    completion_rate = columns["completion_rate"][indices].astype(np.float64)
+    if distance is None:
+        distance = columns["distance_to_site"][indices]
+    distance = np.asarray(distance, dtype=np.float64)
+    active_days = columns["active_days"][indices].astype(np.float64)
+
+    # 接单率得分 (30%)
+    score = np.minimum(1.0, acceptance_rate / 0.9) * 30
+
+    # 响应时间得分 (20%)
+    score += np.maximum(0, (300 - response_time) / 300) * 20
+
+    # 完成率得分 (25%)
+    score += np.minimum(1.0, completion_rate / 0.95) * 25
+
+    # 距离得分 (15%)
+    score += np.maximum(0, (5.0 - distance) / 5.0) * 15
+
+    # 经验得分 (10%)
+    score += np.minimum(1.0, active_days / 100) * 10
+
+    # 节假日经验加分
+    if profile.get("is_holiday") or profile.get("is_weekend"):
+        score += np.minimum(5, columns["holiday_experience"][indices])
+
+    # 可用性加分
+    score += np.where(columns["peak_hour_availability"][indices], 3, 0)
+    if profile.get("is_weekend"):
+        score += np.where(columns["weekend_availability"][indices], 3, 0)
+
+    return np.round(score, 2)
+
+class CandidateRanking:
+    """
+    单个花名册在单一画像下的增量排名
+
+    默认按匹配得分排序；传入接受率模型时按预测到岗概率排序。拨打时刻（小时/星期）
+    对所有骑手是同一个logit偏移，不改变顺序，因此按骑手自身特征的logit建堆即可
+    """
+
+    def __init__(self, roster: RiderRoster, profile: Dict[str, Any], model: AcceptanceModel = None):
+        self.roster = roster
+        self.profile = dict(profile)
+        self.model = model
+        n = len(roster)
+        # 每个骑手当前匹配得分（不合格为NaN）、排序键与版本号；堆中条目 (-排序键, 下标, 版本)
+        self._scores = np.full(n, np.nan)
+        self._keys = np.full(n, np.nan)
+        self._versions = np.zeros(n, dtype=np.int64)
+        self._heap: List[Tuple[float, int, int]] = []
+        self._qualified = 0
+        self.rebuild()
+
+    def __len__(self) -> int:
+        """合格骑手数"""
+        return self._qualified
+
+    def _sort_keys(self, indices: np.ndarray, scores: np.ndarray) -> np.ndarray:
+        if self.model is None:
+            return scores
+        return self.model.rider_logit(self.roster, indices)
+
+    def rebuild(self):
+        """全量重建（初始化或堆中失效条目过多时）"""
+        qualified = np.flatnonzero(qualification_mask(self.roster, self.profile))
+        scores = match_scores(self.roster, qualified, self.profile)
+        keys = self._sort_keys(qualified, scores)
+        self._scores[:] = np.nan
+        self._scores[qualified] = scores
+        self._keys[:] = np.nan
+        self._keys[qualified] = keys
+        self._heap = [
+            (-key, index, int(self._versions[index]))
+            for key, index in zip(keys.tolist(), qualified.tolist())
+        ]
+        heapq.heapify(self._heap)
+        self._qualified = len(qualified)
+
+    def refresh(self, indices: Iterable[int]):
+        """骑手数据变化后重算其资格与得分，每个骑手 O(log n)"""
+        indices = np.fromiter(indices, dtype=np.int64)
+        if not len(indices):
+            return
+        qualified = qualification_mask(self.roster, self.profile, indices)
+        scores = match_scores(self.roster, indices, self.profile)
+        keys = self._sort_keys(indices, scores)
+
+        for index, is_qualified, score, key in zip(indices.tolist(), qualified.tolist(), scores.tolist(), keys.tolist()):
+            was_qualified = not np.isnan(self._scores[index])
+            self._versions[index] += 1
+            if is_qualified:
+                self._scores[index] = score
+                self._keys[index] = key
+                heapq.heappush(self._heap, (-key, index, int(self._versions[index])))
+            else:
+                self._scores[index] = np.nan
+                self._keys[index] = np.nan
+            self._qualified += int(is_qualified) - int(was_qualified)
+
+        # 失效条目超过有效条目时压缩
+        if len(self._heap) > 2 * self._qualified + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._valid(entry)]
+        heapq.heapify(self._heap)
+
+    def _valid(self, entry: Tuple[float, int, int]) -> bool:
+        return entry[2] == self._versions[entry[1]]
+
+    def top(self, count: int) -> CandidateSelection:
+        """
+        排名最高的前N名合格骑手（排序键相同按下标，与稳定排序一致）
+
+        沿堆的树结构做最佳优先遍历，不弹出也不修改堆
+        """
+        heap = self._heap
+        indices: List[int] = []
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(indices) < count:
+            entry, position = heapq.heappop(frontier)
+            if self._valid(entry):
+                indices.append(entry[1])
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        indices = np.array(indices, dtype=np.int64)
+        return CandidateSelection(self.roster, indices, self._scores[indices])
+
+    def call_list(self, required: int, confidence: float, limit: int, hour: int = None,
+                  weekday: int = None, guard: ContactGuard = None) -> Tuple[CandidateSelection, float, int]:
+        """
+        按预测到岗概率取最短拨打名单，使凑够 required 人的概率达到 confidence
+
+        Args:
+            limit: 名单长度上限（达不到置信度时返回上限长度的名单）
+            hour / weekday: 拨打时刻，默认当前时间
+            guard: 联系频次索引，跳过达到联系上限的骑手，窗口内联系过的骑手排到后面
+
+        Returns:
+            Tuple[CandidateSelection, float, int]: 名单（带到岗概率）、凑够所需人数的概率、被跳过的骑手数
+        """
+        if self.model is None:
+            raise ValueError("未设置接受率模型的排名不能生成期望出勤名单")
+        pool = self.top(limit if guard is None else limit * 3)
+        indices, skipped = pool.indices, 0
+        if guard is not None and len(indices):
+            blocked, recent = guard.classify([self.roster.rider_id(index) for index in indices])
+            keep = ~np.asarray(blocked)
+            skipped = int((~keep).sum())
+            indices = indices[keep][np.argsort(np.asarray(recent)[keep], kind="stable")]
+        indices = indices[:limit]
+
+        probabilities = self.model.score_roster(self.roster, indices, hour=hour, weekday=weekday)
+        count, reached = smallest_call_list(probabilities, required, confidence)
+        selection = CandidateSelection(
+            self.roster, indices[:count], self._scores[indices[:count]], probabilities=probabilities[:count]
+        )
+        return selection, reached, skipped
+
+class RankingIndex:
+    """按站点维护花名册及其各画像的物化排名（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rosters: Dict[str, RiderRoster] = {}
+        self._rankings: Dict[str, Dict[ProfileKey, CandidateRanking]] = {}
+        self._rider_lookup: Dict[str, Dict[str, int]] = {}
+
+    def load(self, site_id: str, roster: RiderRoster):
+        """载入（替换）站点花名册，已物化的排名随之作废"""
+        with self._lock:
+            self._rosters[site_id] = roster
+            self._rankings[site_id] = {}
+            self._rider_lookup.pop(site_id, None)
+
+    def roster(self, site_id: str) -> Optional[RiderRoster]:
+        with self._lock:
+            return self._rosters.get(site_id)
+
+    def covers(self, site_id: str, roster: RiderRoster) -> bool:
+        """roster 是否为该站点已载入的花名册（或由其 take 得到的子集）"""
+        with self._lock:
+            indexed = self._rosters.get(site_id)
+        return indexed is not None and (roster is indexed or roster.base is indexed)
+
+    def ranking(self, site_id: str, profile: Dict[str, Any]) -> CandidateRanking:
+        """获取画像对应的排名（按当前接受率模型排序），不存在或模型已更换时物化"""
+        key = profile_key(profile)
+        model = get_acceptance_model()
+        with self._lock:
+            rankings = self._rankings[site_id]
+            ranking = rankings.get(key)
+            if ranking is None or ranking.model is not model:
+                ranking = rankings[key] = CandidateRanking(self._rosters[site_id], profile, model)
+            return ranking
+
+    def materialize(self, site_id: str, profiles: Iterable[Dict[str, Any]]):
+        """预先物化多种画像（如各紧急程度 × 节假日）的排名"""
+        for profile in profiles:
+            self.ranking(site_id, profile)
+
+    def select(self, site_id: str, profile: Dict[str, Any], count: int) -> CandidateSelection:
+        """取站点在该画像下的前N名候选"""
+        with self._lock:
+            return self.ranking(site_id, profile).top(count)
+
+    def call_list(self, site_id: str, profile: Dict[str, Any], required: int, confidence: float, limit: int,
+                  hour: int = None, weekday: int = None,
+                  guard: ContactGuard = None) -> Tuple[CandidateSelection, float, int, int]:
+        """
+        在锁内按画像生成最短拨打名单（参数同 CandidateRanking.call_list），与 update_rider 的堆更新互斥
+
+        Returns:
+            Tuple[CandidateSelection, float, int, int]: 名单、凑够所需人数的概率、被跳过的骑手数、合格骑手数
+        """
+        with self._lock:
+            ranking = self.ranking(site_id, profile)
+            selection, reached, skipped = ranking.call_list(
+                required, confidence, limit, hour=hour, weekday=weekday, guard=guard
+            )
+            return selection, reached, skipped, len(ranking)
+
+    def _rider_index(self, site_id: str, rider_id: str) -> Optional[int]:
+        lookup = self._rider_lookup.get(site_id)
+        if lookup is None:
+            # 首次按ID更新时才建立 骑手ID -> 下标 映射
+            roster = self._rosters[site_id]
+            lookup = self._rider_lookup[site_id] = {roster.rider_id(index): index for index in range(len(roster))}
+        return lookup.get(rider_id)
+
+    def rider(self, site_id: str, rider_id: str) -> Optional[RiderRow]:
+        """按骑手ID读取已载入花名册中的骑手（不存在时为None）"""
+        with self._lock:
+            if site_id not in self._rosters:
+                return None
+            index = self._rider_index(site_id, rider_id)
+            return None if index is None else RiderRow(self._rosters[site_id], index)
+
+    def update_rider(self, site_id: str, rider_id: str, **fields: Any):
+        """
+        更新骑手字段并刷新该站点的全部物化排名
+
+        Args:
+            site_id: 站点ID
+            rider_id: 骑手ID
+            **fields: 花名册列，如 status（RiderStatus或其取值）、current_latitude、
+                distance_to_site、acceptance_rate 等
+        """
+        with self._lock:
+            roster = self._rosters[site_id]
+            index = self._rider_index(site_id, rider_id)
+            if index is None:
+                raise KeyError(rider_id)
+            for name, value in fields.items():
+                if name == "status":
+                    value = STATUS_CODES.index(RiderStatus(value).value)
+                if name not in roster.columns:
+                    raise KeyError(name)
+                roster.columns[name][index] = value
+            for ranking in self._rankings[site_id].values():
+                ranking.refresh([index])
+
+    def stats(self) -> Dict[str, Any]:
+        """各站点花名册规模与物化排名"""
+        with self._lock:
+            return {
+                site_id: {
+                    "riders": len(roster),
+                    "rankings": {"/".join(map(str, key)): len(ranking) for key, ranking in self._rankings[site_id].items()}
+                }
+                for site_id, roster in self._rosters.items()
+            }
+
+# 全局排名索引
+candidate_index = RankingIndex()
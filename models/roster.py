@@ -0,0 +1,359 @@
+"""
+骑手花名册的紧凑表示
+按列存储（struct-of-arrays）骑手数据：站点与状态以整数编码、时间为epoch秒，
+工具之间直接传递花名册与下标数组，不再为每个骑手构造字典；
+只有在API边界才转换为 pydantic 的 RiderCandidate / RiderProfile
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+from models.schemas import RiderCandidate, RiderProfile, RiderStatus
+
+STATUS_CODES: List[str] = [status.value for status in RiderStatus]
+_STATUS_INDEX = {code: index for index, code in enumerate(STATUS_CODES)}
+
+# 列名 -> 存储类型
+ROSTER_COLUMNS: Dict[str, Any] = {
+    "local_index": np.int32,          # 站内序号，用于生成骑手ID与姓名
+    "site": np.int32,                 # 站点编码（site_codes下标）
+    "status": np.int8,                # 状态编码（STATUS_CODES下标）
+    "phone": np.int64,
+    "acceptance_rate": np.float32,
+    "avg_response_time": np.int32,
+    "completion_rate": np.float32,
+    "active_days": np.int16,
+    "current_latitude": np.float64,
+    "current_longitude": np.float64,
+    "last_active_time": np.int64,     # epoch秒
+    "avg_orders_per_day": np.int16,
+    "peak_hour_availability": np.bool_,
+    "weekend_availability": np.bool_,
+    "holiday_experience": np.int8,
+    "distance_to_site": np.float32
+}
+
+def _python(value: Any) -> Any:
+    if isinstance(value, np.float32):
+        # float32 转 float 会带出 0.800000011920929 这类尾数
+        return round(float(value), 6)
+    return value.item() if isinstance(value, np.generic) else value
+
+class RiderRow:
+    """花名册中单个骑手的只读视图（不复制数据）"""
+
+    __slots__ = ("_roster", "_index")
+
+    def __init__(self, roster: "RiderRoster", index: int):
+        self._roster = roster
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        return self._roster.value(name, self._index)
+
+    def __getitem__(self, name: str) -> Any:
+        return self._roster.value(name, self._index)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        try:
+            return self._roster.value(name, self._index)
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为与原 RiderDataTool 输出一致的字典"""
+        return self._roster.record(self._index)
+
+    def __repr__(self) -> str:
+        return f"RiderRow({self.rider_id})"
+
+class RiderRoster:
+    """按列存储的骑手花名册"""
+
+    __slots__ = ("columns", "site_codes", "id_template", "name_template", "base", "_site_lookup")
+
+    def __init__(self, columns: Dict[str, np.ndarray], site_codes: Sequence[str],
+                 id_template: str = "rider_{site}_{index:03d}", name_template: str = "骑手{index:03d}"):
+        """
+        Args:
+            columns: ROSTER_COLUMNS 中全部列
+            site_codes: 站点编码表（site列存其下标）
+            id_template: 骑手ID模板，可用 {site} 与 {index}
+            name_template: 姓名模板，可用 {index}
+        """
+        # 由 take 得到的子集记录其源花名册
+        self.base: Optional["RiderRoster"] = None
+        missing = set(ROSTER_COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(f"花名册缺少列: {sorted(missing)}")
+        self.columns = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in ROSTER_COLUMNS.items()}
+        self.site_codes = list(site_codes)
+        self.id_template = id_template
+        self.name_template = name_template
+        self._site_lookup = {code: index for index, code in enumerate(self.site_codes)}
+
+    def __len__(self) -> int:
+        return len(self.columns["local_index"])
+
+    def __iter__(self) -> Iterator[RiderRow]:
+        for index in range(len(self)):
+            yield RiderRow(self, index)
+
+    def __getitem__(self, index: int) -> RiderRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return RiderRow(self, index)
+
+    def __repr__(self) -> str:
+        # 工具结果以 str(dict) 形式进入LLM上下文（dict对值取repr），保持与原字典列表相同的文本
+        return repr(self.to_records())
+
+    @property
+    def nbytes(self) -> int:
+        """列数据占用字节数"""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def site_index(self, site_id: str) -> Optional[int]:
+        """站点ID -> 站点编码"""
+        return self._site_lookup.get(site_id)
+
+    def rider_id(self, index: int) -> str:
+        site = self.site_codes[self.columns["site"][index]]
+        return self.id_template.format(site=site, index=int(self.columns["local_index"][index]))
+
+    def value(self, name: str, index: int) -> Any:
+        """读取单个字段（派生字段按需生成）"""
+        if name == "rider_id":
+            return self.rider_id(index)
+        if name == "name":
+            return self.name_template.format(index=int(self.columns["local_index"][index]))
+        if name == "site_id":
+            return self.site_codes[self.columns["site"][index]]
+        if name == "status":
+            return STATUS_CODES[self.columns["status"][index]]
+        if name == "phone":
+            return str(self.columns["phone"][index])
+        if name == "last_active_time":
+            return datetime.fromtimestamp(int(self.columns["last_active_time"][index])).isoformat()
+        if name not in self.columns:
+            raise KeyError(name)
+        return _python(self.columns[name][index])
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """单个骑手的完整字典表示（仅用于边界输出）"""
+        keys = ["rider_id", "name", "phone", "site_id", "status"] + [
+            name for name in ROSTER_COLUMNS if name not in ("local_index", "site", "status", "phone")
+        ]
+        return {key: self.value(key, index) for key in keys}
+
+    def to_records(self, indices: Sequence[int] = None) -> List[Dict[str, Any]]:
+        """转换为字典列表（LLM/JSON边界使用）"""
+        indices = range(len(self)) if indices is None else indices
+        return [self.record(int(index)) for index in indices]
+
+    def take(self, indices: np.ndarray) -> "RiderRoster":
+        """按下标或布尔掩码取子集（共享站点编码表）"""
+        subset = RiderRoster(
+            {name: column[indices] for name, column in self.columns.items()},
+            self.site_codes,
+            self.id_template,
+            self.name_template
+        )
+        subset.base = self.base or self
+        return subset
+
+    def status_mask(self, status: RiderStatus) -> np.ndarray:
+        return self.columns["status"] == _STATUS_INDEX[status.value]
+
+    def to_profiles(self, indices: Sequence[int] = None) -> List[RiderProfile]:
+        """转换为 RiderProfile（API边界使用）"""
+        indices = range(len(self)) if indices is None else indices
+        profiles = []
+        for index in indices:
+            record = self.record(int(index))
+            profiles.append(RiderProfile(
+                rider_id=record["rider_id"],
+                name=record["name"],
+                phone=record["phone"],
+                site_id=record["site_id"],
+                status=RiderStatus(record["status"]),
+                acceptance_rate=record["acceptance_rate"],
+                avg_response_time=record["avg_response_time"],
+                completion_rate=record["completion_rate"],
+                active_days=record["active_days"],
+                current_latitude=record["current_latitude"],
+                current_longitude=record["current_longitude"],
+                last_active_time=datetime.fromisoformat(record["last_active_time"])
+            ))
+        return profiles
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]]) -> "RiderRoster":
+        """由字典列表（如LLM回传的骑手数据）构建花名册"""
+        site_codes: List[str] = []
+        site_lookup: Dict[str, int] = {}
+        columns: Dict[str, List[Any]] = {name: [] for name in ROSTER_COLUMNS}
+
+        for position, record in enumerate(records):
+            site_id = record.get("site_id", "")
+            if site_id not in site_lookup:
+                site_lookup[site_id] = len(site_codes)
+                site_codes.append(site_id)
+
+            last_active = record.get("last_active_time")
+            if isinstance(last_active, str):
+                last_active = int(datetime.fromisoformat(last_active).timestamp())
+
+            rider_id = str(record.get("rider_id", ""))
+            suffix = rider_id.rsplit("_", 1)[-1]
+            phone = str(record.get("phone", "0"))
+
+            columns["local_index"].append(int(suffix) if suffix.isdigit() else position)
+            columns["site"].append(site_lookup[site_id])
+            columns["status"].append(_STATUS_INDEX.get(record.get("status", "active"), 0))
+            columns["phone"].append(int(phone) if phone.isdigit() else 0)
+            columns["last_active_time"].append(last_active or 0)
+            for name in ("acceptance_rate", "avg_response_time", "completion_rate", "active_days",
+                         "current_latitude", "current_longitude", "avg_orders_per_day",
+                         "peak_hour_availability", "weekend_availability", "holiday_experience",
+                         "distance_to_site"):
+                columns[name].append(record.get(name, 0) or 0)
+
+        return cls({name: np.asarray(values) for name, values in columns.items()}, site_codes)
+
+    @classmethod
+    def concat(cls, rosters: Sequence["RiderRoster"]) -> "RiderRoster":
+        """合并多个花名册（站点编码表合并去重，ID模板需一致）"""
+        rosters = list(rosters)
+        templates = {(roster.id_template, roster.name_template) for roster in rosters}
+        if len(templates) > 1:
+            raise ValueError("花名册的ID模板不一致，无法合并")
+
+        site_lookup: Dict[str, int] = {}
+        remapped_sites = []
+        for roster in rosters:
+            mapping = np.array([site_lookup.setdefault(code, len(site_lookup)) for code in roster.site_codes], dtype=np.int32)
+            remapped_sites.append(mapping[roster.columns["site"]] if len(mapping) else roster.columns["site"])
+        site_codes = sorted(site_lookup, key=site_lookup.get)
+
+        columns = {
+            name: np.concatenate([roster.columns[name] for roster in rosters]) if rosters else np.zeros(0, dtype=dtype)
+            for name, dtype in ROSTER_COLUMNS.items()
+        }
+        if rosters:
+            columns["site"] = np.concatenate(remapped_sites)
+        id_template, name_template = templates.pop() if templates else ("rider_{site}_{index:03d}", "骑手{index:03d}")
+        return cls(columns, site_codes, id_template, name_template)
+
+    @classmethod
+    def from_world(cls, world: Dict[str, Dict[str, np.ndarray]], site: int = None) -> "RiderRoster":
+        """
+        由合成世界（data.synthetic_world）的骑手表构建花名册
+
+        Args:
+            world: load_world / generate_world 的结果
+            site: 只取指定站点序号的骑手，默认全部
+        """
+        from data.synthetic_world import site_code
+
+        riders = world["riders"]
+        mask = slice(None) if site is None else riders["site"] == site
+        rider_index = riders["rider"][mask]
+        columns = {
+            "local_index": rider_index,
+            "site": riders["site"][mask],
+            "status": riders["status"][mask],
+            "phone": 13800000000 + rider_index.astype(np.int64),
+            "acceptance_rate": riders["acceptance_rate"][mask],
+            "avg_response_time": riders["avg_response_time"][mask],
+            "completion_rate": riders["completion_rate"][mask],
+            "active_days": riders["active_days"][mask],
+            "current_latitude": riders["latitude"][mask],
+            "current_longitude": riders["longitude"][mask],
+            "last_active_time": riders["last_active_time"][mask],
+            "avg_orders_per_day": riders["avg_orders_per_day"][mask],
+            "peak_hour_availability": riders["peak_hour_availability"][mask],
+            "weekend_availability": riders["weekend_availability"][mask],
+            "holiday_experience": riders["holiday_experience"][mask],
+            "distance_to_site": riders["distance_to_site"][mask]
+        }
+        site_codes = [site_code(index) for index in range(len(world["sites"]["site"]))]
+        return cls(columns, site_codes, id_template="rider_{index:07d}", name_template="骑手{index:07d}")
+
+class CandidateSelection:
+    """候选筛选结果：花名册 + 入选下标 + 得分，不复制骑手数据"""
+
+    __slots__ = ("roster", "indices", "scores", "distances", "probabilities")
+
+    def __init__(self, roster: RiderRoster, indices: np.ndarray, scores: np.ndarray, distances: np.ndarray = None,
+                 probabilities: np.ndarray = None):
+        """
+        Args:
+            distances: 到目标站点的距离，为空时使用花名册中到所属站点的距离（跨站点分配时传入）
+            probabilities: 接受率模型预测的到岗概率
+        """
+        self.roster = roster
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.distances = None if distances is None else np.asarray(distances, dtype=np.float32)
+        self.probabilities = None if probabilities is None else np.asarray(probabilities, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __repr__(self) -> str:
+        return repr(self.to_records())
+
+    @staticmethod
+    def priority(score: float) -> str:
+        """根据得分确定优先级"""
+        if score >= 80:
+            return "high"
+        elif score >= 60:
+            return "medium"
+        else:
+            return "low"
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """转换为原 CandidateSelectorTool 的候选人字典格式（JSON边界使用）"""
+        columns = self.roster.columns
+        records = []
+        for position, (index, score) in enumerate(zip(self.indices, self.scores)):
+            index = int(index)
+            score = float(score)
+            distance = columns["distance_to_site"][index] if self.distances is None else self.distances[position]
+            records.append({
+                "rider_id": self.roster.rider_id(index),
+                "name": self.roster.value("name", index),
+                "phone": self.roster.value("phone", index),
+                "score": score,
+                "distance": _python(distance),
+                "availability": self.roster.value("status", index) == "active",
+                "priority": self.priority(score),
+                "acceptance_rate": _python(columns["acceptance_rate"][index]),
+                "response_time": int(columns["avg_response_time"][index]),
+                "completion_rate": _python(columns["completion_rate"][index]),
+                "active_days": int(columns["active_days"][index]),
+                "holiday_experience": int(columns["holiday_experience"][index])
+            })
+            if self.probabilities is not None:
+                records[-1]["accept_probability"] = round(float(self.probabilities[position]), 4)
+        return records
+
+    def to_candidates(self) -> List[RiderCandidate]:
+        """转换为 RiderCandidate（API边界使用）"""
+        return [
+            RiderCandidate(
+                rider_id=record["rider_id"],
+                name=record["name"],
+                phone=record["phone"],
+                score=record["score"],
+                distance=record["distance"],
+                availability=record["availability"],
+                priority=record["priority"],
+                accept_probability=record.get("accept_probability")
+            )
+            for record in self.to_records()
+        ]
@@ -49,6 +49,14 @@ class SiteInfo(BaseSchema):
     active_riders: int = Field(default=0, description="活跃骑手数")
     coverage_radius: float = Field(default=5.0, description="覆盖半径(公里)")
 
+class SiteDemand(BaseModel):
+    """站点召回需求（跨站点批量分配使用）"""
+    site_id: str = Field(..., description="站点ID")
+    latitude: float = Field(..., description="纬度")
+    longitude: float = Field(..., description="经度")
+    required_riders: int = Field(..., description="需要补充的骑手数")
+    urgency: str = Field(default="medium", description="紧急程度")
+
 # 骑手相关模型
 class RiderProfile(BaseSchema):
     """骑手画像模型"""
@@ -78,6 +86,7 @@ class RiderCandidate(BaseModel):
     distance: float = Field(..., description="距离站点距离(公里)")
     availability: bool = Field(default=True, description="是否可用")
     priority: str = Field(default="medium", description="优先级")
+    accept_probability: Optional[float] = Field(None, description="预测到岗概率")
 
 # 预测相关模型
 class PredictionRequest(BaseModel):
@@ -146,6 +155,7 @@ class AnalyticsResult(BaseSchema):
     # 关键指标
     total_calls: int = Field(..., description="总拨打次数")
     successful_calls: int = Field(..., description="成功接通次数")
+    agreed_calls: int = Field(default=0, description="同意次数")
     attended_riders: int = Field(..., description="实际出勤人数")
     
     # 计算指标
@@ -156,6 +166,7 @@ class AnalyticsResult(BaseSchema):
     
     # 时间指标
     avg_response_time: float = Field(..., description="平均响应时间")
+    avg_delay_minutes: float = Field(default=0.0, description="平均迟到分钟数")
     total_process_time: float = Field(..., description="总处理时间")
     
     # 建议
@@ -0,0 +1,197 @@
+"""
+通话记录延迟写入
+拨打过程中一通电话会经历多次状态变化（PENDING → CALLING → CONNECTED → COMPLETED，之后还有意愿回写），
+逐次同步写库会让并发拨打在数据库上排队。CallWriteBuffer 在内存中按 call_id 合并更新，
+攒够 CALL_WRITE_FLUSH_SIZE 条或每隔 CALL_WRITE_FLUSH_INTERVAL 秒由后台线程批量 upsert：
+
+- 合并：同一通话只保留最新一行，多次状态变化落库一次
+- 背压：待写通话数（含正在写库的批次）达到 CALL_WRITE_BUFFER_MAX 时，新通话的写入等待刷盘
+  （已有通话的更新不受限），内存中的行数不超过该上限
+- 读取：get / task_calls 优先返回缓冲中的最新状态，再回落到数据库
+- 持久：close 时刷完全部缓冲；写库失败的批次并回缓冲，下次重试
+"""
+
+import asyncio
+import atexit
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config.settings import settings
+from models.database import Repository, get_repository, to_row
+from models.schemas import CallRecord
+from utils.logger import setup_logger
+from utils.metrics import QUEUE_DEPTH
+
+logger = setup_logger(__name__)
+
+class CallWriteBuffer:
+    """按 call_id 合并的通话记录延迟写入缓冲"""
+
+    def __init__(self, repository: Repository = None, flush_size: int = None, flush_interval: float = None,
+                 max_pending: int = None):
+        """
+        Args:
+            repository: 仓储，默认使用进程内共享仓储
+            flush_size: 待写通话数达到该值时立即刷盘
+            flush_interval: 最长刷盘间隔（秒）
+            max_pending: 待写通话数上限（背压，含正在写库的批次）
+        """
+        self.repository = repository or get_repository()
+        self.flush_size = flush_size or settings.CALL_WRITE_FLUSH_SIZE
+        self.flush_interval = flush_interval or settings.CALL_WRITE_FLUSH_INTERVAL
+        self.max_pending = max(max_pending or settings.CALL_WRITE_BUFFER_MAX, self.flush_size)
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flushing: Dict[str, Dict[str, Any]] = {}  # 正在写库的批次，写完前读取仍以它为准
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # 保证批次按顺序落库，新批次不会被旧批次覆盖
+        self._closed = False
+        self.stats = {"updates": 0, "coalesced": 0, "flushes": 0, "rows": 0, "waits": 0, "errors": 0}
+
+        self._thread = threading.Thread(target=self._run, name="call-write-behind", daemon=True)
+        self._thread.start()
+
+    def _gauge(self):
+        QUEUE_DEPTH.set(len(self._pending), queue="call_writes")
+
+    def _buffered(self) -> int:
+        # 调用方持有 _cond
+        return len(self._pending) + len(self._flushing)
+
+    def put(self, record: CallRecord, block: bool = True, timeout: float = None) -> bool:
+        """
+        写入通话记录的最新状态
+
+        Args:
+            block: 缓冲已满时是否等待
+            timeout: 最长等待秒数
+
+        Returns:
+            bool: 是否已写入缓冲（不等待或等待超时时为False）
+        """
+        row = to_row(record)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("通话写入缓冲已关闭")
+            if record.call_id in self._pending:
+                self.stats["coalesced"] += 1
+            else:
+                if self._buffered() >= self.max_pending:
+                    if not block:
+                        return False
+                    self.stats["waits"] += 1
+                    self._cond.notify_all()
+                    if not self._cond.wait_for(lambda: self._buffered() < self.max_pending or self._closed, timeout):
+                        return False
+                    if self._closed:
+                        raise RuntimeError("通话写入缓冲已关闭")
+                if len(self._pending) + 1 >= self.flush_size:
+                    self._cond.notify_all()
+            self._pending[record.call_id] = row
+            self.stats["updates"] += 1
+            self._gauge()
+        return True
+
+    async def put_async(self, record: CallRecord) -> bool:
+        """异步写入：缓冲已满时在线程中等待，不阻塞事件循环"""
+        if self.put(record, block=False):
+            return True
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, record)
+
+    def update(self, call_id: str, **fields) -> bool:
+        """
+        更新已有通话的部分字段（如状态、意愿等级）
+
+        Returns:
+            bool: 通话不存在时为False
+        """
+        current = self.get(call_id)
+        if current is None:
+            return False
+        return self.put(current.model_copy(update=fields))
+
+    def get(self, call_id: str) -> Optional[CallRecord]:
+        """读取通话最新状态（缓冲优先）"""
+        with self._cond:
+            row = self._pending.get(call_id) or self._flushing.get(call_id)
+        if row is not None:
+            return CallRecord(**row)
+        return self.repository.get(CallRecord, call_id)
+
+    def task_calls(self, task_id: str) -> List[CallRecord]:
+        """任务的全部通话（数据库结果叠加缓冲中的最新状态）"""
+        calls = {record.call_id: record for record in self.repository.query(CallRecord, task_id=task_id)}
+        with self._cond:
+            buffered = [row for rows in (self._flushing, self._pending) for row in rows.values() if row["task_id"] == task_id]
+        for row in buffered:
+            calls[row["call_id"]] = CallRecord(**row)
+        return list(calls.values())
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._buffered()
+
+    def flush(self) -> int:
+        """立即把当前缓冲写库，返回写入行数"""
+        with self._write_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+                self._gauge()
+            if not batch:
+                return 0
+            try:
+                self.repository.insert_rows("calls", list(batch.values()))
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"通话记录批量写入失败（{len(batch)}条，稍后重试）: {e}")
+                with self._cond:
+                    # 缓冲中更新的状态优先于失败批次
+                    batch.update(self._pending)
+                    self._pending = batch
+                    self._flushing = {}
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._flushing = {}
+                self._cond.notify_all()  # 批次落库后才腾出空间，唤醒等待的写入
+                self.stats["flushes"] += 1
+                self.stats["rows"] += len(batch)
+            return len(batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.flush_size or self._closed, self.flush_interval)
+                if self._closed:
+                    return
+                if not self._pending:
+                    continue
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(min(self.flush_interval, 1.0))
+
+    def close(self):
+        """停止后台线程并刷完缓冲"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+
+_writer: Optional[CallWriteBuffer] = None
+_writer_lock = threading.Lock()
+
+def get_call_writer() -> Optional[CallWriteBuffer]:
+    """进程内共享的通话写入缓冲（DB_PERSIST_ENABLED 关闭时为None），进程退出时自动刷盘"""
+    global _writer
+    if not settings.DB_PERSIST_ENABLED:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = CallWriteBuffer()
+            atexit.register(_writer.close)
+        return _writer
@@ -0,0 +1,11 @@
+"""
+测试公共配置
+从仓库根目录运行 `python -m pytest tests/`；各用例的SQLite文件放在pytest临时目录中
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
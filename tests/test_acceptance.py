@@ -0,0 +1,65 @@
+"""接受率模型：由召回记录训练、替换当前模型、最短拨打名单"""
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from models import acceptance
+from models.acceptance import AcceptanceModel, get_acceptance_model, set_acceptance_model, smallest_call_list, training_data_from_records
+from models.schemas import AttendanceRecord, CallRecord, CallStatus
+
+@pytest.fixture(autouse=True)
+def restore_model():
+    previous = acceptance._model
+    yield
+    acceptance._model = previous
+
+def _history(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 2, 14, 9, 0)
+    calls, attendance, features = [], [], {}
+    for i in range(n):
+        rider_id = f"rider_{i:04d}"
+        rate = float(rng.uniform(0.3, 1.0))
+        features[rider_id] = {"acceptance_rate": rate, "distance_to_site": float(rng.uniform(0, 8)), "holiday_experience": int(rng.integers(0, 5))}
+        calls.append(CallRecord(call_id=f"task_{rider_id}", task_id="task", rider_id=rider_id, phone="13800000000",
+                                status=CallStatus.COMPLETED, start_time=start + timedelta(minutes=i)))
+        attended = bool(rng.random() < rate * 0.6)
+        attendance.append(AttendanceRecord(record_id=f"task_{rider_id}", rider_id=rider_id, task_id="task", target_date="2024-02-14",
+                                           expected_time=start, actual_time=start if attended else None, is_attended=attended))
+    return calls, attendance, features
+
+def test_training_data_joins_calls_and_attendance():
+    calls, attendance, features = _history(50)
+    del features["rider_0000"]
+    X, y = training_data_from_records(calls, attendance, features)
+    # 没有骑手特征的通话不参与训练
+    assert len(X) == len(y) == 49
+    assert y.sum() == sum(record.is_attended for record in attendance[1:])
+
+def test_replaced_model_is_returned():
+    model = AcceptanceModel().fit(*training_data_from_records(*_history(400)))
+    set_acceptance_model(model)
+    assert get_acceptance_model() is model
+    assert model.trained_on == 400
+
+def test_smallest_call_list_reaches_confidence():
+    count, reached = smallest_call_list(np.full(20, 0.5), required=3, confidence=0.9)
+    assert reached >= 0.9
+    assert smallest_call_list(np.full(20, 0.5), required=3, confidence=0.9 + 1e-9)[0] >= count
+    # 全部拨打仍达不到时返回全部长度
+    assert smallest_call_list(np.full(4, 0.1), required=3, confidence=0.9)[0] == 4
+    assert smallest_call_list(np.array([]), required=0, confidence=0.9) == (0, 1.0)
+
+def test_workflow_retrain_replaces_current_model():
+    pytest.importorskip("crewai")
+    from main import LogisticsWorkflow
+
+    workflow = LogisticsWorkflow()
+    calls, attendance, features = _history(400)
+    workflow.call_history.extend(calls)
+    workflow.attendance_history.extend(attendance)
+    workflow._rider_features.update(features)
+
+    assert workflow.retrain_acceptance_model(min_samples=500, save=False) is None
+    model = workflow.retrain_acceptance_model(min_samples=100, save=False)
+    assert get_acceptance_model() is model
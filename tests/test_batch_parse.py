@@ -0,0 +1,71 @@
+"""批量预测/决策输出解析：非JSON、非对象与字段不合法时逐站点回退到规则结果"""
+
+import pytest
+from agents.batching import batch_records, token_batches
+
+@pytest.mark.parametrize("output", ["各站点预测已完成。", "[1, 2]", "null", '{"results": [', {"results": "none"}, {"items": []}])
+def test_batch_records_ignores_malformed_output(output):
+    assert batch_records(output) == {}
+
+def test_batch_records_keeps_rows_with_integer_index():
+    output = '{"results": [{"index": 0, "a": 1}, {"index": "1"}, {"index": [2]}, {"index": true}, "text", {"index": 3}]}'
+    assert set(batch_records(output)) == {0, 3}
+    assert batch_records(output)[0]["a"] == 1
+
+def test_batch_records_accepts_parsed_output():
+    assert batch_records({"results": [{"index": 2, "accepted": True}]}) == {2: {"index": 2, "accepted": True}}
+
+def test_token_batches_respects_budget_and_order():
+    batches = token_batches(list(range(7)), lambda item: 10, budget=35, overhead=5, max_items=10)
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    # 单个条目超出预算时独占一批
+    assert token_batches([1, 100, 1], lambda item: item, budget=50, max_items=10) == [[1], [100], [1]]
+    assert token_batches(list(range(5)), lambda item: 1, budget=100, max_items=2) == [[0, 1], [2, 3], [4]]
+
+@pytest.fixture
+def scripted_backend():
+    pytest.importorskip("crewai")
+    from agents import crew_runner
+    from agents.llm_backend import LocalLLM
+
+    previous = crew_runner.get_kickoff_backend()
+
+    def install(script):
+        crew_runner.set_kickoff_backend(LocalLLM(script=script))
+
+    yield install
+    crew_runner.set_kickoff_backend(previous)
+
+def test_prediction_batch_falls_back_per_site(scripted_backend):
+    from agents.prediction_agent import PredictionService
+    from models.schemas import PredictionRequest
+
+    requests = [PredictionRequest(site_id=f"site_00{i}", target_date="2024-02-14") for i in (1, 2, 3)]
+    scripted_backend({"prediction_batch": [{"results": [
+        {"index": 0, "site_id": "other", "required_riders": "many"},
+        {"index": 1, "site_id": "other", "has_gap": True, "gap_ratio": 0.3, "predicted_orders": 900,
+         "current_capacity": 10, "required_riders": 4, "confidence": 0.9, "suggestion": "召回"}
+    ]}]})
+
+    results = PredictionService().predict_batch(requests)
+
+    # 站点以请求为准；第1个站点字段不合法、第3个站点缺失，均按规则计算
+    assert [result.site_id for result in results] == ["site_001", "site_002", "site_003"]
+    assert results[1].required_riders == 4
+    assert results[0].confidence == 0.85
+    assert results[2].confidence == 0.85
+
+def test_decision_batch_falls_back_on_non_object_output(scripted_backend):
+    from agents.decision_agent import DecisionService, decide_by_rules
+    from agents.prediction_agent import PredictionService
+    from models.schemas import DecisionRequest, PredictionRequest
+
+    prediction = PredictionService().predict_batch([PredictionRequest(site_id="site_001", target_date="2024-02-14")])[0]
+    request = DecisionRequest(site_id="site_001", prediction_result=prediction, manager_feedback=True)
+    scripted_backend({"decision_batch": ["[true]"]})
+
+    result = DecisionService().decide_batch([request])[0]
+
+    expected = decide_by_rules(request)
+    assert result.accepted == expected["accepted"]
+    assert result.next_step == expected["next_step"]
@@ -0,0 +1,60 @@
+"""检查点：按输入哈希复用阶段输出，以及可继续的工作流"""
+
+import time
+from utils.checkpoint import CheckpointStore, input_hash, WORKFLOW_COMPLETED, WORKFLOW_FAILED
+
+def test_stage_output_is_reused_while_inputs_match(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    inputs = {"site_id": "site_001", "target_date": "2024-02-14"}
+    digest = input_hash("prediction", inputs)
+    store.start("wf-1", inputs)
+    store.save("wf-1", "prediction", digest, {"required_riders": 5})
+
+    # 键顺序不影响哈希
+    same = input_hash("prediction", {"target_date": "2024-02-14", "site_id": "site_001"})
+    assert same == digest
+    assert store.load("wf-1", "prediction", same) == {"required_riders": 5}
+    assert store.stages("wf-1") == ["prediction"]
+
+def test_changed_inputs_invalidate_checkpoint(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.start("wf-1", {})
+    store.save("wf-1", "decision", input_hash("decision", {"manager_feedback": True}), {"accepted": True})
+
+    assert store.load("wf-1", "decision", input_hash("decision", {"manager_feedback": False})) is None
+    # 同名阶段的不同工作流互不影响
+    assert store.load("wf-2", "decision", input_hash("decision", {"manager_feedback": True})) is None
+
+def test_resume_params_survive_reopen(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    params = {"site_id": "site_001", "target_date": "2024-02-14", "manager_feedback": None}
+    CheckpointStore(path).start("wf-1", params)
+
+    assert CheckpointStore(path).params("wf-1") == params
+    assert CheckpointStore(path).params("missing") is None
+
+def test_unfinished_skips_running_workflows_with_recent_heartbeat(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    for workflow_id in ("running", "failed", "completed"):
+        store.start(workflow_id, {})
+    store.finish("failed", WORKFLOW_FAILED, "boom")
+    store.finish("completed", WORKFLOW_COMPLETED)
+
+    assert store.unfinished(stale_after=60) == ["failed"]
+    time.sleep(0.05)
+    # 心跳超时的 running 视为中断
+    assert sorted(store.unfinished(stale_after=0.01)) == ["failed", "running"]
+
+def test_purge_keeps_unfinished(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.start("done", {})
+    store.save("done", "prediction", "digest", {})
+    store.finish("done", WORKFLOW_COMPLETED)
+    store.start("failed", {})
+    store.finish("failed", WORKFLOW_FAILED)
+
+    time.sleep(0.02)
+    assert store.purge(older_than=0.01) == 1
+    assert store.params("done") is None
+    assert store.stages("done") == []
+    assert store.params("failed") == {}
@@ -0,0 +1,34 @@
+"""联系频次索引：拨打前检查并记录，并发工作流不会在同一天重复拨打同一骑手"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from utils.contact_guard import ContactGuard
+
+def test_try_record_enforces_daily_limit():
+    guard = ContactGuard(":memory:", window_days=7, daily_limit=1, window_limit=3)
+    assert guard.try_record("rider-1")
+    assert not guard.try_record("rider-1")
+    assert guard.contacted_on("rider-1") == 1
+    assert guard.classify(["rider-1", "rider-2"]) == ([True, False], [True, False])
+
+def test_try_record_enforces_window_limit():
+    guard = ContactGuard(":memory:", window_days=7, daily_limit=1, window_limit=2)
+    now = datetime.now()
+    guard.record_many(["rider-1"], now - timedelta(days=2))
+    guard.record_many(["rider-1"], now - timedelta(days=1))
+    assert not guard.try_record("rider-1", now)
+    assert guard.window_count("rider-1") == 2
+
+def test_concurrent_dials_record_rider_once():
+    guard = ContactGuard(":memory:", window_days=7, daily_limit=1, window_limit=3)
+    with ThreadPoolExecutor(8) as pool:
+        allowed = list(pool.map(lambda _: guard.try_record("rider-1"), range(16)))
+    assert allowed.count(True) == 1
+    assert guard.stats()["today"] == 1
+
+def test_contacts_survive_reopen(tmp_path):
+    path = str(tmp_path / "contacts.db")
+    guard = ContactGuard(path, window_days=7, daily_limit=1, window_limit=3)
+    assert guard.try_record("rider-1")
+    guard.close()
+    assert not ContactGuard(path, window_days=7, daily_limit=1, window_limit=3).try_record("rider-1")
@@ -0,0 +1,104 @@
+"""任务队列：租约过期重新领取、失败重试与最大次数"""
+
+import asyncio
+import time
+from utils.job_queue import JobQueue, WorkerPool, STATUS_DONE, STATUS_FAILED, STATUS_QUEUED
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.try_enqueue("prediction", {"site_id": "site_001"}, job_id="job-1")
+
+    first = queue.lease("prediction", "worker-a", visibility_timeout=0.05)
+    assert first.attempts == 1
+    # 租约未过期时不能被其他 worker 领取
+    assert queue.lease("prediction", "worker-b") is None
+
+    time.sleep(0.1)
+    second = queue.lease("prediction", "worker-b")
+    assert second.job_id == "job-1"
+    assert second.attempts == 2
+
+    # 原 worker 已失去租约，结果被丢弃；以接手者的结果为准
+    assert not queue.complete(first, "worker-a", {"owner": "a"})
+    assert queue.complete(second, "worker-b", {"owner": "b"})
+    job = queue.get("job-1")
+    assert job.status == STATUS_DONE
+    assert job.result == {"owner": "b"}
+
+def test_expired_lease_at_max_attempts_fails(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.try_enqueue("prediction", {}, job_id="job-1", max_attempts=1)
+    queue.lease("prediction", "worker-a", visibility_timeout=0.05)
+
+    time.sleep(0.1)
+    assert queue.lease("prediction", "worker-b") is None
+    assert queue.get("job-1").status == STATUS_FAILED
+
+def test_fail_requeues_until_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.try_enqueue("decision", {}, job_id="job-1", max_attempts=2)
+
+    job = queue.lease("decision", "worker-a")
+    assert queue.fail(job, "worker-a", "boom", retry_delay=0.0)
+    assert queue.get("job-1").status == STATUS_QUEUED
+
+    job = queue.lease("decision", "worker-a")
+    assert job.attempts == 2
+    assert not queue.fail(job, "worker-a", "boom", retry_delay=0.0)
+    failed = queue.get("job-1")
+    assert failed.status == STATUS_FAILED
+    assert failed.error == "boom"
+
+def test_duplicate_job_id_is_not_enqueued_twice(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    assert queue.try_enqueue("prediction", {"n": 1}, job_id="job-1") == "job-1"
+    assert queue.try_enqueue("prediction", {"n": 2}, job_id="job-1") == "job-1"
+    assert queue.depth("prediction") == 1
+
+def test_worker_pool_retries_then_completes(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.try_enqueue("prediction", {"site_id": "site_001"}, job_id="job-1", max_attempts=3)
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload["site_id"])
+        if len(calls) < 2:
+            raise RuntimeError("transient")
+        return {"ok": True}
+
+    pool = WorkerPool(queue, {"prediction": handler}, retry_base=0.01)
+    asyncio.run(pool.run(drain=True))
+
+    assert len(calls) == 2
+    assert pool.stats["retried"] == 1
+    assert pool.stats["completed"] == 1
+    job = queue.get("job-1")
+    assert job.status == STATUS_DONE
+    assert job.attempts == 2
+
+def test_expired_jobs_are_reported(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.try_enqueue("dial", {}, job_id="job-1", max_attempts=1)
+    queue.lease("dial", "worker-a", visibility_timeout=0.05)
+
+    time.sleep(0.1)
+    expired = []
+    assert queue.lease("dial", "worker-b", on_expired=expired.append) is None
+    assert [job.job_id for job in expired] == ["job-1"]
+    assert queue.get("job-1").status == STATUS_FAILED
+
+def test_worker_pool_reports_final_failure_once(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.try_enqueue("dial", {}, job_id="job-1", max_attempts=1)
+    failed = []
+
+    async def handler(payload):
+        raise RuntimeError("boom")
+
+    pool = WorkerPool(queue, {"dial": handler}, retry_base=0.01, on_failure=failed.append)
+    asyncio.run(pool.run(drain=True))
+
+    # max_attempts=1 的任务不重试
+    assert [job.job_id for job in failed] == ["job-1"]
+    assert pool.stats == {"completed": 0, "retried": 0, "failed": 1, "lost": 0}
+    assert queue.get("job-1").status == STATUS_FAILED
@@ -0,0 +1,31 @@
+"""日志：模块路由sink移除时关闭按天打开的文件，采样日志先检查级别"""
+
+from loguru import logger
+from utils import logger as logging_utils
+from utils.logger import _ChannelRouter, setup_logger
+
+def test_router_closes_files_when_sink_is_removed(tmp_path):
+    router = _ChannelRouter(tmp_path)
+    sink_id = logger.add(router, level="INFO", enqueue=False)
+    setup_logger("tests.router").info("hello")
+
+    handles = list(router._files.values())
+    assert [handle.closed for handle in handles] == [False]
+    assert "hello" in next(tmp_path.glob("tests.router_*.log")).read_text(encoding="utf-8")
+
+    logger.remove(sink_id)
+    assert handles[0].closed
+    assert router._files == {}
+
+def test_router_ignores_unregistered_channels(tmp_path):
+    router = _ChannelRouter(tmp_path)
+    sink_id = logger.add(router, level="INFO", enqueue=False)
+    logger.bind(channel="tests.unregistered").info("dropped")
+    logger.remove(sink_id)
+    assert list(tmp_path.iterdir()) == []
+
+def test_sampled_log_below_level_does_not_spend_tokens(monkeypatch):
+    monkeypatch.setattr(logging_utils, "_min_level_no", logger.level("INFO").no)
+    logging_utils.reset_logging_stats("tests.debug")
+    logging_utils.log_sampled("tests.debug", "quiet", level="DEBUG")
+    assert "tests.debug" not in logging_utils.get_logging_stats()["categories"]
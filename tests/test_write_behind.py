@@ -0,0 +1,95 @@
+"""通话记录延迟写入：按 call_id 合并、写库失败重新排队、背压上限"""
+
+import threading
+from datetime import datetime
+import pytest
+from models.database import Repository, create_db_engine
+from models.schemas import CallRecord, CallStatus, IntentLevel
+from models.write_behind import CallWriteBuffer
+
+def _call(call_id: str, status: CallStatus = CallStatus.PENDING, task_id: str = "task-1") -> CallRecord:
+    return CallRecord(call_id=call_id, task_id=task_id, rider_id=f"rider-{call_id}", phone="13800000000",
+                      status=status, start_time=datetime(2024, 2, 14, 9, 0))
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = Repository(create_db_engine(f"sqlite:///{tmp_path / 'calls.db'}"))
+    yield repository
+    repository.dispose()
+
+@pytest.fixture
+def buffer(repository):
+    # 刷盘阈值与间隔足够大，只在用例显式 flush 时写库
+    buffer = CallWriteBuffer(repository, flush_size=1000, flush_interval=60, max_pending=1000)
+    yield buffer
+    buffer.close()
+
+def test_updates_to_same_call_are_coalesced(buffer, repository):
+    for status in (CallStatus.PENDING, CallStatus.CALLING, CallStatus.CONNECTED, CallStatus.COMPLETED):
+        buffer.put(_call("c1", status))
+    buffer.put(_call("c2"))
+
+    assert buffer.stats["coalesced"] == 3
+    assert buffer.pending() == 2
+    # 刷盘前读取以缓冲为准
+    assert buffer.get("c1").status == CallStatus.COMPLETED
+
+    assert buffer.flush() == 2
+    assert repository.count("calls") == 2
+    assert repository.get(CallRecord, "c1").status == CallStatus.COMPLETED
+
+def test_task_calls_overlay_buffer_on_database(buffer):
+    buffer.put(_call("c1"))
+    buffer.flush()
+    assert buffer.update("c1", intent_level=IntentLevel.STRONG, confidence=0.9)
+    buffer.put(_call("c2"))
+
+    calls = {call.call_id: call for call in buffer.task_calls("task-1")}
+    assert set(calls) == {"c1", "c2"}
+    assert calls["c1"].intent_level == IntentLevel.STRONG
+    assert not buffer.update("missing", status=CallStatus.FAILED)
+
+def test_failed_flush_requeues_without_overwriting_newer_state(buffer, repository, monkeypatch):
+    buffer.put(_call("c1", CallStatus.CALLING))
+    buffer.put(_call("c2", CallStatus.CALLING))
+    insert_rows = repository.insert_rows
+
+    def failing(*args, **kwargs):
+        # 写库期间 c1 有了新状态
+        buffer.put(_call("c1", CallStatus.COMPLETED))
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(repository, "insert_rows", failing)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert buffer.stats["errors"] == 1
+    assert buffer.pending() == 2
+    assert buffer.get("c1").status == CallStatus.COMPLETED
+
+    monkeypatch.setattr(repository, "insert_rows", insert_rows)
+    assert buffer.flush() == 2
+    assert repository.get(CallRecord, "c1").status == CallStatus.COMPLETED
+    assert repository.get(CallRecord, "c2").status == CallStatus.CALLING
+
+def test_backpressure_counts_batch_being_written(repository, monkeypatch):
+    buffer = CallWriteBuffer(repository, flush_size=2, flush_interval=60, max_pending=2)
+    writing = threading.Event()
+    release = threading.Event()
+    insert_rows = repository.insert_rows
+
+    def slow(*args, **kwargs):
+        writing.set()
+        release.wait(5)
+        return insert_rows(*args, **kwargs)
+
+    monkeypatch.setattr(repository, "insert_rows", slow)
+    buffer.put(_call("c1"))
+    buffer.put(_call("c2"))
+    assert writing.wait(5)
+
+    # 正在写库的两条仍计入上限，新通话不能立即写入
+    assert not buffer.put(_call("c3"), block=False)
+    release.set()
+    assert buffer.put(_call("c3"), timeout=5)
+    buffer.close()
+    assert repository.count("calls") == 3
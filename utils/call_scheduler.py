@@ -0,0 +1,241 @@
+"""
+分级拨打调度
+按 BUSINESS_RULES["call_strategy"] 的 priority_levels 分级排队、按 call_intervals 安排重拨：
+
+- 每个站点先拨最高优先级；该级首拨全部发出后自动提升下一级（补位已满则不再提升）
+- 未接通的拨打按 call_intervals 依次延后重拨（[0, 30, 120] 分钟即首拨立即、之后隔30/120分钟）
+- 设置补位人数时，站点进行中的拨打数不超过剩余缺口，凑够即停止，不超额召回
+- 全部待拨任务放在一个按到期时间排序的堆中，入队/出队 O(log n)；
+  单个 asyncio 调度循环驱动，不为待拨任务创建线程，并发拨打数由信号量限制
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from config.settings import settings, BUSINESS_RULES
+from utils.logger import setup_logger
+from utils.metrics import QUEUE_DEPTH
+
+logger = setup_logger(__name__)
+
+# 拨打结果
+OUTCOME_AGREED = "agreed"        # 同意，计入补位
+OUTCOME_REJECTED = "rejected"    # 拒绝，不再重拨
+OUTCOME_NO_ANSWER = "no_answer"  # 未接通，按间隔重拨
+OUTCOME_LIMITED = "limited"      # 拨打额度用完，停止该站点后续拨打
+OUTCOME_SKIPPED = "skipped"      # 未拨打（骑手已达联系上限），不再重拨
+
+@dataclass
+class CallJob:
+    """一次待拨任务"""
+    site_id: str
+    rider_id: str
+    tier: str
+    attempt: int = 0
+    payload: Any = None
+    due: float = 0.0
+    history: List[str] = field(default_factory=list)
+
+class _SiteState:
+    """站点的分级队列与补位进度"""
+
+    __slots__ = ("target", "filled", "held", "parked", "inflight", "active_tier", "pending_first", "stopped")
+
+    def __init__(self, levels: List[str], target: Optional[int]):
+        self.target = target
+        self.filled = 0
+        self.held: Dict[str, Deque[CallJob]] = {level: deque() for level in levels}
+        self.parked: Deque[CallJob] = deque()  # 已到期但进行中的拨打已足够补齐缺口，等待结果
+        self.inflight = 0
+        self.active_tier = 0
+        self.pending_first = 0  # 当前级别尚未发出的首拨数
+        self.stopped = False
+
+class CallScheduler:
+    """基于延迟堆的分级拨打调度器"""
+
+    def __init__(self, dialer: Callable[[CallJob], Awaitable[str]], intervals: List[float] = None,
+                 priority_levels: List[str] = None, interval_unit: float = None, concurrency: int = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            dialer: 执行一次拨打的协程函数，返回 OUTCOME_* 之一
+            intervals: 各次拨打相对上一次的间隔（默认 call_intervals）
+            priority_levels: 优先级从高到低（默认 priority_levels）
+            interval_unit: 间隔单位对应的秒数（默认 CALL_RETRY_UNIT_SECONDS，即分钟）
+            concurrency: 同时进行的拨打数上限
+            clock: 时钟函数
+        """
+        strategy = BUSINESS_RULES["call_strategy"]
+        self.dialer = dialer
+        self.intervals = list(intervals if intervals is not None else strategy["call_intervals"])
+        self.levels = list(priority_levels or strategy["priority_levels"])
+        self.interval_unit = settings.CALL_RETRY_UNIT_SECONDS if interval_unit is None else interval_unit
+        self.concurrency = concurrency or settings.CALL_CONCURRENCY
+        self.clock = clock
+
+        self._heap: List[Tuple[float, int, int, CallJob]] = []
+        self._seq = itertools.count()
+        self._sites: Dict[str, _SiteState] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._unsettled = set()
+        self._inflight = 0
+        self.stats = {"dispatched": 0, "retries": 0, "promotions": 0, "dropped": 0}
+
+    def _rank(self, tier: str) -> int:
+        return self.levels.index(tier) if tier in self.levels else len(self.levels) - 1
+
+    def _push(self, job: CallJob):
+        heapq.heappush(self._heap, (job.due, self._rank(job.tier), next(self._seq), job))
+        QUEUE_DEPTH.set(len(self._heap), queue="calls")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def set_target(self, site_id: str, target: Optional[int]):
+        """设置站点需补位人数，达到后停止该站点的后续拨打（None表示拨完为止）"""
+        self._site(site_id).target = target
+
+    def _site(self, site_id: str) -> _SiteState:
+        state = self._sites.get(site_id)
+        if state is None:
+            state = self._sites[site_id] = _SiteState(self.levels, None)
+        return state
+
+    def submit(self, site_id: str, rider_id: str, tier: str = "medium", payload: Any = None):
+        """提交一个骑手的拨打任务（按站点当前激活级别决定立即入堆或暂存）"""
+        state = self._site(site_id)
+        tier = tier if tier in self.levels else self.levels[-1]
+        job = CallJob(site_id, rider_id, tier, payload=payload, due=self.clock())
+        if self._rank(tier) <= state.active_tier:
+            if self._rank(tier) == state.active_tier:
+                state.pending_first += 1
+            self._push(job)
+        else:
+            state.held[tier].append(job)
+            # 提交可能分多次进行，待调度循环统一检查是否提升，避免高级别尚未提交时就提前提升
+            self._unsettled.add(site_id)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _promote(self, site_id: str, state: _SiteState):
+        """当前级别首拨已全部发出时激活下一个有任务的级别"""
+        while state.pending_first == 0 and not state.stopped and state.active_tier < len(self.levels) - 1:
+            state.active_tier += 1
+            held = state.held[self.levels[state.active_tier]]
+            if held:
+                self.stats["promotions"] += 1
+                logger.debug(f"站点 {site_id} 提升至 {self.levels[state.active_tier]} 级，{len(held)} 个任务")
+            now = self.clock()
+            while held:
+                job = held.popleft()
+                job.due = now
+                state.pending_first += 1
+                self._push(job)
+
+    def stop_site(self, site_id: str):
+        """停止站点后续拨打（已在堆中的任务出队时丢弃）"""
+        state = self._site(site_id)
+        state.stopped = True
+        for held in list(state.held.values()) + [state.parked]:
+            self.stats["dropped"] += len(held)
+            held.clear()
+
+    def pending(self) -> int:
+        """待拨任务数（堆中 + 暂存）"""
+        return len(self._heap) + sum(
+            len(state.parked) + sum(len(held) for held in state.held.values()) for state in self._sites.values()
+        )
+
+    async def _dispatch(self, job: CallJob, semaphore: asyncio.Semaphore):
+        try:
+            outcome = await self.dialer(job)
+        except Exception as e:
+            logger.error(f"拨打 {job.rider_id} 失败: {e}")
+            outcome = OUTCOME_NO_ANSWER
+        finally:
+            semaphore.release()
+            self._inflight -= 1
+
+        job.history.append(outcome)
+        state = self._site(job.site_id)
+        state.inflight -= 1
+        if outcome == OUTCOME_AGREED:
+            state.filled += 1
+            if state.target is not None and state.filled >= state.target:
+                self.stop_site(job.site_id)
+        elif outcome == OUTCOME_LIMITED:
+            self.stop_site(job.site_id)
+        elif outcome == OUTCOME_NO_ANSWER and job.attempt + 1 < len(self.intervals) and not state.stopped:
+            job.attempt += 1
+            job.due = self.clock() + self.intervals[job.attempt] * self.interval_unit
+            self.stats["retries"] += 1
+            self._push(job)
+        if state.parked and not state.stopped:
+            self._push(state.parked.popleft())
+        self._wakeup.set()
+
+    async def run(self):
+        """调度直至没有待拨、暂存与进行中的任务"""
+        self._wakeup = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        while self._heap or self._inflight or self._unsettled:
+            while self._unsettled:
+                site_id = self._unsettled.pop()
+                self._promote(site_id, self._site(site_id))
+            if not self._heap:
+                if not self._inflight:
+                    continue
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            due = self._heap[0][0]
+            delay = due - self.clock()
+            if delay > 0:
+                # 等到最早任务到期，或有新任务/拨打结束时提前醒来
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, _, job = heapq.heappop(self._heap)
+            QUEUE_DEPTH.set(len(self._heap), queue="calls")
+            state = self._site(job.site_id)
+            if state.stopped:
+                self.stats["dropped"] += 1
+                continue
+            if state.target is not None and state.inflight >= state.target - state.filled:
+                # 进行中的拨打全部同意即可补齐，暂缓拨打以免超额召回
+                state.parked.append(job)
+                continue
+
+            await semaphore.acquire()
+            if job.attempt == 0 and self._rank(job.tier) == state.active_tier:
+                state.pending_first -= 1
+                self._promote(job.site_id, state)
+            self._inflight += 1
+            state.inflight += 1
+            self.stats["dispatched"] += 1
+            task = asyncio.create_task(self._dispatch(job, semaphore))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        self._wakeup = None
+
+    def site_progress(self, site_id: str) -> Dict[str, Any]:
+        """站点补位进度"""
+        state = self._site(site_id)
+        return {
+            "target": state.target,
+            "filled": state.filled,
+            "active_tier": self.levels[state.active_tier],
+            "stopped": state.stopped
+        }
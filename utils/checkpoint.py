@@ -0,0 +1,158 @@
+"""
+工作流阶段检查点
+每个阶段的输出（预测结果、决策结果、候选名单、拨打结果）按 workflow_id 写入本地SQLite（WAL），
+连同阶段输入的哈希一起保存。同一工作流重跑时，输入哈希未变化的阶段直接复用检查点，
+只重新执行失败或上游结果发生变化的阶段。
+
+- 输入哈希：阶段名 + 输入（含上游阶段输出）的规范化JSON的SHA-256
+- 工作流参数（站点、日期、站长反馈）随检查点保存，resume 时只需 workflow_id
+- 每保存一个阶段刷新工作流的 updated_at 作为心跳，长时间没有心跳的 running 工作流视为已中断
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# 工作流状态
+WORKFLOW_RUNNING = "running"
+WORKFLOW_COMPLETED = "completed"
+WORKFLOW_FAILED = "failed"
+
+def input_hash(stage: str, inputs: Any) -> str:
+    """阶段输入的哈希（键排序后的JSON，非JSON类型按字符串处理）"""
+    body = json.dumps([stage, inputs], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+class CheckpointStore:
+    """按 workflow_id + 阶段保存的检查点"""
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: SQLite文件路径，":memory:" 表示不持久化
+        """
+        self.path = path or settings.CHECKPOINT_DB_PATH
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workflows ("
+            "workflow_id TEXT PRIMARY KEY, params TEXT NOT NULL, status TEXT NOT NULL, error TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "workflow_id TEXT NOT NULL, stage TEXT NOT NULL, input_hash TEXT NOT NULL, output TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (workflow_id, stage))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_workflows_status ON workflows (status, updated_at)")
+        self._conn.commit()
+
+    def start(self, workflow_id: str, params: Dict[str, Any]):
+        """登记（或重新开始）工作流，保存其参数"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workflows (workflow_id, params, status, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (workflow_id) DO UPDATE SET params = excluded.params, status = excluded.status, "
+                "error = NULL, updated_at = excluded.updated_at",
+                (workflow_id, json.dumps(params, ensure_ascii=False, default=str), WORKFLOW_RUNNING, time.time())
+            )
+            self._conn.commit()
+
+    def finish(self, workflow_id: str, status: str, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE workflows SET status = ?, error = ?, updated_at = ? WHERE workflow_id = ?",
+                (status, error, time.time(), workflow_id)
+            )
+            self._conn.commit()
+
+    def params(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """工作流参数（未登记时为None）"""
+        with self._lock:
+            row = self._conn.execute("SELECT params FROM workflows WHERE workflow_id = ?", (workflow_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load(self, workflow_id: str, stage: str, digest: str) -> Optional[Dict[str, Any]]:
+        """读取阶段输出；没有检查点或输入哈希不一致时为None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT input_hash, output FROM checkpoints WHERE workflow_id = ? AND stage = ?", (workflow_id, stage)
+            ).fetchone()
+        if row is None or row[0] != digest:
+            return None
+        return json.loads(row[1])
+
+    def save(self, workflow_id: str, stage: str, digest: str, output: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (workflow_id, stage, input_hash, output, created_at) VALUES (?, ?, ?, ?, ?)",
+                (workflow_id, stage, digest, json.dumps(output, ensure_ascii=False, default=str), now)
+            )
+            # 心跳
+            self._conn.execute(
+                "UPDATE workflows SET updated_at = ? WHERE workflow_id = ? AND status = ?", (now, workflow_id, WORKFLOW_RUNNING)
+            )
+            self._conn.commit()
+
+    def stages(self, workflow_id: str) -> List[str]:
+        """已保存检查点的阶段（按完成顺序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage FROM checkpoints WHERE workflow_id = ? ORDER BY created_at", (workflow_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def unfinished(self, since: float = None, stale_after: float = None) -> List[str]:
+        """
+        未完成的工作流ID：失败的，以及超过 stale_after 秒没有心跳的 running（进程中断）；
+        仍在其他进程中运行的工作流不会返回
+
+        Args:
+            since: 只返回该时间戳之后更新过的工作流
+            stale_after: running 工作流视为中断的无心跳秒数（默认取 CHECKPOINT_STALE_SECONDS）
+        """
+        stale_after = settings.CHECKPOINT_STALE_SECONDS if stale_after is None else stale_after
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT workflow_id FROM workflows WHERE updated_at >= ? AND "
+                "(status = ? OR (status = ? AND updated_at < ?)) ORDER BY updated_at",
+                (since or 0.0, WORKFLOW_FAILED, WORKFLOW_RUNNING, time.time() - stale_after)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge(self, older_than: float) -> int:
+        """删除超过 older_than 秒未更新的已完成工作流及其检查点，返回删除的工作流数"""
+        cutoff = time.time() - older_than
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT workflow_id FROM workflows WHERE status = ? AND updated_at < ?", (WORKFLOW_COMPLETED, cutoff)
+            )]
+            self._conn.executemany("DELETE FROM checkpoints WHERE workflow_id = ?", [(i,) for i in ids])
+            self._conn.executemany("DELETE FROM workflows WHERE workflow_id = ?", [(i,) for i in ids])
+            self._conn.commit()
+        return len(ids)
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """进程内共享的检查点存储（CHECKPOINT_ENABLED 关闭时为None）"""
+    global _store
+    if not settings.CHECKPOINT_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore()
+        return _store
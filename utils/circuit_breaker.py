@@ -0,0 +1,109 @@
+"""
+熔断器
+LLM后端连续超时或失败达到阈值后熔断：熔断期间所有站点的 kickoff 直接走确定性计算，
+不再等待超时；冷却时间过后放行一次探测调用，成功则恢复，失败则继续熔断。
+
+状态：closed（正常）→ open（熔断）→ half_open（探测）→ closed / open
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+from config.settings import settings
+from utils.logger import setup_logger
+from utils.metrics import CIRCUIT_STATE
+
+logger = setup_logger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 状态 -> 指标取值
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+class CircuitBreaker:
+    """按连续失败次数熔断"""
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        """
+        Args:
+            name: 熔断器名称（指标标签）
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断多少秒后放行探测调用
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURES
+        self.reset_timeout = settings.LLM_BREAKER_RESET_SECONDS if reset_timeout is None else reset_timeout
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        CIRCUIT_STATE.set(STATE_VALUES[STATE_CLOSED], breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """本次调用是否放行（半开状态同一时间只放行一个探测调用）"""
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition(STATE_HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != STATE_CLOSED:
+                self._transition(STATE_CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != STATE_OPEN:
+                    self._transition(STATE_OPEN)
+
+    def reset(self):
+        """手动恢复（如切换LLM后端后）"""
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != STATE_CLOSED:
+                self._transition(STATE_CLOSED)
+
+    def stats(self) -> Dict[str, object]:
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures}
+
+    def _transition(self, state: str):
+        logger.warning(f"熔断器 {self.name}: {self._state} → {state}（连续失败 {self._failures} 次）")
+        self._state = state
+        CIRCUIT_STATE.set(STATE_VALUES[state], breaker=self.name)
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+def get_llm_breaker() -> CircuitBreaker:
+    """进程内共享的LLM后端熔断器（所有站点、所有阶段共用）"""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker("llm")
+        return _breaker
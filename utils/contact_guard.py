@@ -0,0 +1,175 @@
+"""
+骑手联系频次索引
+记录每次拨打，供候选筛选跳过当天已联系或近期联系过多的骑手，并把近期联系过的骑手排到后面，
+避免同一站点的重复工作流或相邻站点在同一天反复拨打同一骑手。
+
+- 内存索引：按天的 {骑手ID: 次数}，当天是否联系 O(1)，窗口内次数为窗口天数次 O(1) 查询
+- 持久化：每次记录同步追加到SQLite（WAL），启动时只加载窗口内的记录
+- 同一进程内多个工作流共享一个实例，读写由锁保护
+"""
+
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class ContactGuard:
+    """骑手联系历史（按天计数 + 滑动窗口）"""
+
+    def __init__(self, db_path: str = None, window_days: int = None, daily_limit: int = None, window_limit: int = None):
+        """
+        Args:
+            db_path: SQLite文件路径，":memory:" 表示不持久化
+            window_days: 滑动窗口天数
+            daily_limit: 单日最多联系次数，达到后当天不再拨打
+            window_limit: 窗口内最多联系次数，达到后窗口内不再拨打
+        """
+        self.db_path = db_path or settings.CONTACT_DB_PATH
+        self.window_days = window_days or settings.CONTACT_WINDOW_DAYS
+        self.daily_limit = daily_limit or settings.CONTACT_DAILY_LIMIT
+        self.window_limit = window_limit or settings.CONTACT_WINDOW_LIMIT
+
+        self._lock = threading.Lock()
+        self._days: Dict[date, Counter] = {}
+
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS contact_log (rider_id TEXT NOT NULL, day TEXT NOT NULL, contacted_at TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_contact_log_day ON contact_log (day)")
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        """加载窗口内的联系记录"""
+        since = (date.today() - timedelta(days=self.window_days - 1)).isoformat()
+        rows = self._conn.execute(
+            "SELECT day, rider_id, COUNT(*) FROM contact_log WHERE day >= ? GROUP BY day, rider_id", (since,)
+        )
+        loaded = 0
+        for day, rider_id, count in rows:
+            self._days.setdefault(date.fromisoformat(day), Counter())[rider_id] = count
+            loaded += count
+        if loaded:
+            logger.info(f"已加载近 {self.window_days} 天联系记录 {loaded} 条")
+
+    def _window(self, today: date) -> List[Counter]:
+        return [
+            counter for day, counter in self._days.items()
+            if 0 <= (today - day).days < self.window_days
+        ]
+
+    def _prune(self, today: date):
+        for day in [day for day in self._days if (today - day).days >= self.window_days]:
+            del self._days[day]
+
+    def record(self, rider_id: str, when: datetime = None):
+        """记录一次联系"""
+        self.record_many([rider_id], when)
+
+    def record_many(self, rider_ids: Iterable[str], when: datetime = None):
+        """批量记录联系（同一事务落盘）"""
+        with self._lock:
+            self._record(list(rider_ids), when or datetime.now())
+
+    def try_record(self, rider_id: str, when: datetime = None) -> bool:
+        """
+        未达到单日与窗口上限时记录一次联系（检查与记录在同一把锁内）
+
+        拨打前调用：筛选之后其他工作流可能已联系该骑手，返回False时不应拨打
+        """
+        when = when or datetime.now()
+        today = when.date()
+        with self._lock:
+            today_counter = self._days.get(today) or Counter()
+            total = sum(counter[rider_id] for counter in self._window(today))
+            if today_counter[rider_id] >= self.daily_limit or total >= self.window_limit:
+                return False
+            self._record([rider_id], when)
+            return True
+
+    def _record(self, rider_ids: List[str], when: datetime):
+        day = when.date()
+        self._prune(date.today())
+        self._days.setdefault(day, Counter()).update(rider_ids)
+        self._conn.executemany(
+            "INSERT INTO contact_log (rider_id, day, contacted_at) VALUES (?, ?, ?)",
+            [(rider_id, day.isoformat(), when.isoformat()) for rider_id in rider_ids]
+        )
+        self._conn.commit()
+
+    def contacted_on(self, rider_id: str, day: date = None) -> int:
+        """指定日期（默认今天）的联系次数"""
+        with self._lock:
+            counter = self._days.get(day or date.today())
+            return counter[rider_id] if counter else 0
+
+    def window_count(self, rider_id: str, today: date = None) -> int:
+        """滑动窗口内的联系次数"""
+        today = today or date.today()
+        with self._lock:
+            return sum(counter[rider_id] for counter in self._window(today))
+
+    def classify(self, rider_ids: Sequence[str], today: date = None) -> Tuple[List[bool], List[bool]]:
+        """
+        批量判断骑手是否应跳过或降级
+
+        Returns:
+            Tuple[List[bool], List[bool]]: (blocked 达到单日或窗口上限, recent 窗口内联系过)
+        """
+        today = today or date.today()
+        with self._lock:
+            today_counter = self._days.get(today) or Counter()
+            window = self._window(today)
+            blocked, recent = [], []
+            for rider_id in rider_ids:
+                total = sum(counter[rider_id] for counter in window)
+                blocked.append(today_counter[rider_id] >= self.daily_limit or total >= self.window_limit)
+                recent.append(total > 0)
+            return blocked, recent
+
+    def stats(self) -> Dict[str, int]:
+        """窗口内联系次数与骑手数"""
+        today = date.today()
+        with self._lock:
+            window = self._window(today)
+            return {
+                "window_days": self.window_days,
+                "contacts": sum(sum(counter.values()) for counter in window),
+                "riders": len(set().union(*window)) if window else 0,
+                "today": sum((self._days.get(today) or Counter()).values())
+            }
+
+    def purge(self, before: date = None):
+        """删除窗口外（或指定日期前）的持久化记录"""
+        before = before or date.today() - timedelta(days=self.window_days - 1)
+        with self._lock:
+            self._conn.execute("DELETE FROM contact_log WHERE day < ?", (before.isoformat(),))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_guard: Optional[ContactGuard] = None
+_guard_lock = threading.Lock()
+
+def get_contact_guard() -> Optional[ContactGuard]:
+    """获取进程内共享的联系频次索引（CONTACT_GUARD_ENABLED 关闭时为None）"""
+    global _guard
+    if not settings.CONTACT_GUARD_ENABLED:
+        return None
+    with _guard_lock:
+        if _guard is None:
+            _guard = ContactGuard()
+        return _guard
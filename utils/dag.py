@@ -0,0 +1,210 @@
+"""
+工作流DAG执行器
+每个节点声明依赖的上游节点，依赖就绪即开始执行，互不依赖的节点并发运行，
+端到端耗时接近关键路径而不是各阶段耗时之和。
+
+- 记忆化：每个节点在一次执行中只运行一次，结果按节点名保存，多个下游共享
+- 条件：节点可声明 guards（上游节点 + 判定函数），判定为否时该节点及其下游被跳过
+- 投机执行：speculative 节点不等待 guards 即开始（如站长确认前预取候选），
+  判定为否时立即取消；已在线程中执行的同步函数无法中断，但其结果会被丢弃
+- 同步函数在线程中执行（不阻塞事件循环），每个节点使用按节点名派生的随机数生成器，
+  固定种子时结果与调度顺序无关
+"""
+
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from utils.logger import setup_logger
+from utils.profiler import profiled
+from utils.random_state import branch
+from utils.tracing import tracer
+
+logger = setup_logger(__name__)
+
+# 判定条件：(上游节点名, 以该节点结果为参数的判定函数)
+Guard = Tuple[str, Callable[[Any], bool]]
+
+class NodeSkipped(Exception):
+    """节点因条件不满足或上游被跳过而未执行"""
+
+@dataclass
+class Node:
+    """DAG中的一个节点"""
+    name: str
+    func: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+    guards: Tuple[Guard, ...] = ()
+    speculative: bool = False
+
+    @property
+    def upstream(self) -> Tuple[str, ...]:
+        """依赖节点与判定节点（去重，保持顺序）"""
+        return tuple(dict.fromkeys(self.deps + tuple(name for name, _ in self.guards)))
+
+@dataclass
+class DAGRun:
+    """一次执行的结果"""
+    results: Dict[str, Any] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    cancelled: List[str] = field(default_factory=list)
+    timings: Dict[str, Tuple[float, float]] = field(default_factory=dict)  # 节点 -> (开始, 结束)，相对执行开始的秒数
+    elapsed: float = 0.0
+
+    def critical_path(self, dag: "DAG") -> Tuple[List[str], float]:
+        """
+        按实际耗时计算的关键路径
+
+        Returns:
+            Tuple: (路径上的节点, 路径总耗时)
+        """
+        best: Dict[str, Tuple[float, List[str]]] = {}
+        for name in dag.order:
+            if name not in self.results:
+                continue
+            node = dag.nodes[name]
+            start, end = self.timings[name]
+            waits = node.deps if node.speculative else node.upstream
+            length, path = max((best[dep] for dep in waits if dep in best), key=lambda item: item[0], default=(0.0, []))
+            candidates = [(length + end - start, path + [name])]
+            if node.speculative:
+                # 投机节点的结果要等判定完成才交给下游
+                candidates += [(best[guard][0], best[guard][1] + [name]) for guard, _ in node.guards if guard in best]
+            best[name] = max(candidates, key=lambda item: item[0])
+        length, path = max(best.values(), key=lambda item: item[0], default=(0.0, []))
+        return path, length
+
+class DAG:
+    """声明式的阶段依赖图"""
+
+    def __init__(self, name: str = "dag"):
+        self.name = name
+        self.nodes: Dict[str, Node] = {}
+        self.order: List[str] = []
+
+    def add(self, name: str, func: Callable[..., Any], deps: Sequence[str] = (), guards: Sequence[Guard] = (),
+            speculative: bool = False) -> "DAG":
+        """
+        添加节点
+
+        Args:
+            name: 节点名
+            func: 以依赖节点名为关键字参数的函数（同步或异步）
+            deps: 依赖的节点（其结果作为参数传入）
+            guards: 执行条件，任一判定为否（或判定节点未执行）时跳过本节点
+            speculative: 为True时不等待 guards 即开始执行，判定为否时取消
+
+        Raises:
+            ValueError: 节点重名或依赖尚未添加的节点（保证无环）
+        """
+        if name in self.nodes:
+            raise ValueError(f"节点重复: {name}")
+        node = Node(name, func, tuple(deps), tuple(guards), speculative)
+        missing = [dep for dep in node.upstream if dep not in self.nodes]
+        if missing:
+            raise ValueError(f"节点 {name} 依赖未定义的节点: {missing}")
+        self.nodes[name] = node
+        self.order.append(name)
+        return self
+
+    async def run(self, targets: Sequence[str] = None) -> DAGRun:
+        """
+        执行DAG
+
+        Args:
+            targets: 只执行这些节点及其上游，默认执行全部节点
+
+        Returns:
+            DAGRun: 各节点结果（被跳过的节点不在 results 中）
+
+        Raises:
+            Exception: 任一节点失败时取消其余节点并抛出该异常
+        """
+        needed = self._closure(targets) if targets else set(self.order)
+        run = DAGRun()
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def check(node: Node):
+            for guard_name, predicate in node.guards:
+                if not predicate(await self._wait(tasks[guard_name])):
+                    raise NodeSkipped(f"{node.name}: 条件 {guard_name} 不满足")
+
+        async def execute(node: Node) -> Any:
+            if not node.speculative:
+                await check(node)
+            for dep in node.deps:
+                await self._wait(tasks[dep])
+
+            kwargs = {dep: tasks[dep].result() for dep in node.deps}
+            start = time.perf_counter() - started
+            with tracer.span(f"dag.{node.name}", dag=self.name), branch(node.name):
+                if inspect.iscoroutinefunction(node.func):
+                    result = await node.func(**kwargs)
+                else:
+                    result = await asyncio.to_thread(profiled(node.func), **kwargs)
+            run.timings[node.name] = (start, time.perf_counter() - started)
+            if node.speculative:
+                # 投机结果只有在条件成立后才交给下游
+                await check(node)
+            return result
+
+        for name in self.order:
+            if name in needed:
+                tasks[name] = asyncio.create_task(execute(self.nodes[name]), name=f"{self.name}.{name}")
+
+        try:
+            await self._settle(tasks, run)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        run.elapsed = time.perf_counter() - started
+        return run
+
+    async def _settle(self, tasks: Dict[str, asyncio.Task], run: DAGRun):
+        pending = set(tasks.values())
+        names = {task: name for name, task in tasks.items()}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = names[task]
+                succeeded = False
+                if task.cancelled():
+                    run.cancelled.append(name)
+                elif isinstance(task.exception(), NodeSkipped):
+                    run.skipped.append(name)
+                elif task.exception() is not None:
+                    raise task.exception()
+                else:
+                    succeeded = True
+                    run.results[name] = task.result()
+
+                # 判定为否（或判定节点未执行）时立即取消依赖该判定的投机节点
+                for other in pending:
+                    node = self.nodes[names[other]]
+                    if node.speculative and any(
+                        guard_name == name and not (succeeded and predicate(run.results[name]))
+                        for guard_name, predicate in node.guards
+                    ):
+                        logger.info(f"取消投机执行的节点 {names[other]}（条件 {name} 不满足）")
+                        other.cancel()
+
+    @staticmethod
+    async def _wait(task: asyncio.Task) -> Any:
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                raise NodeSkipped(f"上游 {task.get_name()} 已取消")
+            raise
+
+    def _closure(self, targets: Sequence[str]) -> set:
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.nodes[name].upstream)
+        return needed
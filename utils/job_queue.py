@@ -0,0 +1,447 @@
+"""
+本地持久化任务队列
+工作流各阶段（预测、决策、筛选、拨打）作为任务写入本地SQLite（WAL），由 WorkerPool 并发处理，
+调用方进程崩溃不会丢失已提交的任务，同机多个worker进程可以共同消费同一队列，无需外部消息中间件。
+
+- 租约：worker 领取任务后持有 JOB_VISIBILITY_TIMEOUT 秒的租约，处理期间定期续约；
+  worker 崩溃导致租约过期后任务重新可见，由其他 worker 接手
+- 重试：处理失败按指数退避重新排队，达到 JOB_MAX_ATTEMPTS 次后标记失败
+- 准入：同类型待处理任务数达到 JOB_MAX_QUEUED 时，新任务等待或被拒绝（背压）
+- 幂等：任务ID可由调用方指定，重复提交同一ID只保留第一次；任务处理函数应能安全重跑，
+  不能重跑的任务以 max_attempts=1 提交
+"""
+
+import asyncio
+import inspect
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+from config.settings import settings
+from utils.logger import setup_logger
+from utils.metrics import JOBS, QUEUE_DEPTH
+
+logger = setup_logger(__name__)
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# 处理函数：接收任务负载，返回可JSON序列化的结果（同步或异步）
+JobHandler = Callable[[Dict[str, Any]], Union[Dict[str, Any], Awaitable[Dict[str, Any]]]]
+
+@dataclass
+class Job:
+    """队列中的一个任务"""
+    job_id: str
+    job_type: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    lease_owner: Optional[str] = None
+    lease_expires: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (STATUS_DONE, STATUS_FAILED)
+
+_COLUMNS = "job_id, job_type, payload, status, attempts, max_attempts, lease_owner, lease_expires, result, error"
+
+def _job(row) -> Job:
+    job_id, job_type, payload, status, attempts, max_attempts, lease_owner, lease_expires, result, error = row
+    return Job(job_id, job_type, json.loads(payload), status, attempts, max_attempts, lease_owner, lease_expires,
+               json.loads(result) if result is not None else None, error)
+
+class JobQueue:
+    """SQLite持久化任务队列（同机多进程共享）"""
+
+    def __init__(self, path: str = None, max_queued: int = None, max_attempts: int = None):
+        """
+        Args:
+            path: SQLite文件路径
+            max_queued: 单个任务类型待处理任务数上限（准入控制）
+            max_attempts: 默认最多处理次数（含首次）
+        """
+        self.path = path or settings.JOB_QUEUE_PATH
+        self.max_queued = max_queued or settings.JOB_MAX_QUEUED
+        self.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, job_type TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "priority INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "available_at REAL NOT NULL, lease_owner TEXT, lease_expires REAL, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (job_type, status, priority, available_at)")
+
+    def _transaction(self, func: Callable[[float], Any]) -> Any:
+        # IMMEDIATE 事务先拿写锁，领取/提交对其他进程原子；时间在拿到锁后再取
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(time.time())
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def try_enqueue(self, job_type: str, payload: Dict[str, Any], job_id: str = None, priority: int = 0,
+                    delay: float = 0.0, max_attempts: int = None) -> Optional[str]:
+        """
+        提交任务（不等待）
+
+        Args:
+            job_id: 任务ID，已存在时不重复提交
+            priority: 数值越小越先处理
+            delay: 延迟多少秒后可被领取
+
+        Returns:
+            Optional[str]: 任务ID；队列已满时为None
+        """
+        job_id = job_id or uuid.uuid4().hex
+        body = json.dumps(payload, ensure_ascii=False, default=str)
+
+        def insert(now: float) -> Optional[str]:
+            if self._conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone():
+                return job_id
+            if self._depth(job_type) >= self.max_queued:
+                return None
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, job_type, payload, status, priority, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, body, STATUS_QUEUED, priority, max_attempts or self.max_attempts, now + delay, now, now)
+            )
+            return job_id
+
+        queued = self._transaction(insert)
+        if queued is None:
+            JOBS.inc(job_type=job_type, result="rejected")
+        else:
+            self._gauge(job_type)
+        return queued
+
+    def enqueue(self, job_type: str, payload: Dict[str, Any], job_id: str = None, priority: int = 0,
+                delay: float = 0.0, max_attempts: int = None, timeout: float = None) -> str:
+        """
+        提交任务，队列已满时等待
+
+        Args:
+            timeout: 最长等待秒数，None表示一直等待
+
+        Raises:
+            queue.Full: 等待超时仍无空位
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            queued = self.try_enqueue(job_type, payload, job_id, priority, delay, max_attempts)
+            if queued is not None:
+                return queued
+            if deadline is not None and time.monotonic() >= deadline:
+                raise queue.Full(f"任务队列 {job_type} 已满（{self.max_queued}）")
+            time.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def enqueue_async(self, job_type: str, payload: Dict[str, Any], job_id: str = None, priority: int = 0,
+                            delay: float = 0.0, max_attempts: int = None, timeout: float = None) -> str:
+        """异步提交任务：队列已满时让出事件循环等待"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            queued = await asyncio.to_thread(self.try_enqueue, job_type, payload, job_id, priority, delay, max_attempts)
+            if queued is not None:
+                return queued
+            if deadline is not None and time.monotonic() >= deadline:
+                raise queue.Full(f"任务队列 {job_type} 已满（{self.max_queued}）")
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    def lease(self, job_type: str, owner: str, visibility_timeout: float = None,
+              on_expired: Callable[[Job], Any] = None) -> Optional[Job]:
+        """
+        领取一个可处理的任务（排队中到期的，或租约已过期的）
+
+        租约过期且已达最大处理次数的任务直接标记失败，不再领取
+
+        Args:
+            on_expired: 对每个因此标记失败的任务调用（事务提交后）
+        """
+        visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+        expired: List[Job] = []
+
+        def take(now: float) -> Optional[Job]:
+            condition = "job_type = ? AND status = ? AND lease_expires < ? AND attempts >= max_attempts"
+            params = (job_type, STATUS_LEASED, now)
+            if on_expired is not None:
+                expired.extend(_job(row) for row in self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE {condition}", params))
+            self._conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated_at = ? WHERE {condition}",
+                (STATUS_FAILED, "租约过期", now) + params
+            )
+            row = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE job_type = ? AND "
+                "((status = ? AND available_at <= ?) OR (status = ? AND lease_expires < ?)) "
+                "ORDER BY priority, available_at LIMIT 1",
+                (job_type, STATUS_QUEUED, now, STATUS_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated_at = ? "
+                "WHERE job_id = ?",
+                (STATUS_LEASED, owner, now + visibility_timeout, now, row[0])
+            )
+            return _job(self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (row[0],)).fetchone())
+
+        job = self._transaction(take)
+        for failed in expired:
+            failed.status, failed.error, failed.lease_owner = STATUS_FAILED, "租约过期", None
+            self._gauge(job_type)
+            on_expired(failed)
+        return job
+
+    def _finish(self, job: Job, owner: str, sql: str, params: tuple) -> bool:
+        # 只有仍持有租约的 worker 能改变任务状态；租约已被他人接手时放弃本次结果
+        def update(now: float) -> bool:
+            cursor = self._conn.execute(
+                sql + ", updated_at = ? WHERE job_id = ? AND status = ? AND lease_owner = ?",
+                params + (now, job.job_id, STATUS_LEASED, owner)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(update)
+
+    def heartbeat(self, job: Job, owner: str, visibility_timeout: float = None) -> bool:
+        """续约，返回是否仍持有租约"""
+        expires = time.time() + (visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT)
+        return self._finish(job, owner, "UPDATE jobs SET lease_expires = ?", (expires,))
+
+    def complete(self, job: Job, owner: str, result: Dict[str, Any] = None) -> bool:
+        """标记任务完成并保存结果"""
+        body = json.dumps(result or {}, ensure_ascii=False, default=str)
+        done = self._finish(job, owner, "UPDATE jobs SET status = ?, result = ?, lease_owner = NULL, error = NULL",
+                            (STATUS_DONE, body))
+        self._gauge(job.job_type)
+        return done
+
+    def fail(self, job: Job, owner: str, error: str, retry_delay: float) -> bool:
+        """
+        处理失败：未达最大次数时延迟 retry_delay 秒重新排队，否则标记失败
+
+        Returns:
+            bool: 是否会重试
+        """
+        if job.attempts < job.max_attempts:
+            self._finish(job, owner, "UPDATE jobs SET status = ?, available_at = ?, lease_owner = NULL, error = ?",
+                         (STATUS_QUEUED, time.time() + retry_delay, error))
+            return True
+        self._finish(job, owner, "UPDATE jobs SET status = ?, lease_owner = NULL, error = ?", (STATUS_FAILED, error))
+        self._gauge(job.job_type)
+        return False
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    async def wait(self, job_id: str, timeout: float = None) -> Optional[Job]:
+        """等待任务结束（完成或失败），超时返回当前状态"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None or job.finished:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def wait_chain(self, job_id: str, timeout: float = None) -> Optional[Job]:
+        """
+        沿结果中的 next_job 等待后续任务，返回链上最后一个任务
+
+        处理函数把下一阶段任务ID放在结果的 next_job 中，调用方即可等待整条工作流结束
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            job = await self.wait(job_id, remaining)
+            if job is None or job.status != STATUS_DONE or not (job.result or {}).get("next_job"):
+                return job
+            job_id = job.result["next_job"]
+
+    def _depth(self, job_type: str) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE job_type = ? AND status IN (?, ?)", (job_type, STATUS_QUEUED, STATUS_LEASED)
+        ).fetchone()[0]
+
+    def depth(self, job_type: str) -> int:
+        """待处理（排队中 + 处理中）任务数"""
+        with self._lock:
+            return self._depth(job_type)
+
+    def _gauge(self, job_type: str):
+        QUEUE_DEPTH.set(self.depth(job_type), queue=f"jobs.{job_type}")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """按任务类型、状态统计任务数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT job_type, status, COUNT(*) FROM jobs GROUP BY job_type, status").fetchall()
+        stats: Dict[str, Dict[str, int]] = {}
+        for job_type, status, count in rows:
+            stats.setdefault(job_type, {})[status] = count
+        return stats
+
+    def purge(self, older_than: float) -> int:
+        """删除结束超过 older_than 秒的任务，返回删除数"""
+        return self._transaction(lambda now: self._conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (STATUS_DONE, STATUS_FAILED, now - older_than)
+        ).rowcount)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class WorkerPool:
+    """按任务类型分配并发数的 worker 池（单个事件循环内运行）"""
+
+    def __init__(self, job_queue: JobQueue, handlers: Dict[str, JobHandler], concurrency: Dict[str, int] = None,
+                 visibility_timeout: float = None, retry_base: float = None, retry_max: float = None,
+                 on_failure: Callable[[Job], Any] = None):
+        """
+        Args:
+            job_queue: 任务队列
+            handlers: {任务类型: 处理函数}，同步处理函数在线程中执行
+            concurrency: {任务类型: 并发数}，缺省为 JOB_CONCURRENCY 中的配置，未配置的类型为1
+            visibility_timeout: 租约时长（秒）
+            retry_base / retry_max: 重试退避的初始与最长间隔（秒）
+            on_failure: 任务最终失败（处理次数用尽或租约过期）时调用，在事件循环线程执行
+        """
+        self.queue = job_queue
+        self.handlers = handlers
+        configured = {**settings.JOB_CONCURRENCY, **(concurrency or {})}
+        self.concurrency = {job_type: max(1, configured.get(job_type, 1)) for job_type in handlers}
+        self.visibility_timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+        self.retry_base = retry_base or settings.JOB_RETRY_BASE_SECONDS
+        self.retry_max = retry_max or settings.JOB_RETRY_MAX_SECONDS
+        self.on_failure = on_failure
+        self.owner = f"worker-{uuid.uuid4().hex[:8]}"
+        self._stopping = asyncio.Event()
+        self.stats = {"completed": 0, "retried": 0, "failed": 0, "lost": 0}
+
+    def retry_delay(self, attempts: int) -> float:
+        """第 attempts 次失败后的退避秒数"""
+        return min(self.retry_max, self.retry_base * 2 ** max(0, attempts - 1))
+
+    async def _heartbeat(self, job: Job):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            if not await asyncio.to_thread(self.queue.heartbeat, job, self.owner, self.visibility_timeout):
+                logger.warning(f"任务 {job.job_id} 租约已失效")
+                return
+
+    async def _process(self, job: Job):
+        handler = self.handlers[job.job_type]
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(handler):
+                result = await handler(job.payload)
+            else:
+                result = await asyncio.to_thread(handler, job.payload)
+        except Exception as e:
+            retried = await asyncio.to_thread(self.queue.fail, job, self.owner, f"{type(e).__name__}: {e}",
+                                              self.retry_delay(job.attempts))
+            self.stats["retried" if retried else "failed"] += 1
+            JOBS.inc(job_type=job.job_type, result="retried" if retried else "failed")
+            logger.error(f"任务 {job.job_type}/{job.job_id} 第{job.attempts}次处理失败{'，稍后重试' if retried else ''}: {e}")
+            if not retried and self.on_failure is not None:
+                self.on_failure(job)
+            return
+        finally:
+            heartbeat.cancel()
+
+        if await asyncio.to_thread(self.queue.complete, job, self.owner, result):
+            self.stats["completed"] += 1
+            JOBS.inc(job_type=job.job_type, result="completed")
+            logger.info(f"任务 {job.job_type}/{job.job_id} 完成，耗时 {time.perf_counter() - start:.2f}秒")
+        else:
+            # 处理超过租约时长且已被其他 worker 接手，以对方的结果为准
+            self.stats["lost"] += 1
+            JOBS.inc(job_type=job.job_type, result="lost")
+
+    def _expired(self, job: Job):
+        self.stats["failed"] += 1
+        JOBS.inc(job_type=job.job_type, result="failed")
+        logger.error(f"任务 {job.job_type}/{job.job_id} 租约过期且已达最大处理次数（{job.max_attempts}），标记失败")
+        if self.on_failure is not None:
+            self.on_failure(job)
+
+    async def _worker(self, job_type: str, drain: bool):
+        loop = asyncio.get_running_loop()
+
+        def expired(job: Job):
+            loop.call_soon_threadsafe(self._expired, job)
+
+        while not self._stopping.is_set():
+            job = await asyncio.to_thread(self.queue.lease, job_type, self.owner, self.visibility_timeout, expired)
+            if job is None:
+                if drain and await self._idle():
+                    return
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _idle(self) -> bool:
+        # depth 查询SQLite，放到工作线程
+        return await asyncio.to_thread(lambda: all(self.queue.depth(job_type) == 0 for job_type in self.handlers))
+
+    async def run(self, drain: bool = False):
+        """
+        运行 worker 直到 stop()
+
+        Args:
+            drain: 为True时所有类型的队列都处理完（含等待重试的任务）即返回
+        """
+        logger.info(f"{self.owner} 启动: {self.concurrency}")
+        workers = [
+            asyncio.create_task(self._worker(job_type, drain))
+            for job_type, count in self.concurrency.items()
+            for _ in range(count)
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        logger.info(f"{self.owner} 退出: {self.stats}")
+
+    def stop(self):
+        """处理完手头的任务后退出"""
+        self._stopping.set()
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """获取进程内共享的任务队列"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
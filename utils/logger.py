@@ -1,109 +1,245 @@
 """
 日志工具模块
 提供统一的日志管理功能
+
+全局sink只在首次调用时配置一次（幂等），所有sink均通过loguru的
+enqueue队列在后台线程落盘，不阻塞工作流主路径。模块专用日志由单个
+路由sink按channel分发，每条记录只做一次字典查找。
 """
 
+import atexit
 import logging
 import sys
+import threading
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
 from loguru import logger
 from config.settings import settings
 
+# 已注册的模块channel集合
+_channels = set()
+_configure_lock = threading.Lock()
+_configured = False
+# 各sink的最低级别（均为 LOG_LEVEL），低于该级别的日志不会被任何sink输出
+_min_level_no = 0
+
+# 采样/限流日志统计
+_event_lock = threading.Lock()
+_event_buckets: Dict[str, Dict[str, float]] = {}
+_event_stats: Dict[str, Dict[str, float]] = {}
+
+class _ChannelRouter:
+    """
+    模块日志路由sink
+
+    根据record["extra"]["channel"]把日志写入logs/{channel}_{日期}.log，
+    替代"每个模块一个带filter的sink"的做法，避免每条记录经过O(模块数)次过滤。
+
+    以带 write/stop 的流式sink注册：logger.remove（重新配置，或loguru在进程退出时）
+    会调用 stop 关闭打开的日志文件。
+    """
+
+    def __init__(self, log_dir: Path, retention_days: int = 7):
+        self._log_dir = log_dir
+        self._retention_days = retention_days
+        self._files: Dict[str, Any] = {}
+        self._file_dates: Dict[str, str] = {}
+
+    def write(self, message):
+        record = message.record
+        channel = record["extra"].get("channel")
+        if channel not in _channels:
+            return
+
+        day = record["time"].strftime("%Y-%m-%d")
+        handle = self._files.get(channel)
+        if handle is None or self._file_dates[channel] != day:
+            handle = self._rotate(channel, day)
+
+        handle.write(
+            f"{record['time']:%Y-%m-%d %H:%M:%S} | {record['level'].name: <8} | {record['message']}\n"
+        )
+        handle.flush()
+
+    def _rotate(self, channel: str, day: str):
+        """按天切换模块日志文件，并清理过期文件"""
+        old = self._files.pop(channel, None)
+        if old is not None:
+            old.close()
+            self._cleanup(channel)
+
+        handle = open(self._log_dir / f"{channel}_{day}.log", "a", encoding="utf-8")
+        self._files[channel] = handle
+        self._file_dates[channel] = day
+        return handle
+
+    def _cleanup(self, channel: str):
+        """删除超过保留期的模块日志"""
+        cutoff = (datetime.now() - timedelta(days=self._retention_days)).strftime("%Y-%m-%d")
+        for path in self._log_dir.glob(f"{channel}_*.log"):
+            day = path.stem[len(channel) + 1:]
+            if day < cutoff:
+                path.unlink(missing_ok=True)
+
+    def stop(self):
+        for handle in self._files.values():
+            handle.close()
+        self._files.clear()
+        self._file_dates.clear()
+
+def configure_logging(force: bool = False):
+    """
+    配置全局日志sink（幂等）
+
+    Args:
+        force: 是否强制重新配置
+    """
+    global _configured, _min_level_no
+
+    with _configure_lock:
+        if _configured and not force:
+            return
+        _min_level_no = logger.level(settings.LOG_LEVEL).no
+
+        # 确保日志目录存在
+        log_dir = Path("logs")
+        log_dir.mkdir(exist_ok=True)
+
+        # 移除默认的loguru handler
+        logger.remove()
+
+        # 添加控制台输出
+        logger.add(
+            sys.stdout,
+            format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+            level=settings.LOG_LEVEL,
+            colorize=True,
+            enqueue=settings.LOG_ENQUEUE
+        )
+
+        # 添加文件输出
+        logger.add(
+            settings.LOG_FILE,
+            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+            level=settings.LOG_LEVEL,
+            rotation=settings.LOG_ROTATION,
+            retention=settings.LOG_RETENTION,
+            compression="zip",
+            encoding="utf-8",
+            enqueue=settings.LOG_ENQUEUE
+        )
+
+        # 结构化JSON输出
+        if settings.LOG_JSON_ENABLED:
+            logger.add(
+                settings.LOG_JSON_FILE,
+                level=settings.LOG_LEVEL,
+                rotation=settings.LOG_ROTATION,
+                retention=settings.LOG_RETENTION,
+                serialize=True,
+                encoding="utf-8",
+                enqueue=settings.LOG_ENQUEUE
+            )
+
+        # 模块专用日志文件（单个路由sink）
+        logger.add(
+            _ChannelRouter(log_dir),
+            level=settings.LOG_LEVEL,
+            enqueue=settings.LOG_ENQUEUE
+        )
+
+        _configured = True
+
+def shutdown_logging():
+    """等待队列中的日志全部落盘"""
+    if _configured:
+        logger.complete()
+
+atexit.register(shutdown_logging)
+
 def setup_logger(name: str = None) -> logging.Logger:
     """
     设置并返回logger实例
-    
+
+    全局sink只会配置一次，重复调用不会重建handler。
+
     Args:
         name: logger名称，默认为调用模块名
-        
+
     Returns:
         logging.Logger: 配置好的logger实例
     """
-    # 确保日志目录存在
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
-    # 移除默认的loguru handler
-    logger.remove()
-    
-    # 添加控制台输出
-    logger.add(
-        sys.stdout,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level=settings.LOG_LEVEL,
-        colorize=True
-    )
-    
-    # 添加文件输出
-    logger.add(
-        settings.LOG_FILE,
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level=settings.LOG_LEVEL,
-        rotation=settings.LOG_ROTATION,
-        retention=settings.LOG_RETENTION,
-        compression="zip",
-        encoding="utf-8"
-    )
-    
+    configure_logging()
+
     # 为特定模块添加专用日志文件
     if name:
-        module_log_file = log_dir / f"{name}.log"
-        logger.add(
-            str(module_log_file),
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}",
-            level=settings.LOG_LEVEL,
-            rotation="1 day",
-            retention="7 days",
-            filter=lambda record: record["name"] == name
-        )
-    
+        _channels.add(name)
+        return logger.bind(channel=name)
+
     return logger
 
+def _summarize(value: Any, max_items: int = 5) -> Any:
+    """压缩大对象，避免整包结果写入日志"""
+    if isinstance(value, dict):
+        summary = {}
+        for key, item in list(value.items())[:max_items]:
+            if isinstance(item, (list, tuple, dict)):
+                summary[key] = f"<{type(item).__name__} len={len(item)}>"
+            else:
+                summary[key] = item
+        if len(value) > max_items:
+            summary["..."] = f"+{len(value) - max_items} keys"
+        return summary
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    return value
+
 def log_workflow_step(step_name: str, details: dict = None):
     """
     记录工作流步骤
-    
+
     Args:
         step_name: 步骤名称
         details: 详细信息
     """
-    logger.info(f"工作流步骤: {step_name}")
     if details:
-        for key, value in details.items():
-            logger.info(f"  {key}: {value}")
+        workflow_logger.info(f"工作流步骤: {step_name} {_summarize(details)}")
+    else:
+        workflow_logger.info(f"工作流步骤: {step_name}")
 
 def log_agent_action(agent_name: str, action: str, result: dict = None):
     """
     记录Agent行为
-    
+
     Args:
         agent_name: Agent名称
         action: 执行的行为
-        result: 执行结果
+        result: 执行结果（只记录摘要）
     """
-    logger.info(f"Agent行为 [{agent_name}]: {action}")
+    agent_logger.info(f"Agent行为 [{agent_name}]: {action}")
     if result:
-        logger.info(f"  结果: {result}")
+        agent_logger.info(f"  结果: {_summarize(result)}")
 
 def log_performance(operation: str, duration: float, details: dict = None):
     """
     记录性能指标
-    
+
     Args:
         operation: 操作名称
         duration: 执行时长（秒）
         details: 额外详情
     """
-    logger.info(f"性能指标 [{operation}]: {duration:.2f}秒")
     if details:
-        for key, value in details.items():
-            logger.info(f"  {key}: {value}")
+        performance_logger.info(f"性能指标 [{operation}]: {duration:.2f}秒 {_summarize(details)}")
+    else:
+        performance_logger.info(f"性能指标 [{operation}]: {duration:.2f}秒")
 
 def log_error(error: Exception, context: str = None):
     """
     记录错误信息
-    
+
     Args:
         error: 异常对象
         context: 错误上下文
@@ -112,7 +248,89 @@ def log_error(error: Exception, context: str = None):
         logger.error(f"错误上下文: {context}")
     logger.exception(f"异常信息: {str(error)}")
 
+def log_sampled(category: str, message: str, level: str = "DEBUG", **fields):
+    """
+    记录高频事件（逐骑手、逐通话），按类别令牌桶限流
+
+    每个类别允许LOG_EVENT_BURST条突发，之后按LOG_EVENT_RATE_LIMIT条/秒放行，
+    被抑制的条数会附在下一条放行的日志上。低于 LOG_LEVEL 的事件直接丢弃，不消耗令牌。
+
+    Args:
+        category: 事件类别，如 "call"、"rider"
+        message: 日志内容
+        level: 日志级别
+        **fields: 附加结构化字段
+    """
+    if logger.level(level).no < _min_level_no:
+        # 不会输出的级别不消耗令牌，否则会挤掉同类别中可输出的日志
+        return
+
+    start = time.perf_counter()
+    now = time.monotonic()
+
+    with _event_lock:
+        bucket = _event_buckets.get(category)
+        if bucket is None:
+            bucket = {"tokens": float(settings.LOG_EVENT_BURST), "updated": now}
+            _event_buckets[category] = bucket
+            _event_stats[category] = {"emitted": 0, "suppressed": 0, "pending": 0, "overhead": 0.0}
+        stats = _event_stats[category]
+
+        bucket["tokens"] = min(
+            float(settings.LOG_EVENT_BURST),
+            bucket["tokens"] + (now - bucket["updated"]) * settings.LOG_EVENT_RATE_LIMIT
+        )
+        bucket["updated"] = now
+
+        if bucket["tokens"] < 1.0:
+            stats["suppressed"] += 1
+            stats["pending"] += 1
+            stats["overhead"] += time.perf_counter() - start
+            return
+
+        bucket["tokens"] -= 1.0
+        stats["emitted"] += 1
+        suppressed = stats["pending"]
+        stats["pending"] = 0
+
+    if suppressed:
+        message = f"{message} (已抑制{suppressed}条)"
+    logger.bind(category=category, **fields).log(level, message)
+
+    with _event_lock:
+        stats["overhead"] += time.perf_counter() - start
+
+def get_logging_stats() -> Dict[str, Any]:
+    """
+    获取高频事件日志统计
+
+    Returns:
+        Dict: 各类别的放行数、抑制数和日志调用累计耗时（秒）
+    """
+    with _event_lock:
+        return {
+            "enqueue": settings.LOG_ENQUEUE,
+            "categories": {
+                category: {
+                    "emitted": stats["emitted"],
+                    "suppressed": stats["suppressed"],
+                    "overhead_seconds": round(stats["overhead"], 6)
+                }
+                for category, stats in _event_stats.items()
+            }
+        }
+
+def reset_logging_stats(category: Optional[str] = None):
+    """重置高频事件日志统计"""
+    with _event_lock:
+        if category is None:
+            _event_buckets.clear()
+            _event_stats.clear()
+        else:
+            _event_buckets.pop(category, None)
+            _event_stats.pop(category, None)
+
 # 创建专用logger实例
 workflow_logger = setup_logger("workflow")
 agent_logger = setup_logger("agent")
-performance_logger = setup_logger("performance") 
\ No newline at end of file
+performance_logger = setup_logger("performance")
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+指标统计模块
+提供Prometheus文本格式的计数器、仪表盘与直方图
+
+热路径上的更新只持有单个指标的内存锁；导出时先在锁内拷贝快照，
+再在锁外格式化与写出，任何I/O都不会持有锁。
+"""
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings
+from utils.tracing import LATENCY_BUCKETS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    """指标基类：按标签值组合维护子序列"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class Gauge(_Metric):
+    """可增可减的仪表盘（如队列深度）"""
+
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+class Histogram(_Metric):
+    """固定桶直方图"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [各桶计数..., +Inf桶计数, sum]
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """生成Prometheus文本格式输出"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """写出指标文件（供批处理模式或node_exporter textfile采集）"""
+        content = self.render()
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_text(content, encoding="utf-8")
+        tmp.replace(target)
+
+# 全局注册表
+registry = MetricsRegistry()
+
+WORKFLOWS_STARTED = registry.counter(
+    "recall_workflows_started_total", "已启动的召回工作流数"
+)
+WORKFLOWS_COMPLETED = registry.counter(
+    "recall_workflows_completed_total", "已结束的召回工作流数（按结果）", ("outcome",)
+)
+STAGE_DURATION = registry.histogram(
+    "recall_stage_duration_seconds", "工作流各阶段耗时", ("stage",)
+)
+KICKOFF_DURATION = registry.histogram(
+    "recall_crew_kickoff_duration_seconds", "Crew.kickoff 耗时", ("stage",)
+)
+KICKOFF_FAILURES = registry.counter(
+    "recall_crew_kickoff_failures_total", "Crew.kickoff 失败次数", ("stage",)
+)
+KICKOFF_FALLBACKS = registry.counter(
+    "recall_crew_kickoff_fallbacks_total", "kickoff 改走确定性计算的次数（按原因：timeout/error/circuit_open）", ("stage", "reason")
+)
+CIRCUIT_STATE = registry.gauge(
+    "recall_circuit_state", "熔断器状态（0正常，1探测，2熔断）", ("breaker",)
+)
+AGENT_SETUP_DURATION = registry.histogram(
+    "recall_agent_setup_duration_seconds", "每次kickoff前借出Agent/Crew并构造任务的耗时", ("role",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+AGENT_POOL_IDLE = registry.gauge(
+    "recall_agent_pool_idle", "Agent/Crew池中的空闲数量", ("role",)
+)
+WORKFLOW_DURATION = registry.histogram(
+    "recall_workflow_duration_seconds", "工作流端到端耗时（按结果）", ("outcome",)
+)
+CACHE_REQUESTS = registry.counter(
+    "recall_cache_requests_total", "缓存访问次数（按命中结果）", ("cache", "result")
+)
+CALLS = registry.counter(
+    "recall_calls_total", "召回拨打结果计数", ("result",)
+)
+QUEUE_DEPTH = registry.gauge(
+    "recall_queue_depth", "队列当前深度", ("queue",)
+)
+JOBS = registry.counter(
+    "recall_jobs_total", "任务队列处理结果计数", ("job_type", "result")
+)
+CALL_RATE_LIMITED = registry.counter(
+    "recall_call_rate_limited_total", "拨打因限流未能立即获取令牌的次数", ("scope",)
+)
+
+def record_cache_access(cache: str, hit: bool):
+    """记录一次缓存访问"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def render_metrics() -> str:
+    """导出全局注册表"""
+    return registry.render()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int = None, host: str = None) -> Optional[ThreadingHTTPServer]:
+    """
+    在后台线程启动独立的 /metrics 端点（幂等）
+
+    适用于没有FastAPI的长驻进程（如Streamlit）。端口为0时不启动。
+    """
+    global _server
+
+    port = settings.METRICS_PORT if port is None else port
+    if not port:
+        return None
+
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host or settings.API_HOST, port), _MetricsHandler)
+            except OSError:
+                # 端口已被同机其他进程占用时不重复启动
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
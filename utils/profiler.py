@@ -0,0 +1,284 @@
+"""
+性能剖析模块
+按需对单次工作流运行进行CPU与内存剖析，产物写入独立目录
+
+- sampling模式：后台线程定时采样工作流各线程的调用栈，输出折叠栈
+  （profile.folded，可直接用 flamegraph.pl / speedscope 生成火焰图）
+- deterministic模式：cProfile全量记录，输出 profile.pstats 与热点函数文本
+- 两种模式均在每个阶段结束时做tracemalloc快照，输出各阶段新增分配的热点位置
+
+除事件循环线程外，放到工作线程执行的阶段（asyncio.to_thread、DAG同步节点、kickoff线程池）
+用 profiled 包装后，执行期间登记到当前会话：sampling模式一并采样，deterministic模式在该线程
+单独运行cProfile，结束时合并。当前会话经 contextvars 传递到工作线程。
+
+tracemalloc 与主线程 cProfile 是进程级的，API/Streamlit 可能并发运行多个剖析会话：
+tracemalloc 按会话计数，最后一个会话结束时才停止；同一时刻只有一个会话做确定性剖析，
+其余会话改用采样模式。
+
+未开启剖析时工作流不会创建本模块的任何对象，profiled 包装只多一次 contextvar 读取。
+"""
+
+import cProfile
+import functools
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+# 当前工作流的剖析会话（start 时设置，随上下文复制到工作线程）
+_current: ContextVar[Optional["WorkflowProfiler"]] = ContextVar("workflow_profiler", default=None)
+
+# 进行中的剖析会话数；tracemalloc 由本模块启动时，最后一个会话结束后才停止
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_sessions = 0
+_tracemalloc_owned = False
+
+# 同一时刻只允许一个会话在主线程启用cProfile
+_deterministic_lock = threading.Lock()
+
+def _retain_tracemalloc():
+    global _tracemalloc_sessions, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_sessions == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+            _tracemalloc_owned = True
+        _tracemalloc_sessions += 1
+
+def _release_tracemalloc():
+    global _tracemalloc_sessions, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_sessions -= 1
+        if _tracemalloc_sessions == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+class _StackSampler:
+    """定时采样一组线程调用栈的采样器"""
+
+    def __init__(self, threads: Callable[[], List[int]], interval: float):
+        """
+        Args:
+            threads: 返回当前需要采样的线程ID
+            interval: 采样间隔（秒）
+        """
+        self.threads = threads
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in self.threads():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def write_folded(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class WorkflowProfiler:
+    """单次工作流的剖析会话"""
+
+    def __init__(self, workflow_id: str, mode: str = None, output_dir: str = None, top_n: int = 25):
+        self.workflow_id = workflow_id
+        self.mode = mode or settings.PROFILE_MODE
+        if self.mode not in ("sampling", "deterministic"):
+            raise ValueError(f"不支持的剖析模式: {self.mode}")
+        self.artifact_dir = Path(output_dir or settings.PROFILE_DIR) / workflow_id
+        self.top_n = top_n
+        self.stage_memory: List[Dict[str, Any]] = []
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        # 登记中的线程ID -> 嵌套深度；工作线程结束后的cProfile结果
+        self._threads: Dict[int, int] = {}
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._threads_lock = threading.Lock()
+        self._token = None
+        self._snapshot = None
+        self._tracing = False
+        self._start = 0.0
+
+    def start(self):
+        self.artifact_dir.mkdir(parents=True, exist_ok=True)
+        _retain_tracemalloc()
+        self._tracing = True
+        self._snapshot = tracemalloc.take_snapshot()
+        self._start = time.perf_counter()
+        self._threads[threading.get_ident()] = 1
+        self._token = _current.set(self)
+
+        if self.mode == "deterministic":
+            self._enable_profile()
+        if self.mode == "sampling":
+            self._sampler = _StackSampler(self._sampled_threads, settings.PROFILE_SAMPLE_INTERVAL)
+            self._sampler.start()
+
+    def _enable_profile(self):
+        """启用主线程cProfile；已有会话在做确定性剖析（或其他剖析器生效）时改用采样模式"""
+        if _deterministic_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                self._profile = profile
+                return
+            except ValueError as e:
+                _deterministic_lock.release()
+                logger.warning(f"无法启用cProfile（{e}），工作流 {self.workflow_id} 改用采样模式")
+        else:
+            logger.warning(f"已有工作流在做确定性剖析，工作流 {self.workflow_id} 改用采样模式")
+        self.mode = "sampling"
+
+    def _sampled_threads(self) -> List[int]:
+        with self._threads_lock:
+            return list(self._threads)
+
+    @contextmanager
+    def thread(self):
+        """在工作线程中执行期间纳入剖析（可嵌套）"""
+        ident = threading.get_ident()
+        with self._threads_lock:
+            depth = self._threads.get(ident, 0)
+            self._threads[ident] = depth + 1
+        profile = None
+        if self.mode == "deterministic" and depth == 0:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # 同一解释器只允许一个cProfile生效的Python版本上，工作线程不做确定性剖析
+                logger.debug(f"工作线程无法启用cProfile: {e}")
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._threads_lock:
+                if profile is not None:
+                    self._thread_profiles.append(profile)
+                if depth:
+                    self._threads[ident] = depth
+                else:
+                    del self._threads[ident]
+
+    @contextmanager
+    def stage(self, name: str):
+        """阶段结束时对比tracemalloc快照，记录该阶段的分配热点（快照失败不影响工作流）"""
+        yield
+        if not tracemalloc.is_tracing():
+            return
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            diff = snapshot.compare_to(self._snapshot, "lineno")
+            self._snapshot = snapshot
+
+            top = [
+                {"site": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in diff[:self.top_n]
+            ]
+            current, peak = tracemalloc.get_traced_memory()
+            self.stage_memory.append({
+                "stage": name,
+                "allocated_bytes": sum(stat.size_diff for stat in diff if stat.size_diff > 0),
+                "traced_current": current,
+                "traced_peak": peak,
+                "top_allocations": top
+            })
+        except Exception as e:
+            logger.warning(f"阶段 {name} 内存快照失败: {e}")
+
+    def stop(self) -> Path:
+        """停止剖析并写出全部产物，返回产物目录"""
+        elapsed = time.perf_counter() - self._start
+        summary: Dict[str, Any] = {
+            "workflow_id": self.workflow_id,
+            "mode": self.mode,
+            "wall_time": elapsed
+        }
+
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        if self._profile is not None:
+            self._profile.disable()
+            _deterministic_lock.release()
+            buffer = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=buffer)
+            with self._threads_lock:
+                # 只合并已结束的工作线程（超时后仍在运行的kickoff不计入）
+                thread_profiles = list(self._thread_profiles)
+            for profile in thread_profiles:
+                stats.add(profile)
+            stats.dump_stats(str(self.artifact_dir / "profile.pstats"))
+            stats.sort_stats("cumulative").print_stats(self.top_n)
+            (self.artifact_dir / "profile_top.txt").write_text(buffer.getvalue(), encoding="utf-8")
+            summary["profiled_threads"] = len(thread_profiles) + 1
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.write_folded(self.artifact_dir / "profile.folded")
+            summary["samples"] = self._sampler.samples
+
+        if self._tracing:
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                with open(self.artifact_dir / "allocations.txt", "w", encoding="utf-8") as f:
+                    for stat in snapshot.statistics("lineno")[:self.top_n]:
+                        f.write(f"{stat}\n")
+                summary["traced_peak"] = tracemalloc.get_traced_memory()[1]
+            except RuntimeError as e:
+                # tracemalloc 被会话以外的代码停止
+                logger.warning(f"工作流 {self.workflow_id} 内存快照失败: {e}")
+            finally:
+                self._tracing = False
+                _release_tracemalloc()
+
+        summary["stages"] = self.stage_memory
+        with open(self.artifact_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        return self.artifact_dir
+
+def profiled(func: Callable[..., T]) -> Callable[..., T]:
+    """包装放到工作线程执行的函数：当前上下文有剖析会话时，执行期间把该线程纳入剖析"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> T:
+        profiler = _current.get()
+        if profiler is None:
+            return func(*args, **kwargs)
+        with profiler.thread():
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,61 @@
+"""
+随机数状态管理
+模拟数据工具统一从这里取随机数生成器，便于基准测试与回放时固定种子
+
+未设置种子时使用进程级默认生成器；在 seeded() 上下文中（按contextvars隔离）
+使用由种子派生的独立生成器，不影响并发运行的其他工作流。
+并发执行的子任务用 branch() 按名称再派生各自的生成器，结果与调度顺序无关。
+"""
+
+import contextvars
+import random
+import zlib
+from contextlib import contextmanager
+from typing import Optional, Tuple
+import numpy as np
+
+# (NumPy生成器, 标准库生成器, 种子)；默认生成器没有种子
+_default_state: Tuple[np.random.Generator, random.Random, Optional[int]] = (np.random.default_rng(), random.Random(), None)
+_state: contextvars.ContextVar = contextvars.ContextVar("random_state", default=None)
+
+def get_rng() -> np.random.Generator:
+    """获取当前上下文的NumPy随机数生成器"""
+    state = _state.get()
+    return (state or _default_state)[0]
+
+def get_random() -> random.Random:
+    """获取当前上下文的标准库随机数生成器"""
+    state = _state.get()
+    return (state or _default_state)[1]
+
+@contextmanager
+def seeded(seed: Optional[int]):
+    """
+    在上下文内使用固定种子
+
+    Args:
+        seed: 随机种子，为None时沿用当前生成器
+    """
+    if seed is None:
+        yield
+        return
+
+    token = _state.set((np.random.default_rng(seed), random.Random(seed), seed))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+@contextmanager
+def branch(key: str):
+    """
+    为并发子任务派生独立的生成器（种子由当前种子与 key 决定）
+
+    未设置种子时沿用当前生成器
+    """
+    state = _state.get()
+    if state is None or state[2] is None:
+        yield
+        return
+    with seeded(zlib.crc32(f"{state[2]}:{key}".encode("utf-8"))):
+        yield
@@ -0,0 +1,317 @@
+"""
+拨打限流
+按全局、站点、线路供应商三级令牌桶限制拨打速率，并对站点执行每日拨打上限
+（BUSINESS_RULES["call_strategy"]["max_daily_calls"]）。
+
+令牌桶状态放在共享存储中，多进程共同生效：
+- sqlite: 本地SQLite（WAL），同机多进程共享（默认）
+- redis: Redis（settings.REDIS_URL），Lua脚本原子更新，可跨机器
+- memory: 进程内，仅用于单进程或测试
+
+每个进程按批从共享存储租用令牌（CALL_RATE_LEASE 个）放在本地池中，
+拨打时只在本地池扣减，多数情况下获取令牌只是几次字典操作；本地池用完才访问共享存储，
+访问时不持有本地锁，异步 acquire 中放到工作线程执行，不阻塞事件循环。
+代价是每个进程最多有一批令牌提前计入当日用量。
+"""
+
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings, BUSINESS_RULES
+from utils.logger import setup_logger
+from utils.metrics import CALL_RATE_LIMITED
+
+logger = setup_logger(__name__)
+
+# 单个令牌桶：(键, 每秒速率, 容量, 每日上限 0表示不限)
+BucketSpec = Tuple[str, float, float, int]
+
+class _Bucket:
+    """令牌桶状态计算（各后端共用）"""
+
+    @staticmethod
+    def take(tokens: float, updated_at: float, day: str, used: int, now: float, today: str,
+             want: int, rate: float, capacity: float, daily_limit: int) -> Tuple[float, int, int, float]:
+        """
+        补充令牌并尽量取出 want 个
+
+        Returns:
+            Tuple: (剩余令牌, 新的当日用量, 取得数量, 取不到时建议等待秒数)
+        """
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+        if day != today:
+            used = 0
+        available = int(tokens)
+        if daily_limit:
+            available = min(available, daily_limit - used)
+        granted = max(0, min(want, available))
+        tokens -= granted
+        used += granted
+
+        if granted:
+            wait = 0.0
+        elif daily_limit and used >= daily_limit:
+            wait = math.inf
+        else:
+            wait = (1.0 - tokens) / rate if rate > 0 else math.inf
+        return tokens, used, granted, wait
+
+class MemoryBackend:
+    """进程内令牌桶"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict[str, Tuple[float, float, str, int]] = {}
+
+    def lease(self, key: str, want: int, rate: float, capacity: float, daily_limit: int) -> Tuple[int, float]:
+        today = date.today().isoformat()
+        with self._lock:
+            now = time.time()
+            tokens, updated_at, day, used = self._state.get(key, (capacity, now, today, 0))
+            tokens, used, granted, wait = _Bucket.take(tokens, updated_at, day, used, now, today, want, rate, capacity, daily_limit)
+            self._state[key] = (tokens, max(now, updated_at), today, used)
+        return granted, wait
+
+    def usage(self, key: str) -> int:
+        with self._lock:
+            state = self._state.get(key)
+        return state[3] if state and state[2] == date.today().isoformat() else 0
+
+class SQLiteBackend:
+    """本地SQLite共享令牌桶（同机多进程）"""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.CALL_RATE_DB_PATH
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL)"
+        )
+
+    def lease(self, key: str, want: int, rate: float, capacity: float, daily_limit: int) -> Tuple[int, float]:
+        today = date.today().isoformat()
+        with self._lock:
+            # IMMEDIATE 事务先拿写锁，读-改-写对其他进程原子；时间在拿到锁后再取
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at, day, used FROM rate_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated_at, day, used = row or (capacity, now, today, 0)
+                tokens, used, granted, wait = _Bucket.take(
+                    tokens, updated_at, day, used, now, today, want, rate, capacity, daily_limit
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at, day, used) VALUES (?, ?, ?, ?, ?)",
+                    (key, tokens, max(now, updated_at), today, used)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return granted, wait
+
+    def usage(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT day, used FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+        return row[1] if row and row[0] == date.today().isoformat() else 0
+
+class RedisBackend:
+    """Redis共享令牌桶（跨机器）"""
+
+    # KEYS[1]=桶键  ARGV=want, rate, capacity, daily_limit, today；时间取Redis服务器时钟，避免各机器时钟偏差
+    LEASE_SCRIPT = """
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at', 'day', 'used')
+    local want = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local capacity = tonumber(ARGV[3])
+    local daily_limit = tonumber(ARGV[4])
+    local today = ARGV[5]
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    local used = tonumber(state[4]) or 0
+    if state[3] ~= today then used = 0 end
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    local available = math.floor(tokens)
+    if daily_limit > 0 then available = math.min(available, daily_limit - used) end
+    local granted = math.max(0, math.min(want, available))
+    tokens = tokens - granted
+    used = used + granted
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', math.max(now, updated_at), 'day', today, 'used', used)
+    redis.call('EXPIRE', KEYS[1], 172800)
+    return {granted, tostring(tokens), used}
+    """
+
+    def __init__(self, url: str = None, prefix: str = "recall:rate:"):
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImportError("CALL_RATE_BACKEND=redis 需要安装 redis 包") from exc
+        self._client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._script = self._client.register_script(self.LEASE_SCRIPT)
+        self._prefix = prefix
+
+    def lease(self, key: str, want: int, rate: float, capacity: float, daily_limit: int) -> Tuple[int, float]:
+        today = date.today().isoformat()
+        granted, tokens, used = self._script(
+            keys=[self._prefix + key], args=[want, rate, capacity, daily_limit, today]
+        )
+        granted, tokens, used = int(granted), float(tokens), int(used)
+        if granted:
+            return granted, 0.0
+        if daily_limit and used >= daily_limit:
+            return 0, math.inf
+        return 0, (1.0 - tokens) / rate if rate > 0 else math.inf
+
+    def usage(self, key: str) -> int:
+        day, used = self._client.hmget(self._prefix + key, "day", "used")
+        return int(used) if day and day.decode() == date.today().isoformat() else 0
+
+def create_backend(name: str = None):
+    """按名称创建共享存储后端"""
+    name = name or settings.CALL_RATE_BACKEND
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        return RedisBackend()
+    if name == "memory":
+        return MemoryBackend()
+    raise ValueError(f"未知的限流后端: {name}")
+
+class CallRateLimiter:
+    """全局 / 站点 / 供应商三级拨打限流"""
+
+    def __init__(self, backend=None, global_rate: float = None, site_rate: float = None, provider_rate: float = None,
+                 burst_seconds: float = None, lease_size: int = None, site_daily_limit: int = None):
+        """
+        Args:
+            backend: 共享存储后端，默认按 CALL_RATE_BACKEND 创建
+            global_rate / site_rate / provider_rate: 每秒拨打数
+            burst_seconds: 桶容量 = 速率 × 该秒数
+            lease_size: 每次从共享存储租用的令牌数
+            site_daily_limit: 单站点每日拨打上限
+        """
+        self.backend = backend or create_backend()
+        self.global_rate = global_rate or settings.CALL_RATE_GLOBAL
+        self.site_rate = site_rate or settings.CALL_RATE_PER_SITE
+        self.provider_rate = provider_rate or settings.CALL_RATE_PER_PROVIDER
+        self.burst_seconds = burst_seconds or settings.CALL_RATE_BURST_SECONDS
+        self.lease_size = lease_size or settings.CALL_RATE_LEASE
+        self.site_daily_limit = BUSINESS_RULES["call_strategy"]["max_daily_calls"] if site_daily_limit is None else site_daily_limit
+
+        self._lock = threading.Lock()
+        self._local: Dict[str, int] = {}
+        self._local_day = date.today()
+
+    def _buckets(self, site_id: str, provider: str) -> List[BucketSpec]:
+        return [
+            ("global", self.global_rate, self.global_rate * self.burst_seconds, 0),
+            (f"site:{site_id}", self.site_rate, self.site_rate * self.burst_seconds, self.site_daily_limit),
+            (f"provider:{provider}", self.provider_rate, self.provider_rate * self.burst_seconds, 0)
+        ]
+
+    def _lease_size(self, capacity: float) -> int:
+        # 租用量不超过桶容量的一半，避免单个进程占满突发额度
+        return max(1, min(self.lease_size, int(capacity // 2)))
+
+    def _take_local(self, buckets: List[BucketSpec]) -> List[BucketSpec]:
+        """本地池三级都有令牌时各扣一个并返回空列表，否则返回本地池已空的桶（不扣减）"""
+        with self._lock:
+            if self._local_day != date.today():
+                # 跨天后本地剩余令牌作废，当日用量以共享存储为准
+                self._local.clear()
+                self._local_day = date.today()
+
+            empty = [bucket for bucket in buckets if self._local.get(bucket[0], 0) <= 0]
+            if not empty:
+                for key, _, _, _ in buckets:
+                    self._local[key] -= 1
+            return empty
+
+    def _refill(self, buckets: List[BucketSpec]) -> float:
+        """
+        从共享存储租用令牌补充本地池（访问共享存储时不持有本地锁）
+
+        Returns:
+            float: 0 表示均已补充；否则为第一个被拒绝的桶的建议等待秒数
+        """
+        for key, rate, capacity, daily_limit in buckets:
+            granted, wait = self.backend.lease(key, self._lease_size(capacity), rate, capacity, daily_limit)
+            if not granted:
+                CALL_RATE_LIMITED.inc(scope=key.split(":", 1)[0])
+                return wait
+            with self._lock:
+                self._local[key] = self._local.get(key, 0) + granted
+        return 0.0
+
+    def try_acquire(self, site_id: str, provider: str = "default") -> float:
+        """
+        尝试为一次拨打获取令牌（三级各一个）；本地池用完时同步访问共享存储，事件循环中请使用 acquire
+
+        Returns:
+            float: 0 表示已获取；否则为建议等待秒数，inf 表示当日额度已用完
+        """
+        buckets = self._buckets(site_id, provider)
+        while True:
+            empty = self._take_local(buckets)
+            if not empty:
+                return 0.0
+            # 补充后可能已被其他线程用掉，回到本地池重新扣减
+            wait = self._refill(empty)
+            if wait:
+                return wait
+
+    async def acquire(self, site_id: str, provider: str = "default", timeout: float = None) -> bool:
+        """
+        异步等待令牌（本地池扣减在事件循环中完成，访问共享存储放到工作线程）
+
+        Args:
+            timeout: 最长等待秒数，None表示一直等待（当日额度用完时立即返回）
+
+        Returns:
+            bool: 是否获取到令牌
+        """
+        buckets = self._buckets(site_id, provider)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            empty = self._take_local(buckets)
+            if not empty:
+                return True
+            wait = await asyncio.to_thread(self._refill, empty)
+            if wait == 0.0:
+                continue
+            if math.isinf(wait):
+                return False
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            await asyncio.sleep(wait)
+
+    def daily_usage(self, site_id: str) -> int:
+        """站点当日已计入的拨打数（含已租用未使用的令牌）"""
+        return self.backend.usage(f"site:{site_id}")
+
+_limiter: Optional[CallRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def get_call_rate_limiter() -> CallRateLimiter:
+    """获取进程内共享的拨打限流器"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = CallRateLimiter()
+        return _limiter
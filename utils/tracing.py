@@ -0,0 +1,306 @@
+"""
+链路追踪模块
+提供工作流阶段级别的耗时追踪与性能统计
+
+每个span记录墙钟时间、CPU时间以及任意属性（LLM token数、负载大小等），
+同名span的耗时汇总到进程内直方图，可通过 get_span_stats() 查询；
+工作流级trace结束后以Chrome Trace Event格式导出，可直接在
+chrome://tracing 或 Perfetto 中打开。
+"""
+
+import contextvars
+import functools
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config.settings import settings
+
+# 直方图桶边界（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 中文字符与全角标点（按每字1个token估算）
+_CJK = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+class Span:
+    """单个追踪片段"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "attributes",
+        "start_us", "wall_time", "cpu_time", "thread_id", "status",
+        "_t0", "_c0"
+    )
+
+    def __init__(self, name: str, trace_id: Optional[str], parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_us = time.time_ns() // 1000
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.thread_id = threading.get_ident()
+        self.status = "ok"
+        self._t0 = time.perf_counter()
+        self._c0 = time.thread_time()
+
+    def set(self, **attributes):
+        """补充span属性"""
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self._t0
+        self.cpu_time = time.thread_time() - self._c0
+
+    def to_trace_event(self) -> Dict[str, Any]:
+        """转换为Chrome Trace Event（完整事件，ph=X）"""
+        args = {key: value if isinstance(value, (int, float, str, bool)) or value is None else str(value)
+                for key, value in self.attributes.items()}
+        args.update({
+            "cpu_ms": round(self.cpu_time * 1000, 3),
+            "status": self.status,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id
+        })
+        return {
+            "name": self.name,
+            "cat": self.name.split(".", 1)[0],
+            "ph": "X",
+            "ts": self.start_us,
+            "dur": round(self.wall_time * 1_000_000),
+            "pid": os.getpid(),
+            "tid": self.thread_id,
+            "args": args
+        }
+
+class _Histogram:
+    """固定桶耗时直方图"""
+
+    __slots__ = ("counts", "count", "wall_sum", "cpu_sum", "wall_max", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.wall_sum = 0.0
+        self.cpu_sum = 0.0
+        self.wall_max = 0.0
+        self.errors = 0
+
+    def observe(self, wall: float, cpu: float, failed: bool):
+        self.counts[bisect_left(LATENCY_BUCKETS, wall)] += 1
+        self.count += 1
+        self.wall_sum += wall
+        self.cpu_sum += cpu
+        if wall > self.wall_max:
+            self.wall_max = wall
+        if failed:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶上界估算分位数"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.wall_max
+        return self.wall_max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "wall_avg": self.wall_sum / self.count if self.count else 0.0,
+            "wall_max": self.wall_max,
+            "wall_p50": self.quantile(0.5),
+            "wall_p95": self.quantile(0.95),
+            "wall_p99": self.quantile(0.99),
+            "cpu_avg": self.cpu_sum / self.count if self.count else 0.0,
+            "buckets": {
+                **{str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.counts)},
+                "+Inf": self.counts[-1]
+            }
+        }
+
+class Tracer:
+    """追踪器：管理活跃trace、span直方图与trace导出"""
+
+    def __init__(self, trace_dir: str = None, enabled: bool = True, max_spans_per_trace: int = 50000):
+        self.trace_dir = Path(trace_dir or settings.TRACE_DIR)
+        self.enabled = enabled
+        self.max_spans_per_trace = max_spans_per_trace
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, _Histogram] = {}
+        self._traces: Dict[str, List[Span]] = {}
+
+    @contextmanager
+    def trace(self, trace_id: str, export: bool = None, **attributes):
+        """
+        开启一条trace（通常对应一次工作流），结束时导出到本地文件
+
+        Args:
+            trace_id: trace ID，一般使用workflow_id
+            export: 是否导出文件，默认取 settings.TRACE_EXPORT_ENABLED
+            **attributes: 根span属性
+        """
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        with self._lock:
+            self._traces[trace_id] = []
+        try:
+            with self.span("workflow", _trace_id=trace_id, **attributes) as root:
+                yield root
+        finally:
+            with self._lock:
+                spans = self._traces.pop(trace_id, [])
+            if export if export is not None else settings.TRACE_EXPORT_ENABLED:
+                self.export_chrome_trace(trace_id, spans)
+
+    @contextmanager
+    def span(self, name: str, _trace_id: str = None, **attributes):
+        """
+        记录一个span
+
+        Args:
+            name: span名称，如 "stage.prediction"、"crew.kickoff"、"tool.rider_data_tool"
+            **attributes: span属性
+        """
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        trace_id = _trace_id or (parent.trace_id if parent else None)
+        span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException:
+            span.status = "error"
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+            self._record(span)
+
+    def _record(self, span: Span):
+        with self._lock:
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = _Histogram()
+            histogram.observe(span.wall_time, span.cpu_time, span.status != "ok")
+
+            spans = self._traces.get(span.trace_id) if span.trace_id else None
+            if spans is not None and len(spans) < self.max_spans_per_trace:
+                spans.append(span)
+
+    def export_chrome_trace(self, trace_id: str, spans: List[Span]) -> Optional[Path]:
+        """将span写为Chrome Trace Event格式JSON文件"""
+        if not spans:
+            return None
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        path = self.trace_dir / f"{trace_id}.trace.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": [span.to_trace_event() for span in spans], "displayTimeUnit": "ms"},
+                f,
+                ensure_ascii=False
+            )
+        return path
+
+    def get_span_stats(self, name: str = None) -> Dict[str, Any]:
+        """
+        查询span耗时直方图
+
+        Args:
+            name: span名称，为空时返回全部
+
+        Returns:
+            Dict: span名称 -> 统计快照
+        """
+        with self._lock:
+            if name is not None:
+                histogram = self._histograms.get(name)
+                return {name: histogram.snapshot()} if histogram else {}
+            return {key: histogram.snapshot() for key, histogram in sorted(self._histograms.items())}
+
+    def reset(self):
+        """清空直方图"""
+        with self._lock:
+            self._histograms.clear()
+
+class _NoopSpan:
+    """追踪关闭时使用的空span"""
+
+    trace_id = None
+    span_id = None
+    wall_time = 0.0
+    cpu_time = 0.0
+
+    def set(self, **attributes):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+def current_span():
+    """获取当前上下文中的span"""
+    return _current_span.get() or _NOOP_SPAN
+
+def payload_size(value: Any) -> int:
+    """估算负载大小（按LLM实际看到的字符串长度计）"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value)
+    return len(str(value))
+
+def estimate_tokens(value: Any) -> int:
+    """估算token数（中文字符按每字1个token，其余按每4个字符1个token）"""
+    text = value if isinstance(value, str) else str(value)
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def traced(name: str = None, record_payload: bool = True):
+    """
+    为函数（如工具的 _run）添加span
+
+    Args:
+        name: span名称，默认取函数限定名
+        record_payload: 是否记录返回值大小
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name) as span:
+                result = func(*args, **kwargs)
+                if record_payload:
+                    text = "" if result is None else result if isinstance(result, str) else str(result)
+                    span.set(payload_chars=len(text), payload_tokens=estimate_tokens(text))
+                return result
+
+        return wrapper
+
+    return decorator
+
+# 全局追踪器
+tracer = Tracer(enabled=settings.TRACING_ENABLED)
+
+def get_span_stats(name: str = None) -> Dict[str, Any]:
+    """查询进程内span耗时统计"""
+    return tracer.get_span_stats(name)